@@ -65,6 +65,7 @@ class MonaBot:
         self.sessions = {}
         self.ADMIN_ID = 5644397480
         self.waiting_for_support = set()
+        db_helper.start_cache_invalidation()
 
         self.system_prompt = """IMPORTANT: You must respond in JSON format.
 ### 💎 Drip v8.0: ЭЛИТНЫЙ AI-АССИСТЕНТ
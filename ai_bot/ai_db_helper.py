@@ -10,9 +10,24 @@ import json
 import re
 from datetime import datetime, timedelta
 
+from backend import invalidation
+from backend.search import search_condition, rank_expression
+from backend.catalog_snapshot import get_snapshot
+
 # Кеш для ускорения работы
 _product_search_cache = {}
 _cache_ttl = timedelta(minutes=5)
+# Пока слушаем NOTIFY об изменениях каталога, кеш можно держать дольше
+_cache_long_ttl = timedelta(hours=1)
+
+
+def _clear_search_cache(key=None):
+    """Сбрасывает кеш поиска при изменении товаров, остатков или категорий"""
+    _product_search_cache.clear()
+
+
+for _scope in (invalidation.CATALOG, invalidation.INVENTORY, invalidation.CATEGORIES):
+    invalidation.subscribe(_scope, _clear_search_cache)
 
 
 def hex_to_color_name(hex_color):
@@ -217,24 +232,36 @@ def get_db_connection():
     return conn
 
 
+def start_cache_invalidation():
+    """Запускает фоновый LISTEN-поток, который сбрасывает кеши после правок в админке"""
+    invalidation.start_listener(get_db_connection)
+
+
+def _inventory_rows(snapshot, product_id, in_stock_only=False):
+    """Варианты товара из снимка каталога (без обращения к БД)"""
+    return [
+        {'color': row.color, 'attribute1_value': row.attribute1_value,
+         'attribute2_value': row.attribute2_value, 'quantity': row.quantity}
+        for row in snapshot.get_inventory(product_id)
+        if not in_stock_only or row.quantity > 0
+    ]
+
+
 def get_all_products_info():
     """Получить информацию о всех товарах в наличии (Raw Data)"""
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute('''
-            SELECT p.id, p.name, p.description, p.price, p.colors, p.category_id, c.name as category_name
-            FROM products p
-            LEFT JOIN categories c ON p.category_id = c.id
-            WHERE EXISTS (SELECT 1 FROM product_inventory pi WHERE pi.product_id = p.id AND pi.quantity > 0)
-            ORDER BY c.name, p.name
-        ''')
-        products = cur.fetchall()
-        for p in products:
-            cur.execute('SELECT color, attribute1_value, attribute2_value, quantity FROM product_inventory WHERE product_id = %s AND quantity > 0', (p['id'],))
-            p['inventory'] = cur.fetchall()
-        cur.close()
-        conn.close()
+        snapshot = get_snapshot()
+        products = []
+        for p in snapshot.products:
+            if not snapshot.in_stock(p.id):
+                continue
+            products.append({
+                'id': p.id, 'name': p.name, 'description': p.description, 'price': p.price,
+                'colors': list(p.colors) if p.colors is not None else None,
+                'category_id': p.category_id, 'category_name': snapshot.category_name(p.category_id),
+                'inventory': _inventory_rows(snapshot, p.id, in_stock_only=True),
+            })
+        products.sort(key=lambda p: (p['category_name'] is None, p['category_name'] or '', p['name']))
         return products
     except Exception as e:
         print(f"Error fetching products: {e}")
@@ -246,13 +273,7 @@ def get_catalog_titles():
     Получить только названия и ID всех товаров для анализа AI
     """
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT id, name FROM products ORDER BY name")
-        titles = cur.fetchall()
-        cur.close()
-        conn.close()
-        return titles
+        return [{'id': p.id, 'name': p.name} for p in get_snapshot().products_by_name]
     except Exception as e:
         print(f"❌ Ошибка получения каталога: {e}")
         return []
@@ -277,34 +298,32 @@ def search_products(query, include_out_of_stock=False):
         
         if not words: words = [norm_query]
 
-        inventory_clause = "EXISTS (SELECT 1 FROM product_inventory pi WHERE pi.product_id = p.id AND pi.quantity > 0)" if not include_out_of_stock else "1=1"
-        
-        conditions = []
-        params = []
-        for word in words:
-            conditions.append("(LOWER(p.name) LIKE %s OR LOWER(p.description) LIKE %s OR LOWER(c.name) LIKE %s)")
-            p = f'%{word}%'
-            params.extend([p, p, p])
+        inventory_clause = "s.in_stock_variants > 0" if not include_out_of_stock else "1=1"
+        search_text = ' '.join(words)
 
+        # Полнотекстовый + триграммный поиск (backend/search.py); слова через OR,
+        # т.к. вопрос клиента редко целиком совпадает с карточкой товара
+        match_sql, match_params = search_condition(search_text, match_all=False)
+        rank_sql, rank_params = rank_expression(search_text, match_all=False)
         sql = f'''
             SELECT p.id, p.name, p.price, p.description, c.name as category_name,
-                   (CASE WHEN LOWER(p.name) LIKE %s THEN 2 ELSE 1 END) as rank
+                   {rank_sql} as rank
             FROM products p
             LEFT JOIN categories c ON p.category_id = c.id
-            WHERE {inventory_clause} AND ({" OR ".join(conditions)})
+            LEFT JOIN product_stock_summary s ON s.product_id = p.id
+            WHERE {inventory_clause} AND {match_sql}
             ORDER BY rank DESC, p.name ASC
             LIMIT 10
         '''
-        # Добавляем первый параметр для ранжирования (по первому слову)
-        first_word = f'%{words[0]}%'
-        cur.execute(sql, (first_word,) + tuple(params))
+        cur.execute(sql, rank_params + match_params)
         products = cur.fetchall()
 
+        snapshot = get_snapshot()
         for p in products:
-            cur.execute('SELECT color, attribute1_value, attribute2_value, quantity FROM product_inventory WHERE product_id = %s', (p['id'],))
-            p['inventory'] = cur.fetchall()
+            p['inventory'] = _inventory_rows(snapshot, p['id'])
 
-        _product_search_cache[norm_query] = {'products': products, 'expires': datetime.now() + _cache_ttl}
+        ttl = invalidation.cache_ttl(_cache_ttl, _cache_long_ttl)
+        _product_search_cache[norm_query] = {'products': products, 'expires': datetime.now() + ttl}
         cur.close()
         conn.close()
         return products
@@ -323,39 +342,21 @@ def get_product_details(product_id):
         dict: Информация о товаре или None
     """
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        cur.execute('''
-            SELECT 
-                p.id,
-                p.name,
-                p.description,
-                p.price,
-                p.colors,
-                p.attributes,
-                p.category_id,
-                c.name as category_name
-            FROM products p
-            LEFT JOIN categories c ON p.category_id = c.id
-            WHERE p.id = %s
-        ''', (product_id,))
-        
-        product = cur.fetchone()
-        
-        if product:
-            # Получаем наличие
-            cur.execute('''
-                SELECT color, attribute1_value, attribute2_value, quantity
-                FROM product_inventory
-                WHERE product_id = %s
-            ''', (product_id,))
-            product['inventory'] = cur.fetchall()
-        
-        cur.close()
-        conn.close()
-        
-        return product
+        snapshot = get_snapshot()
+        p = snapshot.get_product(product_id)
+        if not p:
+            return None
+        return {
+            'id': p.id,
+            'name': p.name,
+            'description': p.description,
+            'price': p.price,
+            'colors': list(p.colors) if p.colors is not None else None,
+            'attributes': json.loads(p.attributes) if p.attributes is not None else None,
+            'category_id': p.category_id,
+            'category_name': snapshot.category_name(p.category_id),
+            'inventory': _inventory_rows(snapshot, p.id),
+        }
     except Exception as e:
         print(f"❌ Ошибка получения товара: {e}")
         return None
@@ -386,16 +387,7 @@ def format_products_for_ai(products):
 def get_categories():
     """Получить список всех категорий"""
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        cur.execute('SELECT id, name FROM categories ORDER BY sort_order, name')
-        categories = cur.fetchall()
-        
-        cur.close()
-        conn.close()
-        
-        return categories
+        return [{'id': c.id, 'name': c.name} for c in get_snapshot().categories]
     except Exception as e:
         print(f"❌ Ошибка получения категорий: {e}")
         return []
@@ -410,7 +402,7 @@ def get_order_status(order_id, internal_raw=True, detailed=False):
         order_data = cur.fetchone()
         if not order_data: return "Заказ не найден."
         
-        cur.execute("SELECT name, quantity, price, selected_color, selected_attributes FROM order_items WHERE order_id = %s", (order_data['id'],))
+        cur.execute("SELECT name, quantity, price, selected_color, selected_attributes FROM order_items WHERE order_id = %s ORDER BY position", (order_data['id'],))
         order_data['items'] = cur.fetchall()
         cur.close()
         conn.close()
@@ -508,14 +500,8 @@ def search(keywords):
 def catalog():
     """Список всех товаров в формате JSON list"""
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT name, id FROM products ORDER BY name")
-        products = cur.fetchall()
-        cur.close()
-        conn.close()
-        
-        return json.dumps([{"name": p['name'], "id": p['id']} for p in products], ensure_ascii=False)
+        products = get_snapshot().products_by_name
+        return json.dumps([{"name": p.name, "id": p.id} for p in products], ensure_ascii=False)
     except Exception as e:
         return json.dumps({"error": str(e)})
 
@@ -541,25 +527,17 @@ def in_stock(start=0, stop=5):
         start = int(start)
         stop = int(stop)
         
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
         limit = max(0, stop - start)
         offset = start
-        
-        cur.execute('''
-            SELECT p.name, p.id, p.price, pi.color, pi.attribute1_value as size, pi.quantity
-            FROM products p
-            JOIN product_inventory pi ON p.id = pi.product_id
-            WHERE pi.quantity > 0
-            ORDER BY p.name
-            LIMIT %s OFFSET %s
-        ''', (limit, offset))
-        
-        items = cur.fetchall()
-        cur.close()
-        conn.close()
-        
+
+        # Варианты в наличии в порядке названий товаров
+        snapshot = get_snapshot()
+        items = [
+            {'id': p.id, 'name': p.name, 'price': p.price, 'color': row.color, 'size': row.attribute1_value}
+            for p in snapshot.products_by_name
+            for row in snapshot.get_inventory(p.id) if row.quantity > 0
+        ][offset:offset + limit]
+
         if not items:
             return "[]"
             
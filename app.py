@@ -2,7 +2,7 @@ import os
 import json
 from flask import send_from_directory, jsonify, request
 from backend import create_app
-from backend.database import get_db_connection
+from backend.catalog_snapshot import get_snapshot
 
 app = create_app()
 
@@ -36,17 +36,10 @@ def sitemap():
     xml.append('    <priority>1.0</priority>')
     xml.append('  </url>')
     
-    # Fetch all products from database
+    # Product ids from the in-process catalog snapshot
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute('SELECT id FROM products')
-        rows = cur.fetchall()
-        cur.close()
-        conn.close()
-        
-        for row in rows:
-            product_url = f"{site_url}/product/{row['id']}"
+        for product in get_snapshot().products:
+            product_url = f"{site_url}/product/{product.id}"
             xml.append('  <url>')
             xml.append(f'    <loc>{product_url}</loc>')
             xml.append('    <changefreq>weekly</changefreq>')
@@ -1,17 +1,34 @@
 from flask import Flask, Blueprint
 from datetime import timedelta
 import os
-from .database import init_db
-# from .database import init_db # This import will be moved inside create_app
 
 def create_app():
     app = Flask(__name__, static_folder='../dist/public', static_url_path='/static')
     app.secret_key = os.getenv('SESSION_SECRET', 'dev_key')
     app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=30)
     
-    from .database import init_db
+    from .database import release_request_connection, start_invalidation_listener
+    from .migrate import check_schema_version, apply_migrations
+    # One pooled connection per request, handed back when the context ends
+    app.teardown_appcontext(release_request_connection)
+    
+    # Schema changes are applied by `python -m backend.migrate` during deploy;
+    # workers only compare versions so boot stays a single cheap query.
+    # Set AUTO_MIGRATE=false to refuse migrating from a worker.
     with app.app_context():
-        init_db()
+        current, latest = check_schema_version()
+    if current < latest:
+        if os.getenv('AUTO_MIGRATE', 'true').lower() in ('1', 'true', 'yes'):
+            apply_migrations()
+        else:
+            print(f"⚠️ Database schema is at version {current}, code expects {latest}. "
+                  f"Run: python -m backend.migrate")
+    
+    # Started lazily so it also runs in workers forked from a preloaded app
+    app.before_request(start_invalidation_listener)
+    # Delivers queued notifications where no outbox worker is deployed
+    from .outbox import start_inprocess_worker
+    app.before_request(start_inprocess_worker)
     
     from .routes.auth import auth_bp
     from .routes.products import products_bp
@@ -23,6 +40,7 @@ def create_app():
     from .routes.config import config_bp
     from .routes.upload import upload_bp
     from .routes.chat import chat_bp
+    from .routes.search import search_bp
     
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(products_bp, url_prefix='/api')
@@ -33,6 +51,7 @@ def create_app():
     app.register_blueprint(config_bp, url_prefix='/api')
     app.register_blueprint(upload_bp, url_prefix='/api')
     app.register_blueprint(chat_bp, url_prefix='/api')
+    app.register_blueprint(search_bp, url_prefix='/api')
     
     # Serve config assets (logo, etc.)
     @app.route('/config/<path:filename>')
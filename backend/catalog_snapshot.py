@@ -0,0 +1,277 @@
+"""
+Immutable in-process catalog snapshot.
+
+Products, categories and inventory are read in one REPEATABLE READ
+transaction into namedtuples with id, category and name indexes, and the
+whole snapshot is swapped in as a single reference, so readers always see
+one consistent version without locking. Catalog version bumps (and the
+catalog and category messages) mark it stale and the next get_snapshot()
+reloads it; concurrent callers wait for that load rather than answer with
+old rows under a new ETag. An inventory message for one product (a stock
+movement that did not bump the version, migration 0015) only re-reads that
+product's inventory rows into a copy of the snapshot. If a reload fails the
+previous snapshot keeps being served. Without the listener the snapshot
+expires after CATALOG_SNAPSHOT_TTL seconds, and it is reloaded as soon as
+get_catalog_version() (polled from the sequence) is past the version it was
+built at, so a new ETag is never served with old rows.
+
+Read path for the product detail / categories endpoints, /api/config,
+/sitemap.xml, the Telegram bot menus and the AI bot tools. Paginated and
+full-text listings stay in SQL (keyset cursors and search need the
+database's ordering and indexes).
+"""
+import os
+import json
+import time
+import heapq
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+
+from . import invalidation
+from .catalog_version import get_catalog_version
+from .projections import FULL_VIEW
+
+CATALOG_SNAPSHOT_TTL = float(os.getenv('CATALOG_SNAPSHOT_TTL', '30'))
+CATALOG_SNAPSHOT_LONG_TTL = float(os.getenv('CATALOG_SNAPSHOT_LONG_TTL', '3600'))
+
+# attributes is kept as JSON text so the snapshot holds no mutable objects
+Product = namedtuple('Product', 'id name description price images category_id colors attributes created_at')
+Category = namedtuple('Category', 'id name icon sort_order created_at')
+InventoryRow = namedtuple('InventoryRow', 'color attribute1_value attribute2_value quantity backorder_lead_time_days')
+
+
+class CatalogSnapshot:
+    __slots__ = ('products', 'products_by_id', 'products_by_category', 'products_by_name',
+                 'categories', 'categories_by_id', 'inventory', 'version', 'loaded_at')
+
+    def __init__(self, products, categories, inventory, version=None):
+        by_category = {}
+        for product in products:
+            by_category.setdefault(product.category_id, []).append(product)
+        self.products = tuple(products)
+        self.products_by_id = MappingProxyType({p.id: p for p in products})
+        self.products_by_category = MappingProxyType({k: tuple(v) for k, v in by_category.items()})
+        self.products_by_name = tuple(sorted(products, key=lambda p: (p.name.casefold(), p.id)))
+        self.categories = tuple(sorted(categories, key=lambda c: (c.sort_order is None, c.sort_order or 0, c.name)))
+        self.categories_by_id = MappingProxyType({c.id: c for c in categories})
+        self.inventory = MappingProxyType({k: tuple(v) for k, v in inventory.items()})
+        self.version = version
+        self.loaded_at = time.time()
+
+    def with_inventory(self, product_ids, inventory):
+        """Copy sharing products and categories, with the inventory of `product_ids` replaced."""
+        clone = object.__new__(CatalogSnapshot)
+        for name in self.__slots__:
+            setattr(clone, name, getattr(self, name))
+        merged = dict(self.inventory)
+        for product_id in product_ids:
+            merged.pop(product_id, None)
+        merged.update((k, tuple(v)) for k, v in inventory.items())
+        clone.inventory = MappingProxyType(merged)
+        return clone
+
+    def get_product(self, product_id):
+        return self.products_by_id.get(product_id)
+
+    def get_inventory(self, product_id):
+        return self.inventory.get(product_id, ())
+
+    def in_stock(self, product_id):
+        return any(row.quantity > 0 for row in self.get_inventory(product_id))
+
+    def related_products(self, product, limit):
+        """Newest products of the same category, excluding `product` itself."""
+        candidates = (p for p in self.products_by_category.get(product.category_id, ()) if p.id != product.id)
+        return heapq.nlargest(limit, candidates, key=lambda p: (p.created_at, p.id))
+
+    def category_name(self, category_id):
+        category = self.categories_by_id.get(category_id)
+        return category.name if category else None
+
+
+def product_dict(product, fields=FULL_VIEW, full=True):
+    """
+    Fresh dict for a snapshot product, shaped like select_list(fields, full=full)
+    would return it (list views get only the first image and `summary`).
+    """
+    data = {}
+    for field in fields:
+        if field == 'images':
+            data['images'] = list(product.images if full else product.images[:1])
+        elif field == 'colors':
+            data['colors'] = list(product.colors) if product.colors is not None else None
+        elif field == 'attributes':
+            data['attributes'] = json.loads(product.attributes) if product.attributes is not None else None
+        elif field == 'summary':
+            data['summary'] = product.description[:160] if product.description is not None else None
+        else:
+            data[field] = getattr(product, field)
+    return data
+
+
+def inventory_dicts(rows):
+    return [row._asdict() for row in rows]
+
+
+_snapshot = None
+_state = {'stale': True, 'expires_at': 0.0, 'generation': 0, 'loads': 0, 'inventory_patches': 0,
+          'errors': 0, 'load_ms': None}
+_load_lock = threading.Lock()
+# Products whose inventory rows changed since the snapshot was loaded
+_dirty_inventory = set()
+
+_INVENTORY_SQL = '''
+    SELECT product_id, color, attribute1_value, attribute2_value, quantity, backorder_lead_time_days
+    FROM product_inventory
+'''
+
+
+def invalidate_snapshot(key=None):
+    _state['stale'] = True
+    _state['generation'] += 1
+
+for _scope in (invalidation.CATALOG, invalidation.CATEGORIES, invalidation.CATALOG_VERSION):
+    invalidation.subscribe(_scope, invalidate_snapshot)
+
+
+def invalidate_inventory(key=None):
+    if key is None:
+        invalidate_snapshot()
+    else:
+        _dirty_inventory.add(str(key))
+
+invalidation.subscribe(invalidation.INVENTORY, invalidate_inventory)
+
+
+def _inventory_by_product(rows):
+    inventory = {}
+    for row in rows:
+        product_id = row.pop('product_id')
+        inventory.setdefault(product_id, []).append(InventoryRow(**row))
+    return inventory
+
+
+def _load():
+    from .database import get_detached_connection
+
+    conn = get_detached_connection()
+    cur = conn.cursor()
+    try:
+        # Three reads, one point in time
+        cur.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY')
+        # Committed in the same transactions as the rows (migration 0017), so
+        # this is exactly the version of what the snapshot reads
+        cur.execute('SELECT version FROM catalog_version')
+        version = cur.fetchone()['version']
+        cur.execute('''
+            SELECT id, name, description, price, images, category_id, colors,
+                   attributes::text AS attributes, created_at
+            FROM products
+        ''')
+        products = [Product(
+            row['id'], row['name'], row['description'], row['price'],
+            tuple(row['images'] or ()), row['category_id'],
+            tuple(row['colors']) if row['colors'] is not None else None,
+            row['attributes'], row['created_at'],
+        ) for row in cur.fetchall()]
+        cur.execute('SELECT id, name, icon, sort_order, created_at FROM categories')
+        categories = [Category(**row) for row in cur.fetchall()]
+        cur.execute(_INVENTORY_SQL)
+        return CatalogSnapshot(products, categories, _inventory_by_product(cur.fetchall()), version)
+    finally:
+        conn.rollback()
+        cur.close()
+        conn.close()
+
+
+def _load_inventory(product_ids):
+    from .database import get_detached_connection
+
+    conn = get_detached_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(_INVENTORY_SQL + ' WHERE product_id = ANY(%s)', (product_ids,))
+        return _inventory_by_product(cur.fetchall())
+    finally:
+        conn.rollback()
+        cur.close()
+        conn.close()
+
+
+def _patch_inventory():
+    """Swap in a copy of the snapshot with the changed products' inventory re-read."""
+    global _snapshot
+    product_ids = list(_dirty_inventory)
+    _dirty_inventory.difference_update(product_ids)
+    try:
+        inventory = _load_inventory(product_ids)
+    except Exception as e:
+        _dirty_inventory.update(product_ids)
+        _state['errors'] += 1
+        print(f"⚠️ Catalog snapshot inventory refresh failed, serving the previous rows: {e}")
+        return _snapshot
+    _snapshot = _snapshot.with_inventory(product_ids, inventory)
+    _state['inventory_patches'] += 1
+    return _snapshot
+
+
+def _current_version():
+    try:
+        return get_catalog_version()
+    except Exception:
+        return None
+
+
+def _is_fresh(version):
+    if _snapshot is None or _state['stale'] or time.monotonic() >= _state['expires_at']:
+        return False
+    # Bumps are missed while the listener is down; the polled version is not
+    return version is None or _snapshot.version is None or version <= _snapshot.version
+
+
+def get_snapshot():
+    """The current CatalogSnapshot, reloaded first if stale."""
+    global _snapshot
+    version = _current_version()
+    if _is_fresh(version) and not _dirty_inventory:
+        return _snapshot
+    with _load_lock:
+        if _is_fresh(version):
+            return _patch_inventory() if _dirty_inventory else _snapshot
+        generation = _state['generation']
+        # A full load reads every product's inventory
+        _dirty_inventory.clear()
+        started = time.monotonic()
+        try:
+            snapshot = _load()
+        except Exception as e:
+            if _snapshot is None:
+                raise
+            _state['errors'] += 1
+            print(f"⚠️ Catalog snapshot reload failed, serving the previous one: {e}")
+            return _snapshot
+        _state['load_ms'] = round((time.monotonic() - started) * 1000, 1)
+        _state['loads'] += 1
+        _snapshot = snapshot
+        # An invalidation that arrived during the load keeps it stale
+        if generation == _state['generation']:
+            _state['stale'] = False
+            _state['expires_at'] = time.monotonic() + invalidation.cache_ttl(
+                CATALOG_SNAPSHOT_TTL, CATALOG_SNAPSHOT_LONG_TTL)
+        return snapshot
+
+
+def get_snapshot_stats():
+    snapshot = _snapshot
+    return {
+        **_state,
+        'loaded': snapshot is not None,
+        'version': snapshot.version if snapshot else None,
+        'products': len(snapshot.products) if snapshot else 0,
+        'categories': len(snapshot.categories) if snapshot else 0,
+        'inventory_products': len(snapshot.inventory) if snapshot else 0,
+        'dirty_inventory_products': len(_dirty_inventory),
+        'age_seconds': round(time.time() - snapshot.loaded_at, 1) if snapshot else None,
+        'expires_in': round(max(0.0, _state['expires_at'] - time.monotonic()), 1),
+    }
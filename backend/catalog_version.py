@@ -0,0 +1,68 @@
+"""
+Catalog version: bumped by triggers on products, categories and
+platform_settings (migration 0004), and on product_inventory only when a
+change shows in the cached responses: rows added, removed or re-keyed, or a quantity
+crossing zero (migration 0015; cached documents expose exact quantities but
+clients only test them against zero). Announced on the cache_invalidation
+channel with the new value as key. The value lives in the catalog_version
+row (migration 0017), updated in the writer's transaction, so a reader only
+sees it once the change it stands for is committed.
+
+While the invalidation listener is connected the version is served from
+memory; otherwise it is re-read from the row at most every
+CATALOG_VERSION_POLL_INTERVAL seconds.
+"""
+import os
+import time
+
+from . import invalidation
+
+CATALOG_VERSION_POLL_INTERVAL = float(os.getenv('CATALOG_VERSION_POLL_INTERVAL', '2'))
+
+_state = {'version': None, 'checked_at': 0.0}
+
+
+def _on_version_message(key):
+    # key is None when the listener (re)connected and may have missed bumps
+    if key is None:
+        _state['version'] = None
+        return
+    try:
+        version = int(key)
+    except (TypeError, ValueError):
+        _state['version'] = None
+        return
+    _state['version'] = max(version, _state['version'] or 0)
+    _state['checked_at'] = time.monotonic()
+
+invalidation.subscribe(invalidation.CATALOG_VERSION, _on_version_message)
+
+
+def _read_version():
+    from .database import get_db_connection
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute('SELECT version FROM catalog_version')
+        return cur.fetchone()['version']
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+
+def get_catalog_version():
+    version = _state['version']
+    if version is not None:
+        if invalidation.is_listening():
+            return version
+        if time.monotonic() - _state['checked_at'] < CATALOG_VERSION_POLL_INTERVAL:
+            return version
+    version = _read_version()
+    # A message handled while we were reading may already carry a newer value
+    _state['version'] = max(version, _state['version'] or 0)
+    _state['checked_at'] = time.monotonic()
+    return _state['version']
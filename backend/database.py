@@ -3,33 +3,106 @@ import psycopg2
 from psycopg2.extras import RealDictCursor
 import base64
 import hashlib
-from cryptography.fernet import Fernet
+import time
+from functools import lru_cache
+from cryptography.fernet import Fernet, MultiFernet, InvalidToken
 from datetime import datetime, timedelta
+from flask import g, has_app_context
+
+from .db_pool import get_pool, PooledConnection, get_pool_stats
+from . import invalidation
 
 # Encryption for sensitive settings
+#
+# SETTINGS_ENCRYPTION_KEY encrypts new values. To rotate it without downtime,
+# move the current secret to SETTINGS_ENCRYPTION_OLD_KEYS (comma-separated),
+# set the new one, restart the workers and run scripts/rotate_settings_key.py:
+# old ciphertexts keep decrypting until they have been re-encrypted.
+SECRET_CACHE_TTL = float(os.getenv('SECRET_CACHE_TTL', '300'))
+SECRET_CACHE_MAX_ENTRIES = 256
+
+_decrypted_cache = {}
+
+def _derive_key(secret):
+    key_bytes = hashlib.sha256(secret.encode()).digest()
+    return base64.urlsafe_b64encode(key_bytes)
+
 def get_encryption_key():
     key = os.environ.get("SETTINGS_ENCRYPTION_KEY")
     if not key:
         key = os.environ.get("SESSION_SECRET", "default-key-change-me")
-    key_bytes = hashlib.sha256(key.encode()).digest()
-    return base64.urlsafe_b64encode(key_bytes)
+    return _derive_key(key)
+
+@lru_cache(maxsize=4)
+def _build_cipher(primary_key, old_secrets):
+    keys = [Fernet(primary_key)]
+    for secret in old_secrets.split(','):
+        if secret.strip():
+            keys.append(Fernet(_derive_key(secret.strip())))
+    return MultiFernet(keys)
+
+def get_cipher():
+    """MultiFernet built once per key configuration; encrypts with the primary key, decrypts with any."""
+    return _build_cipher(get_encryption_key(), os.environ.get("SETTINGS_ENCRYPTION_OLD_KEYS", ""))
 
 def encrypt_value(value):
     if not value:
         return None
-    f = Fernet(get_encryption_key())
-    return f.encrypt(value.encode()).decode()
+    return get_cipher().encrypt(value.encode()).decode()
 
 def decrypt_value(encrypted_value):
     if not encrypted_value:
         return None
+    now = time.monotonic()
+    cached = _decrypted_cache.get(encrypted_value)
+    if cached is not None and now < cached[1]:
+        return cached[0]
     try:
-        f = Fernet(get_encryption_key())
-        return f.decrypt(encrypted_value.encode()).decode()
+        value = get_cipher().decrypt(encrypted_value.encode()).decode()
     except Exception:
         return None
+    if len(_decrypted_cache) >= SECRET_CACHE_MAX_ENTRIES:
+        _decrypted_cache.clear()
+    _decrypted_cache[encrypted_value] = (value, now + SECRET_CACHE_TTL)
+    return value
 
-def get_db_connection():
+def clear_decrypted_cache():
+    _decrypted_cache.clear()
+    _build_cipher.cache_clear()
+
+def rotate_encrypted_settings():
+    """
+    Re-encrypt every secret setting with the primary key.
+    Returns (rotated, failed); failed are values no configured key can decrypt.
+    """
+    cipher = get_cipher()
+    rotated, failed = 0, []
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT key, value FROM platform_settings WHERE is_secret = TRUE AND value IS NOT NULL AND value <> '' FOR UPDATE")
+        for row in cur.fetchall():
+            try:
+                token = cipher.rotate(row['value'].encode()).decode()
+            except InvalidToken:
+                failed.append(row['key'])
+                continue
+            cur.execute('UPDATE platform_settings SET value = %s, updated_at = CURRENT_TIMESTAMP WHERE key = %s',
+                        (token, row['key']))
+            rotated += 1
+        if rotated:
+            invalidation.publish(cur, invalidation.SETTINGS)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+    invalidate_settings_cache()
+    return rotated, failed
+
+def _connect():
     database_url = os.getenv('DATABASE_URL')
     if database_url:
         if 'neon.tech' in database_url or 'amazonaws.com' in database_url:
@@ -47,251 +120,122 @@ def get_db_connection():
         )
     return conn
 
-def init_db():
-    conn = get_db_connection()
-    cur = conn.cursor()
-    # Enable pgcrypto extension
-    cur.execute('CREATE EXTENSION IF NOT EXISTS pgcrypto')
-    
-    # Create products table
-    try:
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS products (
-                id VARCHAR PRIMARY KEY DEFAULT gen_random_uuid(),
-                name TEXT NOT NULL,
-                description TEXT,
-                price INTEGER NOT NULL,
-                images TEXT[] NOT NULL,
-                category_id TEXT,
-                colors TEXT[],
-                attributes JSONB
-            )
-        ''')
-        conn.commit()
-    except Exception:
-        conn.rollback()
-    
-    # ... (rest of tables from app.py) ...
-    # Note: To keep this concise for now, I'll include the full logic in the implementation
-    # I'll paste the full init_db logic here to ensure it's functional.
-    
-    # Add new columns to existing products table if they don't exist
-    cur.execute('''
-        DO $$ 
-        BEGIN 
-            IF NOT EXISTS (SELECT 1 FROM information_schema.columns 
-                          WHERE table_name='products' AND column_name='colors') THEN
-                ALTER TABLE products ADD COLUMN colors TEXT[];
-            END IF;
-            IF NOT EXISTS (SELECT 1 FROM information_schema.columns 
-                          WHERE table_name='products' AND column_name='attributes') THEN
-                ALTER TABLE products ADD COLUMN attributes JSONB;
-            END IF;
-        END $$;
-    ''')
-    
-    # Create users table
-    try:
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id VARCHAR PRIMARY KEY DEFAULT gen_random_uuid(),
-                username TEXT,
-                password TEXT,
-                telegram_id BIGINT UNIQUE,
-                first_name TEXT,
-                last_name TEXT,
-                email TEXT UNIQUE,
-                password_hash TEXT,
-                phone TEXT,
-                telegram_username TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                is_admin BOOLEAN DEFAULT FALSE,
-                is_superadmin BOOLEAN DEFAULT FALSE
-            )
-        ''')
-        conn.commit()
-    except Exception:
-        conn.rollback()
+def get_db_connection():
+    """
+    Borrow a connection from the per-process pool.
 
-    # Create password_reset_tokens table
-    try:
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS password_reset_tokens (
-                id VARCHAR PRIMARY KEY DEFAULT gen_random_uuid(),
-                user_id VARCHAR REFERENCES users(id) ON DELETE CASCADE,
-                token VARCHAR(64) UNIQUE NOT NULL,
-                expires_at TIMESTAMP NOT NULL,
-                used BOOLEAN DEFAULT FALSE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        conn.commit()
-    except Exception:
-        conn.rollback()
-    
-    # Create categories table
-    try:
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS categories (
-                id VARCHAR PRIMARY KEY DEFAULT gen_random_uuid(),
-                name TEXT NOT NULL,
-                icon TEXT,
-                sort_order INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        conn.commit()
-    except Exception:
-        conn.rollback()
-    
-    # Create favorites table
-    try:
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS favorites (
-                id VARCHAR PRIMARY KEY DEFAULT gen_random_uuid(),
-                user_id VARCHAR REFERENCES users(id) ON DELETE CASCADE,
-                product_id VARCHAR REFERENCES products(id) ON DELETE CASCADE,
-                UNIQUE(user_id, product_id)
-            )
-        ''')
-        conn.commit()
-    except Exception:
-        conn.rollback()
-    
-    # Create cart table
-    try:
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS cart (
-                id VARCHAR PRIMARY KEY DEFAULT gen_random_uuid(),
-                user_id VARCHAR REFERENCES users(id) ON DELETE CASCADE,
-                product_id VARCHAR REFERENCES products(id) ON DELETE CASCADE,
-                quantity INTEGER NOT NULL DEFAULT 1,
-                selected_color TEXT,
-                selected_attributes JSONB
-            )
-        ''')
-        conn.commit()
-    except Exception:
-        conn.rollback()
-    
-    # Create orders table
-    try:
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS orders (
-                id VARCHAR PRIMARY KEY DEFAULT gen_random_uuid(),
-                user_id VARCHAR REFERENCES users(id) ON DELETE CASCADE,
-                total INTEGER NOT NULL,
-                status TEXT DEFAULT 'pending',
-                payment_method TEXT,
-                payment_status TEXT DEFAULT 'pending',
-                payment_id TEXT,
-                delivery_address TEXT,
-                delivery_lat DOUBLE PRECISION,
-                delivery_lng DOUBLE PRECISION,
-                customer_phone TEXT,
-                customer_name TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                has_backorder BOOLEAN DEFAULT FALSE,
-                backorder_delivery_date TIMESTAMP,
-                estimated_delivery_days INTEGER,
-                payment_receipt_url TEXT
-            )
-        ''')
-        conn.commit()
-    except Exception:
-        conn.rollback()
-    
-    # Create order_items table
-    try:
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS order_items (
-                id VARCHAR PRIMARY KEY DEFAULT gen_random_uuid(),
-                order_id VARCHAR REFERENCES orders(id) ON DELETE CASCADE,
-                product_id VARCHAR REFERENCES products(id) ON DELETE SET NULL,
-                name TEXT NOT NULL,
-                price INTEGER NOT NULL,
-                quantity INTEGER NOT NULL,
-                selected_color TEXT,
-                selected_attributes JSONB,
-                availability_status TEXT DEFAULT 'in_stock',
-                backorder_lead_time_days INTEGER
-            )
-        ''')
-        conn.commit()
-    except Exception:
-        conn.rollback()
-    
-    # Create platform_settings table
-    try:
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS platform_settings (
-                key VARCHAR PRIMARY KEY,
-                value TEXT,
-                is_secret BOOLEAN DEFAULT FALSE,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        conn.commit()
-    except Exception:
-        conn.rollback()
-    
-    # Create product_inventory table
-    try:
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS product_inventory (
-                id VARCHAR PRIMARY KEY DEFAULT gen_random_uuid(),
-                product_id VARCHAR REFERENCES products(id) ON DELETE CASCADE,
-                color TEXT,
-                attribute1_value TEXT,
-                attribute2_value TEXT,
-                quantity INTEGER NOT NULL DEFAULT 0,
-                backorder_lead_time_days INTEGER,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(product_id, color, attribute1_value, attribute2_value)
-            )
-        ''')
-        conn.commit()
-    except Exception:
-        conn.rollback()
+    Inside an app context the same connection is reused for the whole request
+    and returned by release_request_connection(); calling close() on it is a
+    no-op. Outside Flask (scripts, bots) close() returns it to the pool.
+    """
+    pool = get_pool(_connect)
+    if has_app_context():
+        conn = g.get('_db_conn')
+        if conn is None or conn.closed:
+            conn = PooledConnection(pool, pool.getconn(), request_scoped=True)
+            g._db_conn = conn
+        return conn
+    return PooledConnection(pool, pool.getconn())
 
-    # Create chat_messages table
-    try:
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS chat_messages (
-                id VARCHAR PRIMARY KEY DEFAULT gen_random_uuid(),
-                user_id VARCHAR REFERENCES users(id) ON DELETE CASCADE,
-                sender_id VARCHAR REFERENCES users(id) ON DELETE CASCADE,
-                content TEXT NOT NULL,
-                is_read BOOLEAN DEFAULT FALSE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        conn.commit()
-    except Exception:
-        conn.rollback()
-    
-    conn.commit()
-    cur.close()
-    conn.close()
+def get_detached_connection():
+    """Pooled connection that is never the request's one, for work that needs its own transaction."""
+    pool = get_pool(_connect)
+    return PooledConnection(pool, pool.getconn())
 
-def get_platform_setting(key):
+def release_request_connection(exc=None):
+    """Teardown hook: roll back anything left uncommitted and return the connection."""
+    conn = g.pop('_db_conn', None)
+    if conn is not None:
+        conn.release(discard=isinstance(exc, psycopg2.OperationalError))
+
+def start_invalidation_listener():
+    """Per-process LISTEN thread; safe to call on every request."""
+    invalidation.start_listener(_connect)
+
+def init_db():
+    """Bring the schema up to date (kept for scripts that still call init_db)."""
+    from .migrate import apply_migrations
+    return apply_migrations()
+
+# Platform settings cache: the whole table is read in one query and served
+# from memory until the TTL expires or set_platform_setting() invalidates it.
+# While the NOTIFY listener is connected, edits from other processes evict it
+# too, so the long TTL applies.
+SETTINGS_CACHE_TTL = float(os.getenv('SETTINGS_CACHE_TTL', '60'))
+SETTINGS_CACHE_LONG_TTL = float(os.getenv('SETTINGS_CACHE_LONG_TTL', '3600'))
+_settings_cache = (None, 0.0)  # ({key: (value, is_secret)}, expires_at)
+_settings_generation = 0
+_settings_cache_stats = {'hits': 0, 'misses': 0, 'loads': 0, 'invalidations': 0}
+
+def _load_platform_settings():
+    conn = None
     try:
         conn = get_db_connection()
         cur = conn.cursor()
-        cur.execute('SELECT value, is_secret FROM platform_settings WHERE key = %s', (key,))
-        result = cur.fetchone()
+        cur.execute('SELECT key, value, is_secret FROM platform_settings')
+        rows = {row['key']: (row['value'], row['is_secret']) for row in cur.fetchall()}
         cur.close()
         conn.close()
-        if result:
-            if result['is_secret']:
-                return decrypt_value(result['value'])
-            return result['value']
-        return None
+        return rows
+    except Exception:
+        # The connection may be shared with the rest of the request
+        if conn is not None and not conn.closed:
+            conn.rollback()
+        raise
+
+def get_platform_settings():
+    """All settings as {key: (stored_value, is_secret)}, served from the cache."""
+    global _settings_cache
+    rows, expires_at = _settings_cache
+    if rows is not None and time.monotonic() < expires_at:
+        _settings_cache_stats['hits'] += 1
+        return rows
+    _settings_cache_stats['misses'] += 1
+    generation = _settings_generation
+    rows = _load_platform_settings()
+    _settings_cache_stats['loads'] += 1
+    # Don't publish rows read before a concurrent invalidation
+    if generation == _settings_generation:
+        ttl = invalidation.cache_ttl(SETTINGS_CACHE_TTL, SETTINGS_CACHE_LONG_TTL)
+        _settings_cache = (rows, time.monotonic() + ttl)
+    return rows
+
+def invalidate_settings_cache():
+    global _settings_cache, _settings_generation
+    _settings_generation += 1
+    _settings_cache = (None, 0.0)
+    _decrypted_cache.clear()
+    _settings_cache_stats['invalidations'] += 1
+
+invalidation.subscribe(invalidation.SETTINGS, lambda key: invalidate_settings_cache())
+
+def get_settings_cache_stats():
+    rows, expires_at = _settings_cache
+    lookups = _settings_cache_stats['hits'] + _settings_cache_stats['misses']
+    return {
+        **_settings_cache_stats,
+        'hit_ratio': round(_settings_cache_stats['hits'] / lookups, 4) if lookups else None,
+        'cached_keys': len(rows) if rows is not None else 0,
+        'decrypted_cached': len(_decrypted_cache),
+        'ttl_seconds': invalidation.cache_ttl(SETTINGS_CACHE_TTL, SETTINGS_CACHE_LONG_TTL),
+        'expires_in': round(max(0.0, expires_at - time.monotonic()), 1) if rows is not None else 0,
+    }
+
+def get_platform_setting(key):
+    try:
+        result = get_platform_settings().get(key)
     except Exception as e:
         print(f"❌ Error getting platform setting '{key}': {e}")
         return None
+    if result:
+        value, is_secret = result
+        if is_secret:
+            return decrypt_value(value)
+        return value
+    return None
 
 def set_platform_setting(key, value, is_secret=False):
+    conn = None
     try:
         conn = get_db_connection()
         cur = conn.cursor()
@@ -304,11 +248,15 @@ def set_platform_setting(key, value, is_secret=False):
                 is_secret = EXCLUDED.is_secret,
                 updated_at = CURRENT_TIMESTAMP
         ''', (key, stored_value, is_secret))
+        invalidation.publish(cur, invalidation.SETTINGS, key)
         conn.commit()
         cur.close()
         conn.close()
+        invalidate_settings_cache()
         return True
     except Exception:
+        if conn is not None and not conn.closed:
+            conn.rollback()
         return False
 
 def get_cloudinary_config():
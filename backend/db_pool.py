@@ -0,0 +1,268 @@
+"""
+Per-process PostgreSQL connection pool.
+
+Each gunicorn worker builds its own pool lazily on first use, so connections
+are always opened after the fork. Inside a Flask app context a single
+connection is checked out per request (stored on ``flask.g``) and handed back
+by the teardown hook registered in ``create_app``.
+"""
+import os
+import threading
+import time
+
+import psycopg2
+from psycopg2 import extensions
+
+
+# One connection per gunicorn thread: every deploy command runs
+# --threads 16. Change DB_POOL_MAX_SIZE together with --threads, or requests
+# queue for a connection (DB_POOL_TIMEOUT) while threads sit idle.
+DEFAULT_MAX_SIZE = 16
+
+
+class PoolTimeoutError(psycopg2.OperationalError):
+    """Raised when no connection could be checked out before the timeout."""
+
+
+class ConnectionPool:
+    """Thread-safe bounded pool with checkout timeouts and health checks on borrow."""
+
+    def __init__(self, connect, min_size=1, max_size=10, timeout=10.0, health_check_interval=30.0):
+        self._connect = connect
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size, self.min_size)
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+
+        self._cond = threading.Condition()
+        self._idle = []  # [(conn, last_used_monotonic)]
+        self._size = 0
+        self._stats = {
+            'checkouts': 0,
+            'timeouts': 0,
+            'connections_created': 0,
+            'connections_discarded': 0,
+            'health_checks': 0,
+            'health_check_failures': 0,
+            'wait_time_total_ms': 0.0,
+        }
+
+        for _ in range(self.min_size):
+            conn = self._open()
+            self._idle.append((conn, time.monotonic()))
+
+    def _open(self):
+        conn = self._connect()
+        with self._cond:
+            self._size += 1
+            self._stats['connections_created'] += 1
+        return conn
+
+    def _discard(self, conn):
+        try:
+            if not conn.closed:
+                conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._stats['connections_discarded'] += 1
+            self._cond.notify()
+
+    def _is_healthy(self, conn, last_used):
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        self._stats['health_checks'] += 1
+        try:
+            cur = conn.cursor()
+            cur.execute('SELECT 1')
+            cur.fetchone()
+            cur.close()
+            conn.rollback()
+            return True
+        except Exception:
+            self._stats['health_check_failures'] += 1
+            return False
+
+    def getconn(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        while True:
+            conn = None
+            last_used = None
+            must_open = False
+            with self._cond:
+                while True:
+                    if self._idle:
+                        conn, last_used = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        # Reserve the slot now, open the socket outside the lock
+                        self._size += 1
+                        must_open = True
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeoutError(
+                            f'Timed out after {timeout}s waiting for a database connection '
+                            f'(pool size {self.max_size})'
+                        )
+                    self._cond.wait(remaining)
+
+            if must_open:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._stats['connections_created'] += 1
+            elif not self._is_healthy(conn, last_used):
+                self._discard(conn)
+                continue
+
+            with self._cond:
+                self._stats['checkouts'] += 1
+                self._stats['wait_time_total_ms'] += (time.monotonic() - started) * 1000
+            return conn
+
+    def putconn(self, conn, discard=False):
+        if not discard and not conn.closed:
+            try:
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                discard = True
+        if discard or conn.closed:
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def stats(self):
+        with self._cond:
+            data = dict(self._stats)
+            data.update({
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'pid': os.getpid(),
+            })
+        data['wait_time_total_ms'] = round(data['wait_time_total_ms'], 2)
+        return data
+
+
+class PooledConnection:
+    """
+    Thin proxy around a pooled psycopg2 connection.
+
+    ``close()`` hands the connection back to the pool instead of closing the
+    socket. Request-scoped connections ignore ``close()`` entirely; they are
+    released once by the app-context teardown hook.
+    """
+
+    def __init__(self, pool, conn, request_scoped=False):
+        self._pool = pool
+        self._conn = conn
+        self._request_scoped = request_scoped
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._conn.__exit__(exc_type, exc, tb)
+
+    @property
+    def closed(self):
+        return 1 if self._released else self._conn.closed
+
+    def close(self):
+        if not self._request_scoped:
+            self.release()
+
+    def release(self, discard=False):
+        if self._released:
+            return
+        self._released = True
+        self._pool.putconn(self._conn, discard=discard)
+
+
+def _int_env(name, default):
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _float_env(name, default):
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+# Pools inherited across fork() are never closed from the child: closing would
+# send a Terminate message over sockets still owned by the parent.
+_inherited_pools = []
+
+
+def get_pool(connect):
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is not None and _pool_pid == pid:
+        return _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid != pid:
+            _inherited_pools.append(_pool)
+            _pool = None
+        if _pool is None:
+            _pool = ConnectionPool(
+                connect,
+                min_size=_int_env('DB_POOL_MIN_SIZE', 1),
+                max_size=_int_env('DB_POOL_MAX_SIZE', DEFAULT_MAX_SIZE),
+                timeout=_float_env('DB_POOL_TIMEOUT', 10.0),
+                health_check_interval=_float_env('DB_POOL_HEALTHCHECK_INTERVAL', 30.0),
+            )
+            _pool_pid = pid
+    return _pool
+
+
+def close_pool():
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.closeall()
+        _pool = None
+        _pool_pid = None
+
+
+def get_pool_stats():
+    if _pool is None or _pool_pid != os.getpid():
+        return {'initialized': False, 'pid': os.getpid()}
+    data = _pool.stats()
+    data['initialized'] = True
+    return data
@@ -0,0 +1,234 @@
+"""
+Facet filters and counts for the catalog FilterBar.
+
+Filters: category, price_min/price_max, q (see search.py), color (any of,
+comma-separated) and attr=<name>:<value> (repeatable; values of one name
+are OR-ed, different names AND-ed). Colors and attributes are matched with
+containment operators served by the GIN indexes from migration 0008.
+
+get_facets() counts categories, colors, attribute values and price buckets
+in one statement. Each facet is counted with every filter applied except
+its own, so selecting a color still shows how many products the other
+colors have. ``in_stock`` counts use product_stock_summary for categories
+and prices and matching product_inventory rows for colors and attributes
+(attribute N of a product is attributeN_value in the inventory).
+Results are cached per catalog version.
+"""
+import json
+import threading
+
+from .search import search_condition
+
+MAX_ATTRIBUTE_FILTERS = 5
+PRICE_BUCKETS = 5
+FACET_CACHE_MAX_ENTRIES = 256
+
+_cache = {'version': None, 'entries': {}}
+_cache_lock = threading.Lock()
+
+
+def parse_facet_filters(args):
+    """
+    (colors, attributes) from ?color=a,b&attr=Size:M&attr=Size:L.
+    attributes is {name: [values]}. Raises ValueError for malformed attr.
+    """
+    colors = []
+    for value in args.getlist('color'):
+        for color in value.split(','):
+            color = color.strip()
+            if color and color not in colors:
+                colors.append(color)
+    attributes = {}
+    for value in args.getlist('attr'):
+        name, sep, attr_value = value.partition(':')
+        if not sep or not name.strip() or not attr_value.strip():
+            raise ValueError("attr must look like <name>:<value>")
+        values = attributes.setdefault(name.strip(), [])
+        if attr_value.strip() not in values:
+            values.append(attr_value.strip())
+    if len(attributes) > MAX_ATTRIBUTE_FILTERS:
+        raise ValueError(f'At most {MAX_ATTRIBUTE_FILTERS} attributes can be filtered at once')
+    return colors, attributes
+
+
+def color_condition(colors, alias='p'):
+    """(sql, params) matching products that have any of the colors."""
+    return f'{alias}.colors && %s::text[]', (list(colors),)
+
+
+def attribute_condition(name, values, alias='p'):
+    """(sql, params) matching products whose attribute `name` offers any of the values."""
+    parts = [f'{alias}.attributes @> %s::jsonb'] * len(values)
+    params = tuple(json.dumps([{'name': name, 'values': [value]}]) for value in values)
+    return '(' + ' OR '.join(parts) + ')', params
+
+
+def _flag(condition):
+    return condition if condition else ('TRUE', ())
+
+
+def _build_facet_query(category=None, price_min=None, price_max=None, search=None,
+                       colors=(), attributes=None):
+    attributes = attributes or {}
+    params = []
+
+    price_parts, price_params = [], []
+    if price_min is not None:
+        price_parts.append('p.price >= %s')
+        price_params.append(price_min)
+    if price_max is not None:
+        price_parts.append('p.price <= %s')
+        price_params.append(price_max)
+
+    flags = [
+        ('f_category', _flag(('p.category_id = %s', (category,)) if category and category != 'all' else None)),
+        ('f_price', _flag((' AND '.join(price_parts), tuple(price_params)) if price_parts else None)),
+        ('f_color', _flag(color_condition(colors) if colors else None)),
+    ]
+    attribute_names = list(attributes)
+    for i, name in enumerate(attribute_names):
+        flags.append((f'f_attr{i}', attribute_condition(name, attributes[name])))
+
+    flag_columns = []
+    for column, (sql, flag_params) in flags:
+        flag_columns.append(f'({sql}) AS {column}')
+        params.extend(flag_params)
+
+    where = ''
+    if search:
+        search_sql, search_params = search_condition(search)
+        where = f'WHERE {search_sql}'
+        params.extend(search_params)
+
+    attr_flags = [f'b.f_attr{i}' for i in range(len(attribute_names))]
+    all_attrs = ' AND '.join(attr_flags) or 'TRUE'
+
+    params.append(PRICE_BUCKETS)
+
+    # An attribute value is counted with the filters on the other attribute names
+    other_attrs = ' AND '.join(
+        f"(a.item->>'name' = %s OR b.f_attr{i})" for i in range(len(attribute_names))
+    ) or 'TRUE'
+    params.extend(attribute_names)
+
+    sql = f'''
+        WITH base AS MATERIALIZED (
+            SELECT p.id, p.category_id, p.price, p.colors, p.attributes,
+                   {', '.join(flag_columns)},
+                   coalesce(st.in_stock_variants > 0, FALSE) AS in_stock
+            FROM products p
+            LEFT JOIN product_stock_summary st ON st.product_id = p.id
+            {where}
+        ),
+        bounds AS (
+            SELECT min(price) AS lo, max(price) AS hi,
+                   greatest(1, ceil((max(price) - min(price) + 1)::numeric / %s))::int AS width
+            FROM base b WHERE b.f_category AND b.f_color AND {all_attrs}
+        ),
+        facet_rows AS (
+            SELECT 'category' AS facet, NULL::text AS name, b.category_id::text AS value, b.id, b.in_stock
+            FROM base b WHERE b.f_price AND b.f_color AND {all_attrs}
+            UNION ALL
+            SELECT 'price', NULL, ((b.price - bounds.lo) / bounds.width)::text, b.id, b.in_stock
+            FROM base b CROSS JOIN bounds WHERE b.f_category AND b.f_color AND {all_attrs}
+            UNION ALL
+            SELECT 'color', NULL, c.color, b.id, EXISTS (
+                SELECT 1 FROM product_inventory i
+                WHERE i.product_id = b.id AND i.color = c.color AND i.quantity > 0)
+            FROM base b CROSS JOIN LATERAL unnest(b.colors) AS c(color)
+            WHERE b.f_category AND b.f_price AND {all_attrs}
+            UNION ALL
+            SELECT 'attribute', a.item->>'name', v.value, b.id, EXISTS (
+                SELECT 1 FROM product_inventory i
+                WHERE i.product_id = b.id AND i.quantity > 0
+                  AND CASE a.position WHEN 1 THEN i.attribute1_value
+                                      WHEN 2 THEN i.attribute2_value END = v.value)
+            FROM base b
+            CROSS JOIN LATERAL jsonb_array_elements(
+                CASE WHEN jsonb_typeof(b.attributes) = 'array' THEN b.attributes ELSE '[]'::jsonb END
+            ) WITH ORDINALITY AS a(item, position)
+            CROSS JOIN LATERAL jsonb_array_elements_text(
+                CASE WHEN jsonb_typeof(a.item->'values') = 'array' THEN a.item->'values' ELSE '[]'::jsonb END
+            ) AS v(value)
+            WHERE b.f_category AND b.f_price AND b.f_color AND {other_attrs}
+            UNION ALL
+            SELECT 'total', NULL, NULL, b.id, b.in_stock
+            FROM base b WHERE b.f_category AND b.f_price AND b.f_color AND {all_attrs}
+        )
+        SELECT facet, name, value, count(DISTINCT id) AS count,
+               count(DISTINCT id) FILTER (WHERE in_stock) AS in_stock,
+               NULL::int AS lo, NULL::int AS hi, NULL::int AS width
+        FROM facet_rows
+        GROUP BY facet, name, value
+        UNION ALL
+        SELECT 'price_range', NULL, NULL, 0, 0, lo, hi, width FROM bounds
+    '''
+    return sql, tuple(params)
+
+
+def _sorted_values(values):
+    return sorted(values, key=lambda v: (-v['count'], str(v['value'])))
+
+
+def _assemble(rows):
+    result = {'total': 0, 'in_stock': 0, 'categories': [], 'colors': [], 'attributes': [],
+              'price': {'min': None, 'max': None, 'buckets': []}}
+    attributes = {}
+    price_rows = {}
+    price_range = None
+    for row in rows:
+        facet = row['facet']
+        entry = {'count': row['count'], 'in_stock': row['in_stock']}
+        if facet == 'total':
+            result['total'], result['in_stock'] = row['count'], row['in_stock']
+        elif facet == 'category':
+            result['categories'].append({'id': row['value'], **entry})
+        elif facet == 'color':
+            result['colors'].append({'value': row['value'], **entry})
+        elif facet == 'attribute':
+            attributes.setdefault(row['name'], []).append({'value': row['value'], **entry})
+        elif facet == 'price' and row['value'] is not None:
+            price_rows[int(row['value'])] = entry
+        elif facet == 'price_range':
+            price_range = row
+
+    result['categories'] = sorted(result['categories'], key=lambda v: (-v['count'], str(v['id'])))
+    result['colors'] = _sorted_values(result['colors'])
+    result['attributes'] = [{'name': name, 'values': _sorted_values(values)}
+                            for name, values in attributes.items()]
+
+    if price_range and price_range['lo'] is not None:
+        lo, hi, width = price_range['lo'], price_range['hi'], price_range['width']
+        result['price'] = {'min': lo, 'max': hi, 'buckets': [
+            {'from': lo + i * width, 'to': min(hi, lo + (i + 1) * width - 1), **price_rows[i]}
+            for i in sorted(price_rows)
+        ]}
+    return result
+
+
+def get_facets(cur, version=None, **filters):
+    """
+    Facet counts for the filter set (see _build_facet_query for the filters).
+    version is the catalog version; pass None to bypass the cache.
+    """
+    key = json.dumps(filters, sort_keys=True, default=str)
+    if version is not None:
+        entries = _cache['entries'] if _cache['version'] == version else {}
+        if key in entries:
+            return entries[key]
+
+    sql, params = _build_facet_query(**filters)
+    cur.execute(sql, params)
+    result = _assemble(cur.fetchall())
+
+    if version is not None:
+        with _cache_lock:
+            # Versions only grow; a slow request must not evict newer results
+            if _cache['version'] is None or version > _cache['version']:
+                _cache['version'], _cache['entries'] = version, {}
+            if version < _cache['version']:
+                return result
+            if len(_cache['entries']) >= FACET_CACHE_MAX_ENTRIES:
+                _cache['entries'].clear()
+            _cache['entries'][key] = result
+    return result
@@ -0,0 +1,143 @@
+"""
+Cross-process cache invalidation over Postgres LISTEN/NOTIFY.
+
+Writers call publish() with the cursor of their own transaction, so the
+message is delivered only if the write commits. Every process that keeps
+caches (each gunicorn worker, ai_bot) runs one listener thread that routes
+incoming messages to the handlers registered with subscribe().
+
+Payload format (also emitted by telegram_bot/db_operations.py):
+    {"scope": "catalog", "key": "<product id>" | null}
+A null key means "evict everything in this scope".
+"""
+import os
+import json
+import time
+import select
+import threading
+from collections import defaultdict
+
+CHANNEL = 'cache_invalidation'
+
+SETTINGS = 'settings'
+CATEGORIES = 'categories'
+CATALOG = 'catalog'
+INVENTORY = 'inventory'
+# Sent by database triggers (migration 0004), key is the new version number
+CATALOG_VERSION = 'catalog_version'
+# Sent by database triggers (migration 0014), key is the order's user id
+ORDERS = 'orders'
+SCOPES = (SETTINGS, CATEGORIES, CATALOG, INVENTORY, CATALOG_VERSION, ORDERS)
+
+POLL_INTERVAL = 5.0
+MAX_BACKOFF = 30.0
+
+_handlers = defaultdict(list)
+_listener_pid = None
+_listener_lock = threading.Lock()
+_state = {
+    'connected': False,
+    'received': 0,
+    'dispatched': 0,
+    'errors': 0,
+    'reconnects': 0,
+    'last_message_at': None,
+}
+
+
+def publish(cur, scope, key=None):
+    """Queue an invalidation message; Postgres sends it when the transaction commits."""
+    payload = json.dumps({'scope': scope, 'key': key})
+    cur.execute('SELECT pg_notify(%s, %s)', (CHANNEL, payload))
+
+
+def subscribe(scope, handler):
+    """Register handler(key) for a scope. key is None when the whole scope is stale."""
+    if handler not in _handlers[scope]:
+        _handlers[scope].append(handler)
+
+
+def dispatch(scope, key=None):
+    for handler in list(_handlers.get(scope, ())):
+        try:
+            handler(key)
+            _state['dispatched'] += 1
+        except Exception as e:
+            _state['errors'] += 1
+            print(f"❌ Cache invalidation handler failed for '{scope}': {e}")
+
+
+def _evict_all():
+    for scope in list(_handlers):
+        dispatch(scope, None)
+
+
+def _listen_forever(connect):
+    backoff = 1.0
+    while True:
+        conn = None
+        try:
+            conn = connect()
+            conn.autocommit = True
+            cur = conn.cursor()
+            cur.execute(f'LISTEN {CHANNEL}')
+            _state['connected'] = True
+            backoff = 1.0
+            # Messages sent while we were not listening are lost
+            _evict_all()
+
+            while True:
+                if select.select([conn], [], [], POLL_INTERVAL) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    _state['received'] += 1
+                    _state['last_message_at'] = time.time()
+                    try:
+                        message = json.loads(notify.payload)
+                    except ValueError:
+                        continue
+                    if not isinstance(message, dict):
+                        continue
+                    dispatch(message.get('scope'), message.get('key'))
+        except Exception as e:
+            _state['connected'] = False
+            _state['reconnects'] += 1
+            print(f"⚠️ Cache invalidation listener disconnected: {e}. Retrying in {backoff:.0f}s")
+            try:
+                if conn is not None:
+                    conn.close()
+            except Exception:
+                pass
+            time.sleep(backoff)
+            backoff = min(backoff * 2, MAX_BACKOFF)
+
+
+def start_listener(connect):
+    """Start the listener thread for this process (no-op if already running)."""
+    global _listener_pid
+    pid = os.getpid()
+    if _listener_pid == pid:
+        return
+    with _listener_lock:
+        if _listener_pid == pid:
+            return
+        # A thread started before fork() does not exist in the child
+        _state['connected'] = False
+        thread = threading.Thread(target=_listen_forever, args=(connect,), name='cache-invalidation', daemon=True)
+        thread.start()
+        _listener_pid = pid
+
+
+def is_listening():
+    return _listener_pid == os.getpid() and _state['connected']
+
+
+def cache_ttl(short_ttl, long_ttl):
+    """Long TTL while invalidations are being received, short one as a safety net otherwise."""
+    return long_ttl if is_listening() else short_ttl
+
+
+def get_listener_stats():
+    return {**_state, 'listening': is_listening(), 'subscribed_scopes': sorted(_handlers)}
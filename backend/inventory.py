@@ -0,0 +1,109 @@
+"""
+Batch stock lookups shared by the product, cart and order routes.
+
+Stock is kept per product variant (product_variants, migration 0009); cart
+and order rows carry the variant_id, so their lookups are equality probes.
+
+Per-product figures come from product_stock_summary, which triggers on
+product_inventory keep current (migration 0005), so grids never aggregate
+inventory at read time.
+"""
+
+
+# One row per requested item, in request order
+_VARIANT_AVAILABILITY_SQL = '''
+    SELECT coalesce(req.product_id, v.product_id) AS product_id, v.id AS variant_id,
+           req.quantity AS requested, i.quantity, i.backorder_lead_time_days
+    FROM unnest(%s::text[], %s::text[], %s::text[], %s::text[], %s::text[], %s::int[])
+         WITH ORDINALITY AS req(variant_id, product_id, color, attribute1_value, attribute2_value, quantity, ord)
+    LEFT JOIN LATERAL (
+        SELECT id, product_id FROM product_variants WHERE id = req.variant_id
+        UNION ALL
+        SELECT id, product_id FROM product_variants
+        WHERE req.variant_id IS NULL AND product_id = req.product_id
+          -- NULL-safe through the array, and a probe on product_variants_key
+          AND variant_key = ARRAY[req.color, req.attribute1_value, req.attribute2_value]
+    ) v ON TRUE
+    LEFT JOIN product_inventory i ON i.variant_id = v.id
+    ORDER BY req.ord
+'''
+
+_STOCK_SUMMARY_SQL = '''
+    SELECT product_id, total_quantity, in_stock_variants, min_backorder_lead_time_days
+    FROM product_stock_summary WHERE product_id = ANY(%s)
+'''
+
+
+def _blank_to_none(value):
+    return value if value not in ('', None) else None
+
+
+def _requested_quantity(item):
+    value = item.get('quantity')
+    if value in (None, ''):
+        return 1
+    try:
+        if isinstance(value, bool):
+            raise TypeError
+        quantity = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('quantity must be a positive integer')
+    if quantity < 1:
+        raise ValueError('quantity must be a positive integer')
+    return quantity
+
+
+def get_variant_availability(cur, items):
+    """
+    Per-variant stock for a batch of cart-like items in one query.
+    A missing color/attribute matches variants where it is NULL. Items that
+    carry a variant_id (cart rows) are looked up by it directly.
+    Raises ValueError for malformed items or quantities.
+    """
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise ValueError('items must be a list of objects')
+    items = [item for item in items if item.get('product_id') or item.get('variant_id')]
+    if not items:
+        return []
+    quantities = [_requested_quantity(item) for item in items]
+    cur.execute(_VARIANT_AVAILABILITY_SQL, (
+        [_blank_to_none(item.get('variant_id')) for item in items],
+        [_blank_to_none(item.get('product_id')) for item in items],
+        [_blank_to_none(item.get('color')) for item in items],
+        [_blank_to_none(item.get('attribute1_value')) for item in items],
+        [_blank_to_none(item.get('attribute2_value')) for item in items],
+        quantities,
+    ))
+    return [{
+        'product_id': row['product_id'],
+        'variant_id': row['variant_id'],
+        'available': row['quantity'] is not None and row['quantity'] >= row['requested'],
+        'quantity_in_stock': row['quantity'] or 0,
+        'backorder_lead_time_days': row['backorder_lead_time_days'],
+    } for row in cur.fetchall()]
+
+
+def stock_summary_entry(row):
+    """Summary dict for a product_stock_summary row (None: no inventory rows)."""
+    if row is None:
+        return {'status': 'not_tracked', 'in_stock': False, 'total_quantity': 0, 'backorder_lead_time_days': None}
+    in_stock = row['in_stock_variants'] > 0
+    return {
+        'status': 'in_stock' if in_stock else 'backorder',
+        'in_stock': in_stock,
+        'total_quantity': row['total_quantity'],
+        'backorder_lead_time_days': row['min_backorder_lead_time_days'],
+    }
+
+
+def get_stock_summary(cur, product_ids):
+    """
+    {product_id: {status, in_stock, total_quantity, backorder_lead_time_days}}
+    for a batch of products. Products without inventory rows are 'not_tracked'.
+    """
+    product_ids = list(dict.fromkeys(pid for pid in product_ids if pid))
+    if not product_ids:
+        return {}
+    cur.execute(_STOCK_SUMMARY_SQL, (product_ids,))
+    rows = {row['product_id']: row for row in cur.fetchall()}
+    return {pid: stock_summary_entry(rows.get(pid)) for pid in product_ids}
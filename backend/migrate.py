@@ -0,0 +1,217 @@
+"""
+Versioned schema migrations.
+
+Migrations are plain SQL files in backend/migrations named
+``NNNN_description.sql`` and applied in version order. Each one runs in its
+own transaction and is recorded in ``schema_migrations``. A file whose first
+line is ``-- migrate: no-transaction`` runs in autocommit mode instead, one
+statement at a time (needed for CREATE INDEX CONCURRENTLY); such files must
+not contain function bodies, since statements are split on ``;``.
+
+Released migrations are never edited. When one cannot run on an older
+PostgreSQL, a sibling ``NNNN_description.pgMM.sql`` is applied instead on
+servers of major version MM or below (e.g. 0009_product_variants.pg14.sql);
+a later migration then brings newer servers to the same schema.
+
+Usage:
+    python -m backend.migrate            # apply pending migrations
+    python -m backend.migrate status     # show applied / pending versions
+"""
+import os
+import re
+import sys
+import hashlib
+import argparse
+
+import psycopg2
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+NO_TRANSACTION_MARKER = '-- migrate: no-transaction'
+# Arbitrary constant so concurrent deploys/workers never migrate at the same time
+ADVISORY_LOCK_ID = 727_001
+
+_FILENAME_RE = re.compile(r'^(\d{4})_([\w-]+)\.sql$')
+_COMPAT_RE = re.compile(r'^(\d{4})_([\w-]+)\.pg(\d+)\.sql$')
+
+
+def discover_migrations():
+    """Return [(version, name, path)] sorted by version."""
+    migrations = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        match = _FILENAME_RE.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(MIGRATIONS_DIR, filename)))
+    migrations.sort()
+    versions = [m[0] for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError('Duplicate migration version numbers in backend/migrations')
+    return migrations
+
+
+def _migration_path(path, server_major):
+    """`path`, or the sibling .pgMM.sql with the lowest MM >= server_major."""
+    stem = os.path.basename(path)[:-len('.sql')]
+    candidates = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        match = _COMPAT_RE.match(filename)
+        if match and filename.startswith(stem + '.pg') and server_major <= int(match.group(3)):
+            candidates.append((int(match.group(3)), os.path.join(MIGRATIONS_DIR, filename)))
+    return min(candidates)[1] if candidates else path
+
+
+def _split_statements(sql):
+    statements = []
+    for chunk in sql.split(';'):
+        lines = [line for line in chunk.splitlines() if line.strip() and not line.strip().startswith('--')]
+        if lines:
+            statements.append('\n'.join(lines))
+    return statements
+
+
+def latest_version():
+    migrations = discover_migrations()
+    return migrations[-1][0] if migrations else 0
+
+
+def _ensure_migrations_table(cur):
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            checksum VARCHAR(64) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _applied(cur):
+    cur.execute('SELECT version, checksum FROM schema_migrations')
+    return {row['version']: row['checksum'] for row in cur.fetchall()}
+
+
+def apply_migrations(verbose=True):
+    """Apply every pending migration. Returns the list of versions applied."""
+    from .database import _connect
+
+    conn = _connect()
+    conn.autocommit = True
+    cur = conn.cursor()
+    applied_now = []
+    try:
+        cur.execute('SELECT pg_advisory_lock(%s)', (ADVISORY_LOCK_ID,))
+        _ensure_migrations_table(cur)
+        applied = _applied(cur)
+        server_major = conn.server_version // 10000
+
+        for version, name, path in discover_migrations():
+            path = _migration_path(path, server_major)
+            with open(path, 'r', encoding='utf-8') as f:
+                sql = f.read()
+            checksum = hashlib.sha256(sql.encode('utf-8')).hexdigest()
+
+            if version in applied:
+                if applied[version] != checksum and verbose:
+                    print(f"⚠️ Migration {version:04d}_{name} was modified after being applied")
+                continue
+
+            if verbose:
+                print(f"→ Applying {version:04d}_{name}")
+
+            if sql.lstrip().startswith(NO_TRANSACTION_MARKER):
+                for statement in _split_statements(sql):
+                    cur.execute(statement)
+                cur.execute(
+                    'INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)',
+                    (version, name, checksum)
+                )
+            else:
+                conn.autocommit = False
+                try:
+                    cur.execute(sql)
+                    cur.execute(
+                        'INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)',
+                        (version, name, checksum)
+                    )
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                finally:
+                    conn.autocommit = True
+            applied_now.append(version)
+    finally:
+        try:
+            cur.execute('SELECT pg_advisory_unlock(%s)', (ADVISORY_LOCK_ID,))
+        except Exception:
+            pass
+        cur.close()
+        conn.close()
+    return applied_now
+
+
+def get_schema_version(cur):
+    """Current schema version, or 0 if migrations were never run."""
+    try:
+        cur.execute('SELECT COALESCE(MAX(version), 0) AS version FROM schema_migrations')
+        return cur.fetchone()['version']
+    except psycopg2.errors.UndefinedTable:
+        cur.connection.rollback()
+        return 0
+
+
+def check_schema_version():
+    """
+    Cheap startup check: one query comparing the database version with the
+    newest migration on disk. Returns (current, latest).
+    """
+    from .database import get_db_connection
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        current = get_schema_version(cur)
+    finally:
+        cur.close()
+        conn.close()
+    return current, latest_version()
+
+
+def print_status():
+    from .database import _connect
+
+    conn = _connect()
+    cur = conn.cursor()
+    try:
+        current = get_schema_version(cur)
+        applied = _applied(cur) if current else {}
+    finally:
+        cur.close()
+        conn.close()
+
+    for version, name, _ in discover_migrations():
+        mark = '✅' if version in applied else '⏳'
+        print(f"{mark} {version:04d}_{name}")
+    print(f"\nSchema version: {current} / {latest_version()}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Apply database schema migrations')
+    parser.add_argument('command', nargs='?', default='upgrade', choices=['upgrade', 'status'])
+    args = parser.parse_args(argv)
+
+    if args.command == 'status':
+        print_status()
+        return 0
+
+    applied = apply_migrations()
+    if applied:
+        print(f"✅ Applied {len(applied)} migration(s), schema is at version {applied[-1]}")
+    else:
+        print("✅ Schema is up to date")
+    return 0
+
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+    load_dotenv()
+    sys.exit(main())
@@ -0,0 +1,18 @@
+-- migrate: no-transaction
+-- Secondary indexes for the per-user and webhook lookups.
+-- favorites(user_id) and product_inventory(product_id) are already served by
+-- the leading column of their UNIQUE constraints.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cart_user_id ON cart (user_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_category_id ON products (category_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_orders_user_created ON orders (user_id, created_at DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_orders_payment_id ON orders (payment_id) WHERE payment_id IS NOT NULL;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_order_items_order_id ON order_items (order_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chat_messages_user_created ON chat_messages (user_id, created_at);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chat_messages_sender_created ON chat_messages (sender_id, created_at);
@@ -0,0 +1,20 @@
+-- migrate: no-transaction
+-- Keyset pagination for GET /api/products: every sort is (column, id) so the
+-- cursor comparison (column, id) > (%s, %s) is served by an index range scan.
+-- Rows that existed before this migration share one created_at and are
+-- ordered among themselves by id.
+
+ALTER TABLE products ADD COLUMN IF NOT EXISTS created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_created_id ON products (created_at, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_price_id ON products (price, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_name_id ON products (name, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_category_created_id ON products (category_id, created_at, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_category_price_id ON products (category_id, price, id);
+
+-- Covered by the leading column of idx_products_category_created_id
+DROP INDEX CONCURRENTLY IF EXISTS idx_products_category_id;
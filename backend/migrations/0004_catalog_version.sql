@@ -0,0 +1,38 @@
+-- Catalog version for ETags on the public read endpoints.
+-- A sequence (not a counter row) so concurrent writers never queue behind
+-- each other; every write statement to the catalog tables takes the next
+-- value and announces it on the cache_invalidation channel, which Postgres
+-- delivers only once the transaction commits.
+
+CREATE SEQUENCE IF NOT EXISTS catalog_version_seq;
+
+CREATE OR REPLACE FUNCTION bump_catalog_version() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify(
+        'cache_invalidation',
+        json_build_object('scope', 'catalog_version', 'key', nextval('catalog_version_seq'))::text
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS products_catalog_version ON products;
+CREATE TRIGGER products_catalog_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON products
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version();
+
+DROP TRIGGER IF EXISTS product_inventory_catalog_version ON product_inventory;
+CREATE TRIGGER product_inventory_catalog_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON product_inventory
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version();
+
+DROP TRIGGER IF EXISTS categories_catalog_version ON categories;
+CREATE TRIGGER categories_catalog_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON categories
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version();
+
+-- /api/config is built from platform settings too
+DROP TRIGGER IF EXISTS platform_settings_catalog_version ON platform_settings;
+CREATE TRIGGER platform_settings_catalog_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON platform_settings
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version();
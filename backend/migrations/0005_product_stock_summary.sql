@@ -0,0 +1,104 @@
+-- Per-product stock summary kept current by triggers on product_inventory.
+-- Products without inventory rows have no summary row ("not tracked").
+
+CREATE TABLE IF NOT EXISTS product_stock_summary (
+    product_id VARCHAR PRIMARY KEY REFERENCES products(id) ON DELETE CASCADE,
+    total_quantity INTEGER NOT NULL DEFAULT 0,
+    variant_count INTEGER NOT NULL DEFAULT 0,
+    in_stock_variants INTEGER NOT NULL DEFAULT 0,
+    min_backorder_lead_time_days INTEGER,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_product_stock_summary_in_stock
+    ON product_stock_summary (product_id) WHERE in_stock_variants > 0;
+
+CREATE OR REPLACE FUNCTION refresh_product_stock_summary(product_ids VARCHAR[]) RETURNS void AS $$
+BEGIN
+    IF product_ids IS NULL OR cardinality(product_ids) = 0 THEN
+        RETURN;
+    END IF;
+
+    -- Lock the summary rows first (in id order) so concurrent writers to the
+    -- same product queue up here. Each following statement takes a fresh
+    -- snapshot, so the aggregate includes whatever they committed.
+    INSERT INTO product_stock_summary (product_id)
+        SELECT id FROM products WHERE id = ANY(product_ids) ORDER BY id
+        ON CONFLICT (product_id) DO NOTHING;
+    PERFORM 1 FROM product_stock_summary
+        WHERE product_id = ANY(product_ids) ORDER BY product_id FOR UPDATE;
+
+    UPDATE product_stock_summary s SET
+        total_quantity = a.total_quantity,
+        variant_count = a.variant_count,
+        in_stock_variants = a.in_stock_variants,
+        min_backorder_lead_time_days = a.min_lead_time,
+        updated_at = CURRENT_TIMESTAMP
+    FROM (
+        SELECT product_id,
+               COALESCE(SUM(quantity), 0) AS total_quantity,
+               COUNT(*) AS variant_count,
+               COUNT(*) FILTER (WHERE quantity > 0) AS in_stock_variants,
+               MIN(backorder_lead_time_days) AS min_lead_time
+        FROM product_inventory
+        WHERE product_id = ANY(product_ids)
+        GROUP BY product_id
+    ) a
+    WHERE s.product_id = a.product_id;
+
+    DELETE FROM product_stock_summary s
+        WHERE s.product_id = ANY(product_ids)
+          AND NOT EXISTS (SELECT 1 FROM product_inventory i WHERE i.product_id = s.product_id);
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION product_inventory_refresh_summary() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM refresh_product_stock_summary(ARRAY(SELECT DISTINCT product_id FROM new_rows));
+    ELSIF TG_OP = 'UPDATE' THEN
+        PERFORM refresh_product_stock_summary(ARRAY(
+            SELECT product_id FROM new_rows UNION SELECT product_id FROM old_rows
+        ));
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM refresh_product_stock_summary(ARRAY(SELECT DISTINCT product_id FROM old_rows));
+    ELSE
+        DELETE FROM product_stock_summary;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS product_stock_summary_insert ON product_inventory;
+CREATE TRIGGER product_stock_summary_insert
+    AFTER INSERT ON product_inventory REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION product_inventory_refresh_summary();
+
+DROP TRIGGER IF EXISTS product_stock_summary_update ON product_inventory;
+CREATE TRIGGER product_stock_summary_update
+    AFTER UPDATE ON product_inventory REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION product_inventory_refresh_summary();
+
+DROP TRIGGER IF EXISTS product_stock_summary_delete ON product_inventory;
+CREATE TRIGGER product_stock_summary_delete
+    AFTER DELETE ON product_inventory REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION product_inventory_refresh_summary();
+
+DROP TRIGGER IF EXISTS product_stock_summary_truncate ON product_inventory;
+CREATE TRIGGER product_stock_summary_truncate
+    AFTER TRUNCATE ON product_inventory
+    FOR EACH STATEMENT EXECUTE FUNCTION product_inventory_refresh_summary();
+
+-- Backfill
+INSERT INTO product_stock_summary (product_id, total_quantity, variant_count, in_stock_variants, min_backorder_lead_time_days)
+    SELECT i.product_id, COALESCE(SUM(i.quantity), 0), COUNT(*), COUNT(*) FILTER (WHERE i.quantity > 0),
+           MIN(i.backorder_lead_time_days)
+    FROM product_inventory i
+    JOIN products p ON p.id = i.product_id
+    GROUP BY i.product_id
+ON CONFLICT (product_id) DO UPDATE SET
+    total_quantity = EXCLUDED.total_quantity,
+    variant_count = EXCLUDED.variant_count,
+    in_stock_variants = EXCLUDED.in_stock_variants,
+    min_backorder_lead_time_days = EXCLUDED.min_backorder_lead_time_days,
+    updated_at = CURRENT_TIMESTAMP;
@@ -0,0 +1,94 @@
+-- Product search: full-text over name / category / description with both the
+-- russian (stemmed) and simple (exact / prefix) configurations, plus trigram
+-- word similarity on the name for typos. Query parsing and ranking live in SQL
+-- so the backend and both bots share them.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector;
+
+CREATE OR REPLACE FUNCTION product_search_document(p_name TEXT, p_description TEXT, p_category TEXT)
+RETURNS tsvector AS $$
+    SELECT setweight(to_tsvector('russian', coalesce(p_name, '')), 'A')
+        || setweight(to_tsvector('simple', coalesce(p_name, '')), 'A')
+        || setweight(to_tsvector('russian', coalesce(p_category, '')), 'B')
+        || setweight(to_tsvector('simple', coalesce(p_category, '')), 'B')
+        || setweight(to_tsvector('russian', coalesce(p_description, '')), 'C')
+        || setweight(to_tsvector('simple', coalesce(p_description, '')), 'D')
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Every word matches either its russian stem or, as a prefix, its simple form
+-- (so "кросс" finds "кроссовки" while typing). Russian stop words are dropped.
+-- match_all = false ORs the words instead (free-form questions to the AI bot).
+-- Returns NULL when nothing searchable is left.
+CREATE OR REPLACE FUNCTION product_search_query(q TEXT, match_all BOOLEAN DEFAULT TRUE)
+RETURNS tsquery AS $$
+DECLARE
+    result tsquery;
+    stem tsquery;
+    term tsquery;
+    word TEXT;
+BEGIN
+    FOR word IN
+        SELECT w FROM regexp_split_to_table(lower(coalesce(q, '')), '[[:space:][:punct:]]+') AS w WHERE w <> ''
+    LOOP
+        stem := plainto_tsquery('russian', word);
+        CONTINUE WHEN numnode(stem) = 0;
+        term := to_tsquery('simple', quote_literal(word) || ':*') || stem;
+        IF result IS NULL THEN
+            result := term;
+        ELSIF match_all THEN
+            result := result && term;
+        ELSE
+            result := result || term;
+        END IF;
+    END LOOP;
+    RETURN result;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- Full-text rank (weights favour name > category > description) plus how
+-- closely the raw query matches a word sequence in the name.
+CREATE OR REPLACE FUNCTION product_search_rank(doc tsvector, p_name TEXT, query tsquery, q TEXT)
+RETURNS REAL AS $$
+    SELECT coalesce(ts_rank_cd('{0.1, 0.2, 0.4, 1.0}', doc, query, 1), 0)
+         + word_similarity(q, p_name)
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION products_update_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := product_search_document(
+        NEW.name, NEW.description,
+        (SELECT name FROM categories WHERE id = NEW.category_id)
+    );
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS products_search_vector ON products;
+CREATE TRIGGER products_search_vector
+    BEFORE INSERT OR UPDATE OF name, description, category_id ON products
+    FOR EACH ROW EXECUTE FUNCTION products_update_search_vector();
+
+CREATE OR REPLACE FUNCTION categories_update_product_search() RETURNS trigger AS $$
+BEGIN
+    UPDATE products
+    SET search_vector = product_search_document(name, description, NEW.name)
+    WHERE category_id = NEW.id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS categories_product_search ON categories;
+CREATE TRIGGER categories_product_search
+    AFTER UPDATE OF name ON categories
+    FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+    EXECUTE FUNCTION categories_update_product_search();
+
+UPDATE products p
+SET search_vector = product_search_document(
+    p.name, p.description, (SELECT name FROM categories c WHERE c.id = p.category_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_products_search_vector ON products USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_products_name_trgm ON products USING GIN (name gin_trgm_ops);
@@ -0,0 +1,10 @@
+-- Search queries that returned results, counted for autocomplete popularity.
+-- query is normalized by the application (lowercase, single spaces).
+
+CREATE TABLE IF NOT EXISTS search_queries (
+    query VARCHAR(100) PRIMARY KEY,
+    hits INTEGER NOT NULL DEFAULT 1,
+    last_searched_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_search_queries_hits ON search_queries (hits DESC);
@@ -0,0 +1,7 @@
+-- migrate: no-transaction
+-- Facet filters on GET /api/products and /api/products/facets:
+-- colors @> ARRAY[...] and attributes @> '[{"name": ..., "values": [...]}]'.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_colors ON products USING GIN (colors);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_attributes ON products USING GIN (attributes jsonb_path_ops);
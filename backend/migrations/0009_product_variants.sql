@@ -0,0 +1,179 @@
+-- Product variants (SKUs): one row per (product, color, attribute 1, attribute 2)
+-- with a stable id. product_inventory, cart and order_items reference it, so
+-- stock lookups are equality probes on variant_id instead of NULL-tolerant
+-- comparisons on three columns.
+--
+-- Attribute N of a variant is the value chosen for the product's N-th entry
+-- in products.attributes (the order the admin inventory form uses). Blank
+-- strings are stored as NULL. NULLS NOT DISTINCT needs PostgreSQL 15+.
+
+CREATE TABLE IF NOT EXISTS product_variants (
+    id VARCHAR PRIMARY KEY DEFAULT gen_random_uuid(),
+    product_id VARCHAR NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    color TEXT,
+    attribute1_value TEXT,
+    attribute2_value TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT product_variants_key UNIQUE NULLS NOT DISTINCT (product_id, color, attribute1_value, attribute2_value)
+);
+
+-- Id of the variant, created on first use; a lookup on product_variants_key.
+CREATE OR REPLACE FUNCTION product_variant_id(
+    p_product_id VARCHAR, p_color TEXT, p_attribute1 TEXT, p_attribute2 TEXT
+) RETURNS VARCHAR AS $$
+DECLARE
+    v_id VARCHAR;
+BEGIN
+    IF p_product_id IS NULL THEN
+        RETURN NULL;
+    END IF;
+    p_color := nullif(p_color, '');
+    p_attribute1 := nullif(p_attribute1, '');
+    p_attribute2 := nullif(p_attribute2, '');
+
+    LOOP
+        SELECT id INTO v_id FROM product_variants
+        WHERE product_id = p_product_id
+          AND (color = p_color OR (p_color IS NULL AND color IS NULL))
+          AND (attribute1_value = p_attribute1 OR (p_attribute1 IS NULL AND attribute1_value IS NULL))
+          AND (attribute2_value = p_attribute2 OR (p_attribute2 IS NULL AND attribute2_value IS NULL));
+        IF FOUND THEN
+            RETURN v_id;
+        END IF;
+
+        INSERT INTO product_variants (product_id, color, attribute1_value, attribute2_value)
+        VALUES (p_product_id, p_color, p_attribute1, p_attribute2)
+        ON CONFLICT ON CONSTRAINT product_variants_key DO NOTHING
+        RETURNING id INTO v_id;
+        IF v_id IS NOT NULL THEN
+            RETURN v_id;
+        END IF;
+        -- A concurrent insert won; read its row
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Same for a cart/order selection: {"<attribute name>": "<value>", ...} is
+-- mapped onto attribute 1/2 by the product's attribute order, falling back
+-- to the object's own order when the names do not match.
+CREATE OR REPLACE FUNCTION product_variant_id(
+    p_product_id VARCHAR, p_color TEXT, p_selected_attributes JSONB
+) RETURNS VARCHAR AS $$
+DECLARE
+    v_values TEXT[];
+BEGIN
+    IF jsonb_typeof(p_selected_attributes) = 'object' THEN
+        SELECT array_agg(p_selected_attributes->>(a.item->>'name') ORDER BY a.position) INTO v_values
+        FROM products p
+        CROSS JOIN LATERAL jsonb_array_elements(
+            CASE WHEN jsonb_typeof(p.attributes) = 'array' THEN p.attributes ELSE '[]'::jsonb END
+        ) WITH ORDINALITY AS a(item, position)
+        WHERE p.id = p_product_id AND a.position <= 2;
+
+        IF v_values IS NULL OR (v_values[1] IS NULL AND v_values[2] IS NULL) THEN
+            SELECT array_agg(value) INTO v_values FROM jsonb_each_text(p_selected_attributes);
+        END IF;
+    END IF;
+    RETURN product_variant_id(p_product_id, p_color, v_values[1], v_values[2]);
+END;
+$$ LANGUAGE plpgsql;
+
+-- product_inventory: drop the duplicates the old UNIQUE let through (it
+-- treated NULLs as distinct, so ON CONFLICT never fired for them)
+UPDATE product_inventory SET
+    color = nullif(color, ''),
+    attribute1_value = nullif(attribute1_value, ''),
+    attribute2_value = nullif(attribute2_value, '')
+WHERE color = '' OR attribute1_value = '' OR attribute2_value = '';
+
+-- Re-imports inserted a new row each time; the most recently updated one wins
+DELETE FROM product_inventory i USING (
+    SELECT id, row_number() OVER (
+        PARTITION BY product_id, color, attribute1_value, attribute2_value
+        ORDER BY updated_at DESC NULLS LAST, id
+    ) AS n
+    FROM product_inventory
+) d
+WHERE i.id = d.id AND d.n > 1;
+
+DELETE FROM product_inventory WHERE product_id IS NULL;
+
+INSERT INTO product_variants (product_id, color, attribute1_value, attribute2_value)
+    SELECT DISTINCT product_id, color, attribute1_value, attribute2_value FROM product_inventory
+ON CONFLICT ON CONSTRAINT product_variants_key DO NOTHING;
+
+ALTER TABLE product_inventory ADD COLUMN IF NOT EXISTS variant_id VARCHAR REFERENCES product_variants(id) ON DELETE CASCADE;
+
+UPDATE product_inventory i SET variant_id = v.id
+FROM product_variants v
+WHERE i.variant_id IS NULL AND v.product_id = i.product_id
+  AND v.color IS NOT DISTINCT FROM i.color
+  AND v.attribute1_value IS NOT DISTINCT FROM i.attribute1_value
+  AND v.attribute2_value IS NOT DISTINCT FROM i.attribute2_value;
+
+ALTER TABLE product_inventory ALTER COLUMN variant_id SET NOT NULL;
+
+-- variant_id replaces the column-wise UNIQUE (which also served product_id lookups)
+DO $$
+DECLARE
+    c RECORD;
+BEGIN
+    FOR c IN SELECT conname FROM pg_constraint
+             WHERE conrelid = 'product_inventory'::regclass AND contype = 'u' LOOP
+        EXECUTE format('ALTER TABLE product_inventory DROP CONSTRAINT %I', c.conname);
+    END LOOP;
+END;
+$$;
+
+ALTER TABLE product_inventory ADD CONSTRAINT product_inventory_variant_id_key UNIQUE (variant_id);
+
+CREATE INDEX IF NOT EXISTS idx_product_inventory_product_id ON product_inventory (product_id);
+
+-- Writers keep setting the key columns; the variant is resolved from them
+CREATE OR REPLACE FUNCTION product_inventory_set_variant() RETURNS trigger AS $$
+BEGIN
+    NEW.color := nullif(NEW.color, '');
+    NEW.attribute1_value := nullif(NEW.attribute1_value, '');
+    NEW.attribute2_value := nullif(NEW.attribute2_value, '');
+    NEW.variant_id := product_variant_id(NEW.product_id, NEW.color, NEW.attribute1_value, NEW.attribute2_value);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS product_inventory_set_variant ON product_inventory;
+CREATE TRIGGER product_inventory_set_variant
+    BEFORE INSERT OR UPDATE OF product_id, color, attribute1_value, attribute2_value ON product_inventory
+    FOR EACH ROW EXECUTE FUNCTION product_inventory_set_variant();
+
+-- cart and order_items: resolved from the selection unless given explicitly
+CREATE OR REPLACE FUNCTION selection_set_variant() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' AND NEW.variant_id IS NOT NULL THEN
+        RETURN NEW;
+    END IF;
+    NEW.variant_id := product_variant_id(NEW.product_id, NEW.selected_color, NEW.selected_attributes);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+ALTER TABLE cart ADD COLUMN IF NOT EXISTS variant_id VARCHAR REFERENCES product_variants(id) ON DELETE CASCADE;
+ALTER TABLE order_items ADD COLUMN IF NOT EXISTS variant_id VARCHAR REFERENCES product_variants(id) ON DELETE SET NULL;
+
+UPDATE cart SET variant_id = product_variant_id(product_id, selected_color, selected_attributes)
+WHERE variant_id IS NULL AND product_id IS NOT NULL;
+
+UPDATE order_items SET variant_id = product_variant_id(product_id, selected_color, selected_attributes)
+WHERE variant_id IS NULL AND product_id IS NOT NULL;
+
+DROP TRIGGER IF EXISTS cart_set_variant ON cart;
+CREATE TRIGGER cart_set_variant
+    BEFORE INSERT OR UPDATE OF product_id, selected_color, selected_attributes ON cart
+    FOR EACH ROW EXECUTE FUNCTION selection_set_variant();
+
+DROP TRIGGER IF EXISTS order_items_set_variant ON order_items;
+CREATE TRIGGER order_items_set_variant
+    BEFORE INSERT OR UPDATE OF product_id, selected_color, selected_attributes ON order_items
+    FOR EACH ROW EXECUTE FUNCTION selection_set_variant();
+
+CREATE INDEX IF NOT EXISTS idx_cart_variant_id ON cart (variant_id);
+CREATE INDEX IF NOT EXISTS idx_order_items_variant_id ON order_items (variant_id);
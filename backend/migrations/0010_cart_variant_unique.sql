@@ -0,0 +1,22 @@
+-- One cart line per (user, variant), so adding to the cart is a single
+-- INSERT ... ON CONFLICT (user_id, variant_id) DO UPDATE.
+-- Lines that were added twice by racing requests are merged first.
+
+WITH ranked AS (
+    SELECT id, first_value(id) OVER w AS keep_id, sum(quantity) OVER w AS total_quantity
+    FROM cart
+    WHERE variant_id IS NOT NULL
+    WINDOW w AS (PARTITION BY user_id, variant_id ORDER BY id
+                 ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING)
+),
+merged AS (
+    UPDATE cart c SET quantity = r.total_quantity
+    FROM ranked r
+    WHERE c.id = r.id AND r.id = r.keep_id AND c.quantity <> r.total_quantity
+)
+DELETE FROM cart c USING ranked r WHERE c.id = r.id AND r.id <> r.keep_id;
+
+ALTER TABLE cart ADD CONSTRAINT cart_user_variant_key UNIQUE (user_id, variant_id);
+
+-- Served by the leading column of cart_user_variant_key
+DROP INDEX IF EXISTS idx_cart_user_id;
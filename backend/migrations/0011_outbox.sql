@@ -0,0 +1,34 @@
+-- Transactional outbox for side effects (Telegram messages, emails).
+-- Rows are written in the same transaction as the change they announce and
+-- delivered by the worker in backend/outbox.py, which claims due rows with
+-- FOR UPDATE SKIP LOCKED. status: pending -> sent | skipped | dead.
+
+CREATE TABLE IF NOT EXISTS outbox (
+    id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload JSONB NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 8,
+    available_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (available_at, id) WHERE status = 'pending';
+
+CREATE INDEX IF NOT EXISTS idx_outbox_status_created ON outbox (status, created_at);
+
+-- Wakes the worker when the inserting transaction commits
+CREATE OR REPLACE FUNCTION outbox_notify() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('outbox', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS outbox_notify ON outbox;
+CREATE TRIGGER outbox_notify
+    AFTER INSERT ON outbox
+    FOR EACH STATEMENT EXECUTE FUNCTION outbox_notify();
@@ -0,0 +1,18 @@
+-- Order history (GET /api/orders) in one query: the item thumbnail is
+-- snapshotted into order_items at checkout instead of joined from products,
+-- and pages are keyset-paginated on (created_at, id).
+
+ALTER TABLE order_items ADD COLUMN IF NOT EXISTS image_url TEXT;
+
+UPDATE order_items oi SET image_url = p.images[1]
+FROM products p
+WHERE oi.product_id = p.id AND oi.image_url IS NULL;
+
+-- The cursor compares (created_at, id); NULL would drop the row from every page
+UPDATE orders SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL;
+ALTER TABLE orders ALTER COLUMN created_at SET NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_orders_user_created_id ON orders (user_id, created_at DESC, id DESC);
+
+-- Superseded by idx_orders_user_created_id
+DROP INDEX IF EXISTS idx_orders_user_created;
@@ -0,0 +1,15 @@
+-- migrate: no-transaction
+-- Admin order console (GET /api/admin/orders, see order_queries.py):
+-- newest-first pages with and without a status filter, and q matching an
+-- order id prefix, the digits of the customer phone or part of the name.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_orders_created_id ON orders (created_at DESC, id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_orders_status_created_id ON orders (status, created_at DESC, id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_orders_id_prefix ON orders (id text_pattern_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_orders_customer_name_trgm ON orders USING GIN (customer_name gin_trgm_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_orders_customer_phone_digits_trgm ON orders
+    USING GIN ((regexp_replace(coalesce(customer_phone, ''), '[^0-9]', '', 'g')) gin_trgm_ops);
@@ -0,0 +1,52 @@
+-- Order change feed (GET /api/orders/changes, /api/admin/orders/changes):
+-- updated_at moves when an order is created or its status or payment status
+-- changes, and each such write is announced on cache_invalidation as
+-- {"scope": "orders", "key": <user id>} once the transaction commits, which
+-- wakes the long-polling requests (see order_changes.py).
+
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP;
+
+UPDATE orders SET updated_at = created_at WHERE updated_at IS NULL;
+
+ALTER TABLE orders ALTER COLUMN updated_at SET DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE orders ALTER COLUMN updated_at SET NOT NULL;
+
+-- clock_timestamp(), not the transaction start, so the feed sees the order in
+-- (close to) commit order
+CREATE OR REPLACE FUNCTION orders_set_updated_at() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT'
+       OR NEW.status IS DISTINCT FROM OLD.status
+       OR NEW.payment_status IS DISTINCT FROM OLD.payment_status THEN
+        NEW.updated_at := clock_timestamp();
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS orders_set_updated_at ON orders;
+CREATE TRIGGER orders_set_updated_at
+    BEFORE INSERT OR UPDATE OF status, payment_status ON orders
+    FOR EACH ROW EXECUTE FUNCTION orders_set_updated_at();
+
+CREATE OR REPLACE FUNCTION orders_notify_change() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('cache_invalidation', json_build_object('scope', 'orders', 'key', NEW.user_id)::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS orders_notify_insert ON orders;
+CREATE TRIGGER orders_notify_insert
+    AFTER INSERT ON orders
+    FOR EACH ROW EXECUTE FUNCTION orders_notify_change();
+
+DROP TRIGGER IF EXISTS orders_notify_change ON orders;
+CREATE TRIGGER orders_notify_change
+    AFTER UPDATE OF status, payment_status ON orders
+    FOR EACH ROW
+    WHEN (NEW.updated_at IS DISTINCT FROM OLD.updated_at)
+    EXECUTE FUNCTION orders_notify_change();
+
+CREATE INDEX IF NOT EXISTS idx_orders_user_updated ON orders (user_id, updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_orders_updated ON orders (updated_at, id);
@@ -0,0 +1,47 @@
+-- Stock movements no longer bump the catalog version (migration 0004): every
+-- checkout decrements product_inventory, and a version bump invalidates every
+-- ETag, the compressed body cache and the catalog snapshot of every worker.
+--
+-- The version still moves when inventory rows appear, disappear, change
+-- variant or lead time, or a quantity crosses zero (in stock <-> backorder),
+-- which is what the cached catalog responses show. Any other quantity change
+-- is announced as {"scope": "inventory", "key": <product id>}, and the
+-- snapshot re-reads just those products' rows (see catalog_snapshot.py).
+
+CREATE OR REPLACE FUNCTION product_inventory_changed() RETURNS trigger AS $$
+DECLARE
+    v_product_id VARCHAR;
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM new_rows n JOIN old_rows o ON o.id = n.id
+        WHERE (o.quantity > 0) IS DISTINCT FROM (n.quantity > 0)
+           OR o.product_id IS DISTINCT FROM n.product_id
+           OR o.variant_id IS DISTINCT FROM n.variant_id
+           OR o.backorder_lead_time_days IS DISTINCT FROM n.backorder_lead_time_days
+    ) THEN
+        FOR v_product_id IN SELECT DISTINCT product_id FROM new_rows LOOP
+            PERFORM pg_notify(
+                'cache_invalidation',
+                json_build_object('scope', 'inventory', 'key', v_product_id)::text
+            );
+        END LOOP;
+        RETURN NULL;
+    END IF;
+    PERFORM pg_notify(
+        'cache_invalidation',
+        json_build_object('scope', 'catalog_version', 'key', nextval('catalog_version_seq'))::text
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS product_inventory_catalog_version ON product_inventory;
+CREATE TRIGGER product_inventory_catalog_version
+    AFTER INSERT OR DELETE OR TRUNCATE ON product_inventory
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version();
+
+DROP TRIGGER IF EXISTS product_inventory_catalog_version_update ON product_inventory;
+CREATE TRIGGER product_inventory_catalog_version_update
+    AFTER UPDATE ON product_inventory
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION product_inventory_changed();
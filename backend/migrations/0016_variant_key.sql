@@ -0,0 +1,58 @@
+-- Product variants keyed on variant_key = ARRAY[color, attribute1_value,
+-- attribute2_value]. Arrays compare NULL elements as equal, so
+-- UNIQUE (product_id, variant_key) keeps NULLs not distinct on PostgreSQL 12+
+-- and lookups are one equality probe on that index. 0009 used
+-- UNIQUE NULLS NOT DISTINCT over the four columns, which needs 15; servers
+-- below that ran 0009_product_variants.pg14.sql, which already has
+-- variant_key, and only get the new lookup function here.
+
+ALTER TABLE product_variants ADD COLUMN IF NOT EXISTS variant_key TEXT[]
+    GENERATED ALWAYS AS (ARRAY[color, attribute1_value, attribute2_value]) STORED;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint c
+        JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = ANY(c.conkey)
+        WHERE c.conrelid = 'product_variants'::regclass
+          AND c.conname = 'product_variants_key'
+          AND a.attname = 'variant_key'
+    ) THEN
+        ALTER TABLE product_variants DROP CONSTRAINT IF EXISTS product_variants_key;
+        ALTER TABLE product_variants ADD CONSTRAINT product_variants_key UNIQUE (product_id, variant_key);
+    END IF;
+END;
+$$;
+
+-- Id of the variant, created on first use; a probe on product_variants_key
+-- (the column-by-column NULL-tolerant comparison could not use it)
+CREATE OR REPLACE FUNCTION product_variant_id(
+    p_product_id VARCHAR, p_color TEXT, p_attribute1 TEXT, p_attribute2 TEXT
+) RETURNS VARCHAR AS $$
+DECLARE
+    v_id VARCHAR;
+    v_key TEXT[];
+BEGIN
+    IF p_product_id IS NULL THEN
+        RETURN NULL;
+    END IF;
+    v_key := ARRAY[nullif(p_color, ''), nullif(p_attribute1, ''), nullif(p_attribute2, '')];
+
+    LOOP
+        SELECT id INTO v_id FROM product_variants
+        WHERE product_id = p_product_id AND variant_key = v_key;
+        IF FOUND THEN
+            RETURN v_id;
+        END IF;
+
+        INSERT INTO product_variants (product_id, color, attribute1_value, attribute2_value)
+        VALUES (p_product_id, v_key[1], v_key[2], v_key[3])
+        ON CONFLICT ON CONSTRAINT product_variants_key DO NOTHING
+        RETURNING id INTO v_id;
+        IF v_id IS NOT NULL THEN
+            RETURN v_id;
+        END IF;
+        -- A concurrent insert won; read its row
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
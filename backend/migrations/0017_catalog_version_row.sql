@@ -0,0 +1,63 @@
+-- Catalog version as a committed counter row instead of catalog_version_seq.
+-- The sequence's last_value includes nextval() calls of writers that have
+-- not committed yet, so a reader could see version N+1 next to the rows of
+-- N and keep serving them as N+1 until the next bump. The row is updated in
+-- the writer's transaction: a reader sees the new value exactly when it sees
+-- the rows, and values follow commit order.
+--
+-- Writers of the catalog now wait on each other for the row until commit.
+-- They are rare: admin edits, and checkouts only when a quantity crosses zero
+-- (migration 0015). catalog_version_seq is left in place for workers still
+-- running the previous code during a deploy.
+
+CREATE TABLE IF NOT EXISTS catalog_version (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    version BIGINT NOT NULL
+);
+
+-- Start past every value the sequence handed out, so no ETag issued from it
+-- is reused for different content
+INSERT INTO catalog_version (version)
+SELECT last_value + 1 FROM catalog_version_seq
+ON CONFLICT (id) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION next_catalog_version() RETURNS BIGINT AS $$
+    UPDATE catalog_version SET version = version + 1 RETURNING version;
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION bump_catalog_version() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify(
+        'cache_invalidation',
+        json_build_object('scope', 'catalog_version', 'key', next_catalog_version())::text
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION product_inventory_changed() RETURNS trigger AS $$
+DECLARE
+    v_product_id VARCHAR;
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM new_rows n JOIN old_rows o ON o.id = n.id
+        WHERE (o.quantity > 0) IS DISTINCT FROM (n.quantity > 0)
+           OR o.product_id IS DISTINCT FROM n.product_id
+           OR o.variant_id IS DISTINCT FROM n.variant_id
+           OR o.backorder_lead_time_days IS DISTINCT FROM n.backorder_lead_time_days
+    ) THEN
+        FOR v_product_id IN SELECT DISTINCT product_id FROM new_rows LOOP
+            PERFORM pg_notify(
+                'cache_invalidation',
+                json_build_object('scope', 'inventory', 'key', v_product_id)::text
+            );
+        END LOOP;
+        RETURN NULL;
+    END IF;
+    PERFORM pg_notify(
+        'cache_invalidation',
+        json_build_object('scope', 'catalog_version', 'key', next_catalog_version())::text
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,7 @@
+-- Insertion order of order items. The id is a random uuid, so ordering by it
+-- shuffled the lines of an order. An identity column numbers rows in the
+-- order they are inserted (checkout's multi-row INSERT included) without any
+-- writer setting it; existing rows are numbered in table order, which is
+-- the order the old unsorted per-order query returned them in.
+
+ALTER TABLE order_items ADD COLUMN IF NOT EXISTS position BIGINT GENERATED BY DEFAULT AS IDENTITY;
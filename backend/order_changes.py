@@ -0,0 +1,153 @@
+"""
+Order change feed with long polling.
+
+GET /api/orders/changes and /api/admin/orders/changes return the orders
+created or whose status / payment status changed after a cursor (keyset on
+(updated_at, id), maintained by the triggers of migration 0014). With
+?wait=<seconds> an empty answer is held until a change arrives or the time
+is up: the request waits on a condition variable without a database
+connection and is woken by the 'orders' invalidation messages the same
+triggers send. Without the listener it re-checks every FALLBACK_POLL_INTERVAL.
+
+A waiting request still holds a gunicorn thread, so at most
+CHANGE_FEED_MAX_WAITERS requests per process wait at once; past that the
+answer is immediate and carries retry_after, leaving the other threads to
+cart, checkout and catalog requests.
+
+Changes younger than CHANGE_FEED_SETTLE seconds are left for the next call,
+so a transaction that commits shortly after setting updated_at is not
+skipped by a cursor that already moved past it.
+"""
+import os
+import time
+import threading
+from collections import defaultdict
+
+from . import invalidation
+
+CHANGE_FEED_SETTLE = float(os.getenv('CHANGE_FEED_SETTLE', '1'))
+MAX_CHANGES = 100
+MAX_WAIT = 25
+FALLBACK_POLL_INTERVAL = 5.0
+# Half the --threads 16 of the deploy commands; keep it below --threads
+CHANGE_FEED_MAX_WAITERS = int(os.getenv('CHANGE_FEED_MAX_WAITERS', '8'))
+RETRY_AFTER = 5
+
+_cond = threading.Condition()
+# Change counters, kept only for the keys somebody is waiting on: a user id,
+# or None for the admin feed (every order)
+_versions = {}
+_waiters = defaultdict(int)
+_state = {'changes': 0, 'wakeups': 0, 'refused_waits': 0}
+
+
+def _on_order_change(key=None):
+    with _cond:
+        _state['changes'] += 1
+        for watched in list(_versions):
+            # key None: the listener reconnected and may have missed messages
+            if key is None or watched is None or watched == key:
+                _versions[watched] += 1
+        _cond.notify_all()
+
+invalidation.subscribe(invalidation.ORDERS, _on_order_change)
+
+
+def parse_wait(args):
+    """Seconds to hold an empty answer, from ?wait= (0..MAX_WAIT). Raises ValueError."""
+    value = args.get('wait')
+    if value in (None, ''):
+        return 0
+    try:
+        wait = float(value)
+    except ValueError:
+        raise ValueError('wait must be a number of seconds')
+    return max(0.0, min(wait, MAX_WAIT))
+
+
+def changes_condition(cursor, alias='o'):
+    """
+    (sql, params) for settled changes after `cursor` ((updated_at, id) or
+    None); order by updated_at, id.
+    """
+    sql = f"{alias}.updated_at <= clock_timestamp()::timestamp - %s * interval '1 second'"
+    params = [CHANGE_FEED_SETTLE]
+    if cursor:
+        sql += f' AND ({alias}.updated_at, {alias}.id) > (%s::timestamp, %s)'
+        params.extend(cursor)
+    return sql, tuple(params)
+
+
+def poll_changes(fetch, user_id=None, wait=0):
+    """
+    Call fetch() until it returns rows or `wait` seconds passed, sleeping
+    between calls until an order of `user_id` (any order for None) changes.
+    fetch must not keep a database connection checked out between calls.
+    Returns (rows, waited): waited is False when the wait was refused because
+    CHANGE_FEED_MAX_WAITERS requests are already waiting.
+    """
+    if wait <= 0:
+        return fetch(), True
+    deadline = time.monotonic() + wait
+    with _cond:
+        if sum(_waiters.values()) >= CHANGE_FEED_MAX_WAITERS:
+            _state['refused_waits'] += 1
+            refused = True
+        else:
+            refused = False
+            _waiters[user_id] += 1
+            _versions.setdefault(user_id, 0)
+    if refused:
+        return fetch(), False
+    # A change made just before this call is still settling and sent no
+    # message we could wait for: look once more when it has settled
+    recheck_at = time.monotonic() + CHANGE_FEED_SETTLE
+    try:
+        while True:
+            with _cond:
+                seen = _versions[user_id]
+            rows = fetch()
+            remaining = deadline - time.monotonic()
+            if rows or remaining <= 0:
+                return rows, True
+            timeout = remaining if invalidation.is_listening() else min(remaining, FALLBACK_POLL_INTERVAL)
+            if recheck_at is not None:
+                timeout = min(timeout, max(0.0, recheck_at - time.monotonic()))
+                recheck_at = None
+            with _cond:
+                woken = _cond.wait_for(lambda: _versions[user_id] != seen, timeout)
+            if woken:
+                _state['wakeups'] += 1
+                # Let the change settle (see CHANGE_FEED_SETTLE) before reading it
+                time.sleep(min(CHANGE_FEED_SETTLE, max(0.0, deadline - time.monotonic())))
+    finally:
+        with _cond:
+            _waiters[user_id] -= 1
+            if not _waiters[user_id]:
+                del _waiters[user_id]
+                del _versions[user_id]
+
+
+def get_feed_stats():
+    with _cond:
+        return {**_state, 'waiting_requests': sum(_waiters.values()), 'watched_keys': len(_versions),
+                'max_waiters': CHANGE_FEED_MAX_WAITERS}
+
+
+def current_cursor(cur):
+    """Cursor for "from now on", for clients that have no cursor yet."""
+    cur.execute("SELECT clock_timestamp()::timestamp - %s * interval '1 second' AS now", (CHANGE_FEED_SETTLE,))
+    return cur.fetchone()['now'], ''
+
+
+def run_detached(query):
+    """query(cur) on a pooled connection that is handed back right after, so waiting holds none."""
+    from .database import get_detached_connection
+
+    conn = get_detached_connection()
+    cur = conn.cursor()
+    try:
+        return query(cur)
+    finally:
+        cur.close()
+        conn.close()
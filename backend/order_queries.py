@@ -0,0 +1,114 @@
+"""
+Order list queries shared by the customer history and the admin console.
+
+Lists are keyset-paginated on (created_at, id), newest first, with an opaque
+cursor. Admin filters: status, payment_status, payment_method, date_from /
+date_to (ISO dates, both inclusive) and q, which matches an order id prefix
+("#3f2a"), the digits of the customer phone or part of the customer name;
+each of the three is served by an index from migration 0013.
+"""
+import json
+import base64
+from datetime import datetime, timedelta
+
+ORDER_FILTERS = ('status', 'payment_status', 'payment_method')
+MIN_SEARCH_LENGTH = 2
+
+ORDER_ITEMS_SQL = 'SELECT * FROM order_items WHERE order_id = ANY(%s) ORDER BY order_id, position'
+
+
+def encode_order_cursor(created_at, order_id):
+    raw = json.dumps([created_at.isoformat(), order_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_order_cursor(cursor):
+    """Opaque cursor -> (created_at, id) of the last order of the previous page."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, order_id = json.loads(raw)
+        datetime.fromisoformat(created_at)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+    return created_at, order_id
+
+
+def cursor_condition(cursor, alias='o'):
+    """(sql, params) for the rows after `cursor` in (created_at DESC, id DESC) order."""
+    return f'({alias}.created_at, {alias}.id) < (%s::timestamp, %s)', tuple(cursor)
+
+
+def _parse_date(args, name):
+    value = (args.get(name) or '').strip()
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'{name} must be an ISO date (YYYY-MM-DD)')
+
+
+def parse_order_filters(args):
+    """Filters from the query string; raises ValueError for malformed dates."""
+    filters = {}
+    for name in ORDER_FILTERS:
+        value = (args.get(name) or '').strip()
+        if value and value != 'all':
+            filters[name] = value
+    date_from = _parse_date(args, 'date_from')
+    date_to = _parse_date(args, 'date_to')
+    if date_from:
+        filters['date_from'] = date_from
+    if date_to:
+        # A bare date includes the whole day
+        filters['date_to'] = date_to + timedelta(days=1) if len(args['date_to'].strip()) <= 10 else date_to
+    q = (args.get('q') or '').strip()
+    if len(q) >= MIN_SEARCH_LENGTH:
+        filters['q'] = q
+    return filters
+
+
+def _like_pattern(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def order_search_condition(q, alias='o'):
+    """(sql, params) matching an id prefix, phone digits or customer name."""
+    parts = [f'{alias}.id LIKE %s', f'{alias}.customer_name ILIKE %s']
+    params = [_like_pattern(q.lstrip('#').lower()) + '%', '%' + _like_pattern(q) + '%']
+    digits = ''.join(ch for ch in q if ch.isdigit())
+    if len(digits) >= 3:
+        parts.append(f"regexp_replace(coalesce({alias}.customer_phone, ''), '[^0-9]', '', 'g') LIKE %s")
+        params.append('%' + digits + '%')
+    return '(' + ' OR '.join(parts) + ')', tuple(params)
+
+
+def order_filter_conditions(filters, alias='o', include_status=True):
+    """([sql], params) for parse_order_filters() output."""
+    conditions, params = [], []
+    for name in ORDER_FILTERS:
+        if name in filters and (include_status or name != 'status'):
+            conditions.append(f'{alias}.{name} = %s')
+            params.append(filters[name])
+    if 'date_from' in filters:
+        conditions.append(f'{alias}.created_at >= %s')
+        params.append(filters['date_from'])
+    if 'date_to' in filters:
+        conditions.append(f'{alias}.created_at < %s')
+        params.append(filters['date_to'])
+    if 'q' in filters:
+        sql, search_params = order_search_condition(filters['q'], alias)
+        conditions.append(sql)
+        params.extend(search_params)
+    return conditions, params
+
+
+def get_order_items(cur, order_ids):
+    """{order_id: [items]} for all `order_ids` in one query."""
+    items = {order_id: [] for order_id in order_ids}
+    if not order_ids:
+        return items
+    cur.execute(ORDER_ITEMS_SQL, (list(order_ids),))
+    for row in cur.fetchall():
+        items[row['order_id']].append(row)
+    return items
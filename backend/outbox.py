@@ -0,0 +1,371 @@
+"""
+Transactional outbox for notifications.
+
+Request handlers call enqueue() with the cursor of their own transaction, so
+a message exists exactly when the change it announces was committed, and the
+request never waits on Telegram or SMTP. A worker process drains the table:
+
+    python -m backend.outbox            # run the worker
+    python -m backend.outbox status     # counts per kind and status
+
+The worker claims due rows with FOR UPDATE SKIP LOCKED and leases them by
+moving available_at OUTBOX_LEASE seconds ahead in a short transaction, so
+any number of workers can run side by side and no transaction or row lock
+is held while Telegram or SMTP answers. Failed deliveries are retried with exponential
+backoff; after max_attempts a row is marked 'dead' and stays for the admin
+panel (GET /api/admin/outbox, POST /api/admin/outbox/<id>/retry). Delivery is
+at least once: a worker that dies after sending but before recording it
+leaves the row to be claimed again once the lease runs out.
+
+Where no worker process is deployed (Replit, Render web service), each web
+process runs the same loop in a background thread, started on its first
+request. Servers with a dedicated worker set OUTBOX_WORKER=external.
+"""
+import os
+import sys
+import json
+import time
+import random
+import select
+import argparse
+import threading
+
+from psycopg2.extras import execute_values
+
+ORDER_NOTIFICATION = 'order_notification'
+TELEGRAM_MESSAGE = 'telegram_message'
+EMAIL = 'email'
+
+PENDING = 'pending'
+SENT = 'sent'
+SKIPPED = 'skipped'
+DEAD = 'dead'
+STATUSES = (PENDING, SENT, SKIPPED, DEAD)
+
+CHANNEL = 'outbox'
+
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '8'))
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', '10'))
+OUTBOX_POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', '5'))
+OUTBOX_BASE_BACKOFF = float(os.getenv('OUTBOX_BASE_BACKOFF', '10'))
+OUTBOX_MAX_BACKOFF = float(os.getenv('OUTBOX_MAX_BACKOFF', '3600'))
+OUTBOX_RETENTION_DAYS = int(os.getenv('OUTBOX_RETENTION_DAYS', '7'))
+# Longer than any delivery takes (HTTP and SMTP timeouts), or a slow message
+# is claimed and sent a second time
+OUTBOX_LEASE = float(os.getenv('OUTBOX_LEASE', '300'))
+PURGE_INTERVAL = 3600.0
+MAX_RECONNECT_BACKOFF = 30.0
+
+# 'inprocess': web processes deliver too; 'external': only python -m backend.outbox
+OUTBOX_WORKER = os.getenv('OUTBOX_WORKER', 'inprocess').lower()
+_worker_pid = None
+_worker_lock = threading.Lock()
+
+# Counters of the worker running in this process
+_state = {
+    'batches': 0,
+    'sent': 0,
+    'skipped': 0,
+    'retried': 0,
+    'dead': 0,
+    'purged': 0,
+    'last_batch_at': None,
+}
+
+
+class Skip(Exception):
+    """The message is not to be delivered (e.g. notifications are turned off)."""
+
+
+def enqueue(cur, kind, payload, max_attempts=None):
+    """Queue a message in the caller's transaction. Returns the outbox id."""
+    cur.execute('''
+        INSERT INTO outbox (kind, payload, max_attempts) VALUES (%s, %s::jsonb, %s)
+        RETURNING id
+    ''', (kind, json.dumps(payload, default=str), max_attempts or OUTBOX_MAX_ATTEMPTS))
+    return cur.fetchone()['id']
+
+
+def enqueue_email(cur, to_email, subject, html_content, text_content=None, max_attempts=None):
+    return enqueue(cur, EMAIL, {'to': to_email, 'subject': subject, 'html': html_content,
+                                'text': text_content}, max_attempts)
+
+
+# --- Delivery ---
+
+def _deliver_order_notification(payload):
+    from .database import get_telegram_config
+    from .services.tg_service import format_order_notification, send_telegram_message, TELEGRAM_NOT_CONFIGURED
+
+    if not get_telegram_config().get('notifications_enabled'):
+        raise Skip('Telegram notifications are disabled')
+    text = format_order_notification(payload['order'], payload['items'], payload.get('site_url'))
+    success, error = send_telegram_message(text, parse_mode='HTML')
+    if error == TELEGRAM_NOT_CONFIGURED:
+        raise Skip(error)
+    if not success:
+        raise RuntimeError(error)
+
+
+def _deliver_telegram_message(payload):
+    from .services.tg_service import send_telegram_message
+
+    success, error = send_telegram_message(payload['text'], parse_mode=payload.get('parse_mode'))
+    if not success:
+        raise RuntimeError(error)
+
+
+def _deliver_email(payload):
+    from .services.email_service import send_email
+
+    success, error = send_email(payload['to'], payload['subject'], payload['html'], payload.get('text'))
+    if not success:
+        raise RuntimeError(error)
+
+
+HANDLERS = {
+    ORDER_NOTIFICATION: _deliver_order_notification,
+    TELEGRAM_MESSAGE: _deliver_telegram_message,
+    EMAIL: _deliver_email,
+}
+
+
+def _backoff(attempts):
+    delay = min(OUTBOX_MAX_BACKOFF, OUTBOX_BASE_BACKOFF * 2 ** (attempts - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _deliver(row):
+    """(status, attempts, retry delay in seconds, error) for one claimed row."""
+    attempts = row['attempts'] + 1
+    handler = HANDLERS.get(row['kind'])
+    if handler is None:
+        return DEAD, attempts, 0, f"Unknown outbox kind '{row['kind']}'"
+    try:
+        handler(row['payload'])
+        return SENT, attempts, 0, None
+    except Skip as e:
+        return SKIPPED, attempts, 0, str(e)
+    except Exception as e:
+        if attempts >= row['max_attempts']:
+            return DEAD, attempts, 0, str(e)
+        return PENDING, attempts, _backoff(attempts), str(e)
+
+
+_CLAIM_SQL = '''
+    UPDATE outbox SET available_at = CURRENT_TIMESTAMP + %s * interval '1 second'
+    WHERE id IN (
+        SELECT id FROM outbox
+        WHERE status = 'pending' AND available_at <= CURRENT_TIMESTAMP
+        ORDER BY available_at, id
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, kind, payload, attempts, max_attempts
+'''
+
+
+def _claim(conn, limit):
+    """Lease up to `limit` due messages for OUTBOX_LEASE seconds and commit."""
+    cur = conn.cursor()
+    try:
+        cur.execute(_CLAIM_SQL, (OUTBOX_LEASE, limit))
+        rows = cur.fetchall()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return sorted(rows, key=lambda row: row['id'])
+
+
+def process_batch(conn, limit=None):
+    """
+    Claim up to `limit` due messages, deliver them with no transaction open
+    and record the outcomes in a second short transaction. Returns how many.
+    """
+    rows = _claim(conn, limit or OUTBOX_BATCH_SIZE)
+    results = [(row['id'], *_deliver(row)) for row in rows]
+    cur = conn.cursor()
+    try:
+        if results:
+            execute_values(cur, '''
+                UPDATE outbox o SET
+                    status = v.status,
+                    attempts = v.attempts,
+                    available_at = CURRENT_TIMESTAMP + v.delay * interval '1 second',
+                    last_error = v.error,
+                    sent_at = CASE WHEN v.status = 'sent' THEN CURRENT_TIMESTAMP END
+                FROM (VALUES %s) AS v(id, status, attempts, delay, error)
+                WHERE o.id = v.id
+            ''', results, template='(%s, %s, %s, %s::float8, %s::text)', page_size=len(results))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+    _state['batches'] += 1
+    _state['last_batch_at'] = time.time()
+    for outbox_id, status, attempts, _, error in results:
+        _state['retried' if status == PENDING else status] += 1
+        if status == DEAD:
+            print(f"❌ Outbox message {outbox_id} is dead after {attempts} attempt(s): {error}")
+    return len(rows)
+
+
+def purge(conn):
+    """Drop delivered and skipped messages older than OUTBOX_RETENTION_DAYS."""
+    cur = conn.cursor()
+    try:
+        cur.execute('''
+            DELETE FROM outbox
+            WHERE status IN ('sent', 'skipped') AND created_at < CURRENT_TIMESTAMP - %s * interval '1 day'
+        ''', (OUTBOX_RETENTION_DAYS,))
+        _state['purged'] += cur.rowcount
+        conn.commit()
+    finally:
+        cur.close()
+
+
+def run_worker():
+    """Drain the outbox forever; woken by NOTIFY on insert, polls for retries."""
+    from .database import _connect, start_invalidation_listener
+
+    # Settings (bot token, SMTP) are cached; keep them fresh
+    start_invalidation_listener()
+    backoff = 1.0
+    while True:
+        conn = None
+        try:
+            conn = _connect()
+            cur = conn.cursor()
+            cur.execute(f'LISTEN {CHANNEL}')
+            conn.commit()
+            cur.close()
+            print("✅ Outbox worker started")
+            backoff = 1.0
+            last_purge = 0.0
+            while True:
+                while process_batch(conn) == OUTBOX_BATCH_SIZE:
+                    pass
+                if time.monotonic() - last_purge >= PURGE_INTERVAL:
+                    purge(conn)
+                    last_purge = time.monotonic()
+                if select.select([conn], [], [], OUTBOX_POLL_INTERVAL) != ([], [], []):
+                    conn.poll()
+                    conn.notifies.clear()
+        except Exception as e:
+            print(f"⚠️ Outbox worker error: {e}. Reconnecting in {backoff:.0f}s")
+            try:
+                if conn is not None:
+                    conn.close()
+            except Exception:
+                pass
+            time.sleep(backoff)
+            backoff = min(backoff * 2, MAX_RECONNECT_BACKOFF)
+
+
+def start_inprocess_worker():
+    """Worker thread for this web process unless OUTBOX_WORKER=external; safe to call on every request."""
+    global _worker_pid
+    pid = os.getpid()
+    if OUTBOX_WORKER == 'external' or _worker_pid == pid:
+        return
+    with _worker_lock:
+        if _worker_pid == pid:
+            return
+        # A thread started before fork() does not exist in the child
+        thread = threading.Thread(target=run_worker, name='outbox-worker', daemon=True)
+        thread.start()
+        _worker_pid = pid
+
+
+# --- Inspection ---
+
+def get_message_status(cur, outbox_id):
+    cur.execute('SELECT status, attempts, last_error FROM outbox WHERE id = %s', (outbox_id,))
+    return cur.fetchone()
+
+
+def wait_for_delivery(outbox_id, timeout):
+    """
+    Poll one message until its first delivery attempt finished or `timeout`
+    seconds passed. Returns its row (status, attempts, last_error) or None.
+    """
+    from .database import get_detached_connection
+
+    deadline = time.monotonic() + timeout
+    conn = get_detached_connection()
+    cur = conn.cursor()
+    try:
+        while True:
+            row = get_message_status(cur, outbox_id)
+            conn.rollback()
+            if row is None or row['attempts'] > 0 or time.monotonic() >= deadline:
+                return row
+            time.sleep(0.5)
+    finally:
+        cur.close()
+        conn.close()
+
+
+def get_outbox_stats(cur):
+    """Counts per kind and status plus delivery latency over the last hour, in one query."""
+    cur.execute('''
+        SELECT kind, status, count(*) AS count,
+               extract(epoch FROM CURRENT_TIMESTAMP - min(created_at)) AS oldest_seconds,
+               count(*) FILTER (WHERE sent_at > CURRENT_TIMESTAMP - interval '1 hour') AS sent_last_hour,
+               avg(extract(epoch FROM sent_at - created_at))
+                   FILTER (WHERE sent_at > CURRENT_TIMESTAMP - interval '1 hour') AS delivery_seconds
+        FROM outbox
+        GROUP BY kind, status
+    ''')
+    stats = {'by_kind': {}, **{status: 0 for status in STATUSES},
+             'oldest_pending_seconds': None, 'sent_last_hour': 0, 'avg_delivery_seconds': None}
+    weighted_latency = 0.0
+    for row in cur.fetchall():
+        stats['by_kind'].setdefault(row['kind'], {})[row['status']] = row['count']
+        stats[row['status']] = stats.get(row['status'], 0) + row['count']
+        if row['status'] == PENDING:
+            oldest = float(row['oldest_seconds'])
+            stats['oldest_pending_seconds'] = round(max(oldest, stats['oldest_pending_seconds'] or 0), 1)
+        if row['sent_last_hour']:
+            stats['sent_last_hour'] += row['sent_last_hour']
+            weighted_latency += float(row['delivery_seconds']) * row['sent_last_hour']
+    if stats['sent_last_hour']:
+        stats['avg_delivery_seconds'] = round(weighted_latency / stats['sent_last_hour'], 2)
+    return stats
+
+
+def get_worker_stats():
+    return {**_state, 'mode': OUTBOX_WORKER, 'inprocess_running': _worker_pid == os.getpid()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Deliver queued notifications')
+    parser.add_argument('command', nargs='?', default='run', choices=['run', 'status'])
+    args = parser.parse_args(argv)
+
+    if args.command == 'status':
+        from .database import _connect
+
+        conn = _connect()
+        cur = conn.cursor()
+        try:
+            print(json.dumps(get_outbox_stats(cur), indent=2, ensure_ascii=False))
+        finally:
+            cur.close()
+            conn.close()
+        return 0
+
+    run_worker()
+    return 0
+
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+    load_dotenv()
+    sys.exit(main())
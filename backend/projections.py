@@ -0,0 +1,70 @@
+"""
+Explicit column projections for product endpoints.
+
+List endpoints (catalog, favorites, cart, admin list) return the slim "card"
+view by default and accept ?fields=a,b,c from LIST_FIELDS. On lists
+``images`` holds only the first image and the description is only available
+as a short ``summary``. The full row is served by GET /api/products/<id>
+(its default view).
+"""
+
+# field -> SQL expression; {t} is the products table alias
+LIST_FIELDS = {
+    'id': '{t}.id',
+    'name': '{t}.name',
+    'price': '{t}.price',
+    'images': '{t}.images[1:1] AS images',
+    'category_id': '{t}.category_id',
+    'colors': '{t}.colors',
+    'attributes': '{t}.attributes',
+    'created_at': '{t}.created_at',
+    'summary': 'left({t}.description, 160) AS summary',
+}
+
+FULL_FIELDS = {
+    **LIST_FIELDS,
+    'images': '{t}.images',
+    'description': '{t}.description',
+}
+
+CARD_VIEW = ('id', 'name', 'price', 'images', 'colors', 'category_id')
+FULL_VIEW = ('id', 'name', 'description', 'price', 'images', 'category_id', 'colors', 'attributes', 'created_at')
+
+
+def requested_fields(args, default=CARD_VIEW, full=False):
+    """
+    Resolve ?fields= / ?view= into a list of field names.
+    full=True allows view=full and the full-only fields (single product).
+    Raises ValueError for unknown fields or views.
+    """
+    available = FULL_FIELDS if full else LIST_FIELDS
+    fields_arg = args.get('fields')
+    if fields_arg:
+        fields = []
+        for field in fields_arg.split(','):
+            field = field.strip()
+            if field and field not in fields:
+                fields.append(field)
+        unknown = [f for f in fields if f not in available]
+        if unknown:
+            raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+        if 'id' not in fields:
+            fields.insert(0, 'id')
+        return fields
+
+    view = args.get('view')
+    if not view:
+        return list(default)
+    if view == 'card':
+        return list(CARD_VIEW)
+    if view == 'full':
+        if not full:
+            raise ValueError('view=full is only available on /api/products/<id>')
+        return list(FULL_VIEW)
+    raise ValueError(f"Unknown view '{view}'")
+
+
+def select_list(fields, table='p', full=False):
+    """SQL select list for the given fields of the products table aliased as `table`."""
+    available = FULL_FIELDS if full else LIST_FIELDS
+    return ', '.join(available[field].format(t=table) for field in fields)
@@ -9,14 +9,35 @@ from datetime import datetime
 from ..database import (
     get_db_connection, get_platform_setting, set_platform_setting,
     get_cloudinary_config, get_telegram_config, get_smtp_config, 
-    get_payment_config, get_yandex_maps_config
+    get_payment_config, get_yandex_maps_config, get_pool_stats,
+    get_settings_cache_stats, release_request_connection
 )
+from .. import invalidation, outbox, order_changes
+from ..projections import requested_fields, select_list, CARD_VIEW, FULL_VIEW
+from ..search import search_condition, rank_expression
+from ..order_queries import (
+    parse_order_filters, order_filter_conditions, cursor_condition,
+    encode_order_cursor, decode_order_cursor, get_order_items
+)
+from ..suggest import get_suggest_stats
+from ..catalog_snapshot import get_snapshot_stats
+from ..utils.http_cache import get_response_cache_stats
 from ..utils.auth import require_admin, require_superadmin, admin_required_response, superadmin_required_response
 from ..services.cloud_service import upload_image_to_cloud, test_cloud_connection
-from ..services.email_service import send_email
 
 admin_bp = Blueprint('admin', __name__)
 
+# Product list cards in the admin panel also show a description excerpt and
+# need attributes for the inventory form; the edit dialog loads the full row.
+ADMIN_LIST_VIEW = CARD_VIEW + ('attributes', 'summary')
+
+# GET /orders
+ADMIN_ORDERS_PAGE_SIZE = 50
+MAX_ADMIN_ORDERS_PAGE_SIZE = 200
+
+# How long the settings "test" buttons wait for the outbox worker
+OUTBOX_TEST_TIMEOUT = 20
+
 # --- Auth & Admins ---
 
 @admin_bp.route('/login', methods=['POST'])
@@ -151,18 +172,24 @@ def admin_get_products():
     
     search = request.args.get('search')
     category = request.args.get('category')
-    sort = request.args.get('sort', 'name') # name, name_desc, price_asc, price_desc
+    # name, name_desc, price_asc, price_desc; searches default to relevance
+    sort = request.args.get('sort', 'relevance' if search else 'name')
+    try:
+        fields = requested_fields(request.args, default=ADMIN_LIST_VIEW)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     conn = get_db_connection()
     cur = conn.cursor()
     
-    query = 'SELECT * FROM products'
+    query = f"SELECT {select_list(fields, 'products')} FROM products"
     params = []
     conditions = []
     
     if search:
-        conditions.append('LOWER(name) LIKE %s')
-        params.append(f'%{search.lower()}%')
+        match_sql, match_params = search_condition(search, alias='products')
+        conditions.append(match_sql)
+        params.extend(match_params)
     
     if category and category != 'all':
         conditions.append('category_id = %s')
@@ -172,7 +199,11 @@ def admin_get_products():
         query += ' WHERE ' + ' AND '.join(conditions)
     
     # Sorting logic
-    if sort == 'name_desc':
+    if sort == 'relevance' and search:
+        rank_sql, rank_params = rank_expression(search, alias='products')
+        query += f' ORDER BY {rank_sql} DESC, name ASC'
+        params.extend(rank_params)
+    elif sort == 'name_desc':
         query += ' ORDER BY name DESC'
     elif sort == 'price_asc':
         query += ' ORDER BY price ASC'
@@ -191,7 +222,7 @@ def admin_get_product(product_id):
     if not require_admin(): return admin_required_response()
     conn = get_db_connection()
     cur = conn.cursor()
-    cur.execute('SELECT * FROM products WHERE id = %s', (product_id,))
+    cur.execute(f"SELECT {select_list(FULL_VIEW, 'products', full=True)} FROM products WHERE id = %s", (product_id,))
     product = cur.fetchone()
     cur.close(); conn.close()
     if not product: return jsonify({'error': 'Product not found'}), 404
@@ -219,6 +250,7 @@ def admin_create_product():
             json.dumps(data.get('attributes', []))
         ))
         pid = cur.fetchone()['id']
+        invalidation.publish(cur, invalidation.CATALOG, pid)
         conn.commit()
         return jsonify({'message': 'Product created', 'id': pid}), 201
     except Exception as e:
@@ -249,6 +281,7 @@ def admin_update_product(product_id):
             json.dumps(data.get('attributes', [])),
             product_id
         ))
+        invalidation.publish(cur, invalidation.CATALOG, product_id)
         conn.commit()
         return jsonify({'message': 'Product updated'})
     except Exception as e:
@@ -266,6 +299,7 @@ def admin_delete_product(product_id):
         cur.execute('DELETE FROM products WHERE id = %s', (product_id,))
         # Also clean up inventory
         cur.execute('DELETE FROM product_inventory WHERE product_id = %s', (product_id,))
+        invalidation.publish(cur, invalidation.CATALOG, product_id)
         conn.commit()
         return jsonify({'message': 'Product deleted'})
     except Exception as e:
@@ -319,7 +353,7 @@ def admin_add_inventory():
         cur.execute('''
             INSERT INTO product_inventory (product_id, color, attribute1_value, attribute2_value, quantity, backorder_lead_time_days)
             VALUES (%s, %s, %s, %s, %s, %s)
-            ON CONFLICT (product_id, color, attribute1_value, attribute2_value) 
+            ON CONFLICT (variant_id)
             DO UPDATE SET quantity = product_inventory.quantity + EXCLUDED.quantity
             RETURNING id
         ''', (
@@ -330,6 +364,7 @@ def admin_add_inventory():
             data.get('quantity', 0),
             data.get('backorder_lead_time_days')
         ))
+        invalidation.publish(cur, invalidation.INVENTORY, data.get('product_id'))
         conn.commit()
         return jsonify({'message': 'Inventory added'})
     except Exception as e:
@@ -345,7 +380,9 @@ def admin_manage_inventory_item(item_id):
     cur = conn.cursor()
     
     if request.method == 'DELETE':
-        cur.execute('DELETE FROM product_inventory WHERE id = %s', (item_id,))
+        cur.execute('DELETE FROM product_inventory WHERE id = %s RETURNING product_id', (item_id,))
+        row = cur.fetchone()
+        invalidation.publish(cur, invalidation.INVENTORY, row['product_id'] if row else None)
         conn.commit()
         cur.close(); conn.close()
         return jsonify({'message': 'Item deleted'})
@@ -355,7 +392,10 @@ def admin_manage_inventory_item(item_id):
             UPDATE product_inventory 
             SET quantity = %s, backorder_lead_time_days = %s 
             WHERE id = %s
+            RETURNING product_id
         ''', (data.get('quantity'), data.get('backorder_lead_time_days'), item_id))
+        row = cur.fetchone()
+        invalidation.publish(cur, invalidation.INVENTORY, row['product_id'] if row else None)
         conn.commit()
         cur.close(); conn.close()
         return jsonify({'message': 'Item updated'})
@@ -373,7 +413,7 @@ def admin_import_inventory():
             cur.execute('''
                 INSERT INTO product_inventory (product_id, color, attribute1_value, attribute2_value, quantity, backorder_lead_time_days)
                 VALUES (%s, %s, %s, %s, %s, %s)
-                ON CONFLICT (product_id, color, attribute1_value, attribute2_value) 
+                ON CONFLICT (variant_id)
                 DO UPDATE SET quantity = EXCLUDED.quantity, backorder_lead_time_days = EXCLUDED.backorder_lead_time_days
             ''', (
                 item.get('product_id'),
@@ -383,6 +423,7 @@ def admin_import_inventory():
                 item.get('quantity', 0),
                 item.get('backorder_lead_time_days')
             ))
+        invalidation.publish(cur, invalidation.INVENTORY)
         conn.commit()
         return jsonify({'message': f'Imported {len(items)} items'})
     except Exception as e:
@@ -399,7 +440,7 @@ def admin_export_inventory():
     items = cur.fetchall(); cur.close(); conn.close()
     
     si = io.StringIO()
-    cw = csv.DictWriter(si, fieldnames=['id', 'product_id', 'name', 'color', 'attribute1_value', 'attribute2_value', 'quantity', 'backorder_lead_time_days', 'created_at', 'updated_at'])
+    cw = csv.DictWriter(si, fieldnames=['id', 'product_id', 'variant_id', 'name', 'color', 'attribute1_value', 'attribute2_value', 'quantity', 'backorder_lead_time_days', 'created_at', 'updated_at'])
     cw.writeheader()
     cw.writerows(items)
     return Response(si.getvalue(), mimetype='text/csv', headers={'Content-Disposition': 'attachment; filename=inventory.csv'})
@@ -431,6 +472,7 @@ def admin_create_category():
     cur = conn.cursor()
     cur.execute('INSERT INTO categories (name, icon, sort_order) VALUES (%s, %s, %s) RETURNING id', (name, icon, sort_order))
     new_id = cur.fetchone()['id']
+    invalidation.publish(cur, invalidation.CATEGORIES, new_id)
     conn.commit()
     cur.close(); conn.close()
     return jsonify({'id': new_id, 'message': 'Category created'})
@@ -443,6 +485,7 @@ def admin_update_category(category_id):
     cur = conn.cursor()
     cur.execute('UPDATE categories SET name = %s, icon = %s, sort_order = %s WHERE id = %s',
         (data.get('name'), data.get('icon'), data.get('sort_order', 0), category_id))
+    invalidation.publish(cur, invalidation.CATEGORIES, category_id)
     conn.commit()
     cur.close(); conn.close()
     return jsonify({'message': 'Category updated'})
@@ -453,6 +496,7 @@ def admin_delete_category(category_id):
     conn = get_db_connection()
     cur = conn.cursor()
     cur.execute('DELETE FROM categories WHERE id = %s', (category_id,))
+    invalidation.publish(cur, invalidation.CATEGORIES, category_id)
     conn.commit()
     cur.close(); conn.close()
     return jsonify({'message': 'Category deleted'})
@@ -460,25 +504,107 @@ def admin_delete_category(category_id):
 
 # --- Orders ---
 
+_ADMIN_ORDERS_SQL = '''
+    SELECT o.*, u.email AS user_email, u.first_name, u.last_name
+    FROM orders o LEFT JOIN users u ON o.user_id = u.id{where}
+    ORDER BY {order_by}
+    LIMIT %s
+'''
+
+_ORDER_STATUS_COUNTS_SQL = 'SELECT o.status, COUNT(*) AS count FROM orders o{where} GROUP BY o.status'
+
+def _admin_orders(cur, where, params, order_by, limit):
+    """Orders with customer account fields, plus their items from one batched query."""
+    cur.execute(_ADMIN_ORDERS_SQL.format(where=where, order_by=order_by), tuple(params) + (limit,))
+    orders = cur.fetchall()
+    items = get_order_items(cur, [order['id'] for order in orders])
+    for order in orders:
+        order['items'] = items[order['id']]
+    return orders
+
 @admin_bp.route('/orders', methods=['GET'])
 def admin_get_orders():
+    """
+    Order console page, newest first.
+    Query params: status, payment_status, payment_method, date_from, date_to,
+    q (see order_queries.py), limit, cursor (next_cursor of the previous page).
+    Returns {items, next_cursor, total, status_counts}; status_counts ignores
+    the status filter so every tab shows its count.
+    """
     if not require_admin(): return admin_required_response()
-    status = request.args.get('status')
+    try:
+        filters = parse_order_filters(request.args)
+        cursor = decode_order_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        limit = int(request.args.get('limit') or ADMIN_ORDERS_PAGE_SIZE)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    limit = max(1, min(limit, MAX_ADMIN_ORDERS_PAGE_SIZE))
+    
+    conditions, params = order_filter_conditions(filters)
+    if cursor:
+        sql, cursor_params = cursor_condition(cursor)
+        conditions.append(sql)
+        params.extend(cursor_params)
+    where = ' WHERE ' + ' AND '.join(conditions) if conditions else ''
+    
+    count_conditions, count_params = order_filter_conditions(filters, include_status=False)
+    count_where = ' WHERE ' + ' AND '.join(count_conditions) if count_conditions else ''
+    
     conn = get_db_connection()
     cur = conn.cursor()
-    query = 'SELECT o.*, u.email as user_email, u.first_name, u.last_name FROM orders o LEFT JOIN users u ON o.user_id = u.id'
-    params = []
-    if status and status != 'all':
-        query += ' WHERE o.status = %s'
-        params.append(status)
-    query += ' ORDER BY o.created_at DESC LIMIT 50'
-    cur.execute(query, params)
-    orders = cur.fetchall()
-    for order in orders:
-        cur.execute('SELECT oi.*, p.images FROM order_items oi LEFT JOIN products p ON oi.product_id = p.id WHERE oi.order_id = %s', (order['id'],))
-        order['items'] = cur.fetchall()
-    cur.close(); conn.close()
-    return jsonify(orders)
+    try:
+        orders = _admin_orders(cur, where, params, 'o.created_at DESC, o.id DESC', limit + 1)
+        next_cursor = None
+        if len(orders) > limit:
+            orders = orders[:limit]
+            next_cursor = encode_order_cursor(orders[-1]['created_at'], orders[-1]['id'])
+        
+        cur.execute(_ORDER_STATUS_COUNTS_SQL.format(where=count_where), tuple(count_params))
+        status_counts = {row['status']: row['count'] for row in cur.fetchall()}
+    finally:
+        cur.close(); conn.close()
+    
+    total = status_counts.get(filters['status'], 0) if 'status' in filters else sum(status_counts.values())
+    return jsonify({'items': orders, 'next_cursor': next_cursor, 'total': total, 'status_counts': status_counts})
+
+@admin_bp.route('/orders/changes', methods=['GET'])
+def admin_get_order_changes():
+    """
+    Orders created or changed (status, payment status) after `since`, oldest
+    change first, shaped like GET /orders items; filters are left to the
+    client. Query params: since (omit for a starting cursor), wait (long poll
+    seconds, see order_changes.py). Returns {items, cursor, has_more}, plus
+    retry_after (seconds) when the server is too busy to hold the request.
+    """
+    if not require_admin(): return admin_required_response()
+    # The admin check borrowed the request connection; don't hold it while waiting
+    release_request_connection()
+    try:
+        since = decode_order_cursor(request.args['since']) if request.args.get('since') else None
+        wait = order_changes.parse_wait(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        if since is None:
+            cursor = order_changes.run_detached(order_changes.current_cursor)
+            return jsonify({'items': [], 'cursor': encode_order_cursor(*cursor), 'has_more': False})
+        
+        def fetch():
+            sql, params = order_changes.changes_condition(since)
+            return order_changes.run_detached(lambda cur: _admin_orders(
+                cur, f' WHERE {sql}', params, 'o.updated_at, o.id', order_changes.MAX_CHANGES + 1))
+        
+        orders, waited = order_changes.poll_changes(fetch, None, wait)
+        has_more = len(orders) > order_changes.MAX_CHANGES
+        orders = orders[:order_changes.MAX_CHANGES]
+        cursor = encode_order_cursor(orders[-1]['updated_at'], orders[-1]['id']) if orders else request.args['since']
+        result = {'items': orders, 'cursor': cursor, 'has_more': has_more}
+        if not waited:
+            result['retry_after'] = order_changes.RETRY_AFTER
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
 @admin_bp.route('/orders/<order_id>/status', methods=['PUT'])
 def admin_update_order_status(order_id):
@@ -533,6 +659,26 @@ def admin_telegram_settings():
     set_platform_setting('telegram_notifications_enabled', str(data.get('notifications_enabled')).lower(), False)
     return jsonify({'message': 'Telegram settings saved'})
 
+def _enqueue_test(kind, payload):
+    """Queue a single-attempt test message through the outbox so it exercises the worker too."""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        outbox_id = outbox.enqueue(cur, kind, payload, max_attempts=1)
+        conn.commit()
+        return outbox_id
+    finally:
+        cur.close()
+        conn.close()
+
+def _outbox_test_result(outbox_id, success_message, error_prefix=''):
+    row = outbox.wait_for_delivery(outbox_id, OUTBOX_TEST_TIMEOUT)
+    if row is None or row['attempts'] == 0:
+        return {'success': False, 'error': 'No outbox worker picked up the message (with OUTBOX_WORKER=external, is shop-outbox running?)'}
+    if row['status'] != outbox.SENT:
+        return {'success': False, 'error': f"{error_prefix}{row['last_error']}"}
+    return {'success': True, 'message': success_message}
+
 @admin_bp.route('/settings/telegram/test', methods=['POST'])
 def admin_test_telegram():
     if not require_admin(): return admin_required_response()
@@ -540,17 +686,8 @@ def admin_test_telegram():
     if not cfg['bot_token'] or not cfg['admin_chat_id']:
         return jsonify({'success': False, 'error': 'Telegram not configured'})
     
-    url = f"https://api.telegram.org/bot{cfg['bot_token']}/sendMessage"
-    payload = {'chat_id': cfg['admin_chat_id'], 'text': '✅ Test message from Admin Panel'}
-    try:
-        resp = requests.post(url, json=payload, timeout=10)
-        return jsonify({
-            'success': resp.status_code == 200, 
-            'error': resp.text if resp.status_code != 200 else None,
-            'message': 'Message sent successfully' if resp.status_code == 200 else None
-        })
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)})
+    outbox_id = _enqueue_test(outbox.TELEGRAM_MESSAGE, {'text': '✅ Test message from Admin Panel'})
+    return jsonify(_outbox_test_result(outbox_id, 'Message sent successfully'))
 
 
 # --- Payments ---
@@ -657,6 +794,73 @@ def admin_delivery_settings():
 
 # --- Stats ---
 
+@admin_bp.route('/system/stats', methods=['GET'])
+def admin_system_stats():
+    if not require_admin(): return admin_required_response()
+    return jsonify({
+        'db_pool': get_pool_stats(),
+        'settings_cache': get_settings_cache_stats(),
+        'invalidation': invalidation.get_listener_stats(),
+        'suggest_index': get_suggest_stats(),
+        'catalog_snapshot': get_snapshot_stats(),
+        'response_cache': get_response_cache_stats(),
+        'outbox': _outbox_stats(),
+        'order_changes': order_changes.get_feed_stats()
+    })
+
+def _outbox_stats():
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        return {**outbox.get_outbox_stats(cur), 'worker': outbox.get_worker_stats()}
+    finally:
+        cur.close()
+        conn.close()
+
+@admin_bp.route('/outbox', methods=['GET'])
+def admin_list_outbox():
+    """Queued messages, newest first (?status=dead by default). Payloads hold customer data and are left out."""
+    if not require_admin(): return admin_required_response()
+    status = request.args.get('status', outbox.DEAD)
+    if status not in outbox.STATUSES:
+        return jsonify({'error': f"status must be one of: {', '.join(outbox.STATUSES)}"}), 400
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+    
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute('''
+            SELECT id, kind, status, attempts, max_attempts, available_at, last_error, created_at, sent_at
+            FROM outbox WHERE status = %s
+            ORDER BY created_at DESC, id DESC
+            LIMIT %s
+        ''', (status, limit))
+        return jsonify({'items': cur.fetchall()})
+    finally:
+        cur.close()
+        conn.close()
+
+@admin_bp.route('/outbox/<int:outbox_id>/retry', methods=['POST'])
+def admin_retry_outbox(outbox_id):
+    """Put a dead (or skipped) message back in the queue with a fresh set of attempts."""
+    if not require_admin(): return admin_required_response()
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute('''
+            UPDATE outbox SET status = 'pending', attempts = 0, available_at = CURRENT_TIMESTAMP, last_error = NULL
+            WHERE id = %s AND status IN ('dead', 'skipped')
+            RETURNING id
+        ''', (outbox_id,))
+        retried = cur.fetchone()
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+    if not retried:
+        return jsonify({'error': 'Message not found or not dead'}), 404
+    return jsonify({'message': 'Message queued again'})
+
 @admin_bp.route('/statistics', methods=['GET'])
 def admin_get_statistics():
     if not require_admin(): return admin_required_response()
@@ -752,14 +956,9 @@ def admin_test_smtp():
     if not admin_email:
         return jsonify({'success': False, 'error': 'Admin email not found'})
         
-    # Send test email
-    success, error = send_email(
-        to_email=admin_email,
-        subject='SMTP Test - Admin Panel',
-        html_content='<p>✅ Test email from Admin Panel. Your SMTP settings are correct.</p>'
-    )
-    
-    if not success:
-        return jsonify({'success': False, 'error': f"SMTP Error: {error}"})
-        
-    return jsonify({'success': True, 'message': 'Test email sent successfully'})
+    outbox_id = _enqueue_test(outbox.EMAIL, {
+        'to': admin_email,
+        'subject': 'SMTP Test - Admin Panel',
+        'html': '<p>✅ Test email from Admin Panel. Your SMTP settings are correct.</p>'
+    })
+    return jsonify(_outbox_test_result(outbox_id, 'Test email sent successfully', 'SMTP Error: '))
@@ -5,7 +5,8 @@ import secrets
 
 from ..database import get_db_connection
 from ..utils.validation import validate_email, validate_phone
-from ..services.email_service import send_password_reset_email
+from ..services.email_service import password_reset_email
+from .. import outbox
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -122,14 +123,14 @@ def forgot_password():
             'INSERT INTO password_reset_tokens (user_id, token, expires_at) VALUES (%s, %s, %s)',
             (user['id'], token, expires_at)
         )
+        site_url = request.headers.get('Origin') or request.host_url.rstrip('/')
+        # Sent by the outbox worker; the token and the email commit together
+        outbox.enqueue_email(cur, email, *password_reset_email(token, site_url))
         conn.commit()
         cur.close()
         conn.close()
         
-        site_url = request.headers.get('Origin') or request.host_url.rstrip('/')
-        if send_password_reset_email(email, token, site_url):
-            return jsonify({'message': 'Ссылка для сброса пароля отправлена на email'}), 200
-        return jsonify({'error': 'Не удалось отправить email'}), 500
+        return jsonify({'message': 'Ссылка для сброса пароля отправлена на email'}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1,27 +1,181 @@
 from flask import Blueprint, request, jsonify, session
 import json as json_lib
 from ..database import get_db_connection, get_platform_setting
+from ..projections import requested_fields, select_list
+from ..catalog_snapshot import get_snapshot
 
 cart_bp = Blueprint('cart', __name__)
 
+MAX_CART_OPERATIONS = 100
+CART_OPERATIONS = ('add', 'set', 'remove')
+
+# One line per (user, variant): adding an existing variant bumps its quantity
+_ADD_TO_CART_SQL = '''
+    INSERT INTO cart (user_id, product_id, variant_id, quantity, selected_color, selected_attributes)
+    VALUES (%s, %s, product_variant_id(%s, %s, %s::jsonb), %s, %s, %s::jsonb)
+    ON CONFLICT (user_id, variant_id) DO UPDATE SET quantity = cart.quantity + EXCLUDED.quantity
+    RETURNING *
+'''
+
+def _add_to_cart(cur, user_id, product_id, quantity, selected_color=None, selected_attributes=None):
+    attrs_json = json_lib.dumps(selected_attributes) if selected_attributes else None
+    cur.execute(_ADD_TO_CART_SQL, (user_id, product_id, product_id, selected_color, attrs_json,
+                                   quantity, selected_color, attrs_json))
+    return cur.fetchone()
+
+_CART_ITEMS_SQL = '''
+    SELECT {columns}, c.id as cart_id, c.variant_id, c.quantity, c.selected_color, c.selected_attributes
+    FROM products p
+    JOIN cart c ON p.id = c.product_id
+    WHERE c.user_id = %s
+'''
+
+# Variants without inventory or with nothing left ship as backorder
+_CART_STOCK_SQL = '''
+    SELECT count(*) AS items,
+           count(*) FILTER (WHERE i.quantity IS NULL OR i.quantity < 1) AS backorder_items
+    FROM cart c LEFT JOIN product_inventory i ON i.variant_id = c.variant_id
+    WHERE c.user_id = %s
+'''
+
+def _check_selection(product_id, selected_color, selected_attributes):
+    """
+    Reject selections the product does not offer, so adding to the cart never
+    creates a product_variants row for a made-up color or attribute value.
+    """
+    product = get_snapshot().get_product(product_id)
+    if product is None:
+        raise ValueError('Product not found')
+    if selected_color not in (None, '') and selected_color not in (product.colors or ()):
+        raise ValueError('selected_color is not offered for this product')
+    if selected_attributes in (None, {}):
+        return
+    if not isinstance(selected_attributes, dict):
+        raise ValueError('selected_attributes must be an object')
+    attributes = json_lib.loads(product.attributes) if product.attributes is not None else None
+    offered = {}
+    for attribute in attributes if isinstance(attributes, list) else []:
+        if isinstance(attribute, dict):
+            offered[attribute.get('name')] = [str(v) for v in attribute.get('values') or []]
+    for name, value in selected_attributes.items():
+        if value in (None, ''):
+            continue
+        if name not in offered or str(value) not in offered[name]:
+            raise ValueError(f'selected_attributes: {name}={value} is not offered for this product')
+
+def _cart_items(cur, user_id, fields):
+    cur.execute(_CART_ITEMS_SQL.format(columns=select_list(fields)), (user_id,))
+    return cur.fetchall()
+
+def _parse_quantity(value, default=None):
+    if value is None and default is not None:
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError('quantity must be an integer')
+
+def _parse_add_quantity(value):
+    quantity = _parse_quantity(value, default=1)
+    if quantity < 1:
+        raise ValueError('quantity must be positive')
+    return quantity
+
+def _parse_cart_operations(operations):
+    """Validate the shape of the whole batch before anything is written."""
+    if not isinstance(operations, list) or not operations:
+        raise ValueError('operations must be a non-empty list')
+    if len(operations) > MAX_CART_OPERATIONS:
+        raise ValueError(f'At most {MAX_CART_OPERATIONS} operations per request')
+    parsed = []
+    for i, operation in enumerate(operations):
+        try:
+            if not isinstance(operation, dict) or operation.get('op') not in CART_OPERATIONS:
+                raise ValueError(f"op must be one of {', '.join(CART_OPERATIONS)}")
+            op = operation['op']
+            if op == 'add':
+                if not operation.get('product_id'):
+                    raise ValueError('product_id is required')
+                quantity = _parse_add_quantity(operation.get('quantity'))
+                parsed.append((op, operation['product_id'], quantity,
+                               operation.get('selected_color'), operation.get('selected_attributes')))
+            else:
+                if not operation.get('cart_id'):
+                    raise ValueError('cart_id is required')
+                quantity = _parse_quantity(operation.get('quantity')) if op == 'set' else 0
+                # Setting a line to zero removes it
+                parsed.append(('set' if quantity > 0 else 'remove', operation['cart_id'], quantity))
+        except ValueError as e:
+            raise ValueError(f'operations[{i}]: {e}')
+    return parsed
+
 @cart_bp.route('/cart/<user_id>', methods=['GET'])
 def get_cart(user_id):
+    try:
+        fields = requested_fields(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     try:
         conn = get_db_connection()
         cur = conn.cursor()
-        cur.execute('''
-            SELECT p.*, c.id as cart_id, c.quantity, c.selected_color, c.selected_attributes 
-            FROM products p
-            JOIN cart c ON p.id = c.product_id
-            WHERE c.user_id = %s
-        ''', (user_id,))
-        cart_items = cur.fetchall()
+        cart_items = _cart_items(cur, user_id, fields)
         cur.close()
         conn.close()
         return jsonify(cart_items)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@cart_bp.route('/cart/<user_id>/batch', methods=['PATCH'])
+def batch_update_cart(user_id):
+    """
+    Apply {"operations": [...]} in order, in one transaction, and return
+    {"items": the new cart (same shape as GET /cart/<user_id>, fields / view
+    included), "rejected": [{"index", "error"}]}.
+      {"op": "add", "product_id", "quantity"?, "selected_color"?, "selected_attributes"?}
+      {"op": "set", "cart_id", "quantity"}   (quantity <= 0 removes the line)
+      {"op": "remove", "cart_id"}
+    A malformed operation fails the whole batch with 400; an add for a product
+    or selection that is no longer offered is skipped and listed in rejected.
+    """
+    try:
+        fields = requested_fields(request.args)
+        operations = _parse_cart_operations((request.json or {}).get('operations'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # One line that is no longer offered must not cost the rest (repeat order)
+    accepted, rejected = [], []
+    for i, (op, *args) in enumerate(operations):
+        if op == 'add':
+            product_id, _, selected_color, selected_attributes = args
+            try:
+                _check_selection(product_id, selected_color, selected_attributes)
+            except ValueError as e:
+                rejected.append({'index': i, 'error': str(e)})
+                continue
+        accepted.append((op, *args))
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        for op, *args in accepted:
+            if op == 'add':
+                _add_to_cart(cur, user_id, *args)
+            elif op == 'set':
+                cart_id, quantity = args
+                cur.execute('UPDATE cart SET quantity = %s WHERE id = %s AND user_id = %s', (quantity, cart_id, user_id))
+            else:
+                cur.execute('DELETE FROM cart WHERE id = %s AND user_id = %s', (args[0], user_id))
+        cart_items = _cart_items(cur, user_id, fields)
+        conn.commit()
+        return jsonify({'items': cart_items, 'rejected': rejected})
+    except Exception as e:
+        conn.rollback()
+        return jsonify({'error': str(e)}), 500
+    finally:
+        cur.close()
+        conn.close()
+
 @cart_bp.route('/cart/<user_id>/delivery-info', methods=['GET'])
 def get_cart_delivery_info(user_id):
     try:
@@ -37,33 +191,15 @@ def get_cart_delivery_info(user_id):
         
         conn = get_db_connection()
         cur = conn.cursor()
-        cur.execute('SELECT product_id, selected_color, selected_attributes FROM cart WHERE user_id = %s', (user_id,))
-        cart_items = cur.fetchall()
+        cur.execute(_CART_STOCK_SQL, (user_id,))
+        counts = cur.fetchone()
         
-        if not cart_items:
+        if not counts['items']:
             cur.close()
             conn.close()
             return jsonify({'has_backorder': False, 'max_backorder_days': 0, 'default_delivery_days': delivery_days_in_stock})
         
-        has_backorder = False
-        for item in cart_items:
-            selected_attrs = item.get('selected_attributes')
-            if isinstance(selected_attrs, str):
-                selected_attrs = json_lib.loads(selected_attrs) if selected_attrs else {}
-            
-            attr1_val = list(selected_attrs.values())[0] if selected_attrs else None
-            attr2_val = list(selected_attrs.values())[1] if selected_attrs and len(selected_attrs) > 1 else None
-            
-            cur.execute('''
-                SELECT quantity FROM product_inventory
-                WHERE product_id = %s AND (color = %s OR (color IS NULL AND %s IS NULL))
-                AND (attribute1_value = %s OR (attribute1_value IS NULL AND %s IS NULL))
-                AND (attribute2_value = %s OR (attribute2_value IS NULL AND %s IS NULL))
-            ''', (item['product_id'], item.get('selected_color'), item.get('selected_color'), attr1_val, attr1_val, attr2_val, attr2_val))
-            
-            inventory = cur.fetchone()
-            if not inventory or inventory['quantity'] <= 0:
-                has_backorder = True
+        has_backorder = counts['backorder_items'] > 0
         
         cur.close()
         conn.close()
@@ -81,29 +217,17 @@ def add_to_cart():
         data = request.json
         user_id = data['user_id']
         product_id = data['product_id']
-        quantity = data.get('quantity', 1)
         selected_color = data.get('selected_color')
         selected_attributes = data.get('selected_attributes')
+        try:
+            quantity = _parse_add_quantity(data.get('quantity'))
+            _check_selection(product_id, selected_color, selected_attributes)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        attrs_json = json_lib.dumps(selected_attributes) if selected_attributes else None
         conn = get_db_connection()
         cur = conn.cursor()
-        
-        if attrs_json:
-            cur.execute('SELECT id, quantity FROM cart WHERE user_id = %s AND product_id = %s AND (selected_color = %s OR (selected_color IS NULL AND %s IS NULL)) AND selected_attributes = %s::jsonb', 
-                        (user_id, product_id, selected_color, selected_color, attrs_json))
-        else:
-            cur.execute('SELECT id, quantity FROM cart WHERE user_id = %s AND product_id = %s AND (selected_color = %s OR (selected_color IS NULL AND %s IS NULL)) AND selected_attributes IS NULL', 
-                        (user_id, product_id, selected_color, selected_color))
-        
-        existing = cur.fetchone()
-        if existing:
-            cur.execute('UPDATE cart SET quantity = %s WHERE id = %s RETURNING *', (existing['quantity'] + quantity, existing['id']))
-        else:
-            cur.execute('INSERT INTO cart (user_id, product_id, quantity, selected_color, selected_attributes) VALUES (%s, %s, %s, %s, %s) RETURNING *', 
-                        (user_id, product_id, quantity, selected_color, attrs_json))
-        
-        cart_item = cur.fetchone()
+        cart_item = _add_to_cart(cur, user_id, product_id, quantity, selected_color, selected_attributes)
         conn.commit()
         cur.close()
         conn.close()
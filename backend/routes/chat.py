@@ -4,6 +4,20 @@ import json
 
 chat_bp = Blueprint('chat', __name__)
 
+# Messages where the user is sender or receiver
+_USER_MESSAGES_SQL = '''
+    SELECT 
+        cm.id,
+        cm.user_id,
+        cm.sender_id,
+        cm.content,
+        cm.is_read,
+        cm.created_at
+    FROM chat_messages cm
+    WHERE cm.user_id = %s OR cm.sender_id = %s
+    ORDER BY cm.created_at ASC
+'''
+
 @chat_bp.route('/chat/messages', methods=['GET'])
 def get_messages():
     """Fetch messages for the current user (requires authentication on frontend)"""
@@ -16,19 +30,7 @@ def get_messages():
         conn = get_db_connection()
         cur = conn.cursor()
         
-        # Get messages where user is sender or receiver
-        cur.execute('''
-            SELECT 
-                cm.id,
-                cm.user_id,
-                cm.sender_id,
-                cm.content,
-                cm.is_read,
-                cm.created_at
-            FROM chat_messages cm
-            WHERE cm.user_id = %s OR cm.sender_id = %s
-            ORDER BY cm.created_at ASC
-        ''', (user_id, user_id))
+        cur.execute(_USER_MESSAGES_SQL, (user_id, user_id))
         
         messages = cur.fetchall()
         cur.close()
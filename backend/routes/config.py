@@ -1,17 +1,34 @@
 import json
 from flask import Blueprint, jsonify, current_app
 from backend.database import get_platform_setting
+from backend.utils.http_cache import catalog_cached
 import os
 
 config_bp = Blueprint('config', __name__)
 
+# Robust path resolution for settings.json
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(os.path.dirname(current_dir))
+config_path = os.path.join(project_root, 'config', 'settings.json')
+
+# The response is public and cacheable: only what the checkout page needs,
+# never the providers' secret keys
+PUBLIC_PAYMENT_FIELDS = {
+    'click': ('enabled', 'merchant_id', 'service_id'),
+    'payme': ('enabled', 'merchant_id'),
+    'uzum': ('enabled', 'merchant_id', 'service_id'),
+    'card_transfer': ('enabled', 'card_number', 'card_holder', 'bank_name'),
+}
+
+def _settings_file_mtime():
+    try:
+        return int(os.path.getmtime(config_path))
+    except OSError:
+        return 0
+
 @config_bp.route('/config', methods=['GET'])
+@catalog_cached(extra_validator=_settings_file_mtime)
 def get_config():
-    # Robust path resolution for settings.json
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    project_root = os.path.dirname(os.path.dirname(current_dir))
-    config_path = os.path.join(project_root, 'config', 'settings.json')
-    
     try:
         if not os.path.exists(config_path):
             print(f"⚠️ settings.json not found at: {config_path}")
@@ -48,24 +65,18 @@ def get_config():
     # Payment settings from database
     try:
         from backend.database import get_payment_config
-        for p in ['click', 'payme', 'uzum', 'card_transfer']:
+        for p, fields in PUBLIC_PAYMENT_FIELDS.items():
             p_cfg = get_payment_config(p)
             if p_cfg.get('enabled') is not None:
                 if 'payment' not in config: config['payment'] = {}
-                config['payment'][p] = p_cfg
+                config['payment'][p] = {field: p_cfg.get(field) for field in fields}
     except Exception as e:
         print(f"❌ Error fetching payment config: {e}")
 
-    # Fetch categories from database
+    # Categories from the in-process catalog snapshot
     try:
-        from backend.database import get_db_connection
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute('SELECT id, name, icon FROM categories ORDER BY sort_order, name')
-        db_categories = cur.fetchall()
-        cur.close()
-        conn.close()
-        
+        from backend.catalog_snapshot import get_snapshot
+        db_categories = [{'id': c.id, 'name': c.name, 'icon': c.icon} for c in get_snapshot().categories]
         if db_categories:
             config['categories'] = db_categories
     except Exception as e:
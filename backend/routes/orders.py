@@ -2,12 +2,20 @@ from flask import Blueprint, request, jsonify, session
 from datetime import datetime, timedelta
 import json as json_lib
 import base64
+import uuid
+
+from psycopg2.extras import execute_values
 
 from ..database import get_db_connection, get_platform_setting, get_payment_config
-from ..services.tg_service import send_telegram_notification
+from .. import outbox, order_changes
+from ..order_queries import encode_order_cursor, decode_order_cursor, cursor_condition
 
 orders_bp = Blueprint('orders', __name__)
 
+# GET /orders
+ORDERS_PAGE_SIZE = 20
+MAX_ORDERS_PAGE_SIZE = 50
+
 @orders_bp.route('/orders', methods=['POST'])
 def create_order():
     try:
@@ -29,9 +37,9 @@ def create_order():
         
         for item in cart_items:
             cur.execute(
-                '''INSERT INTO order_items (order_id, product_id, name, price, quantity, selected_color, selected_attributes) 
-                   VALUES (%s, %s, %s, %s, %s, %s, %s)''',
-                (order_id, item.get('id'), item.get('name'), item.get('price'), item.get('quantity'), 
+                '''INSERT INTO order_items (order_id, product_id, name, price, quantity, image_url, selected_color, selected_attributes) 
+                   VALUES (%s, %s, %s, %s, %s, (SELECT images[1] FROM products WHERE id = %s), %s, %s)''',
+                (order_id, item.get('id'), item.get('name'), item.get('price'), item.get('quantity'), item.get('id'), 
                  item.get('selected_color'), json_lib.dumps(item.get('selected_attributes')) if item.get('selected_attributes') else None)
             )
         
@@ -49,8 +57,81 @@ def create_order():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _safe_int(val, default):
+    try:
+        if val is None or str(val).lower() == 'none':
+            return default
+        return int(val)
+    except (ValueError, TypeError):
+        return default
+
+def _payment_url(payment_method, order_id, total):
+    if payment_method == 'click':
+        cfg = get_payment_config('click')
+        if cfg.get('enabled') and cfg.get('merchant_id'):
+            return f"https://my.click.uz/services/pay?service_id={cfg['service_id']}&merchant_id={cfg['merchant_id']}&amount={total}&transaction_param={order_id}"
+    elif payment_method == 'payme':
+        cfg = get_payment_config('payme')
+        if cfg.get('enabled') and cfg.get('merchant_id'):
+            acc = f"m={cfg['merchant_id']};ac.order_id={order_id};a={total * 100}"
+            return f"https://checkout.paycom.uz/{base64.b64encode(acc.encode()).decode()}"
+    elif payment_method == 'uzum':
+        cfg = get_payment_config('uzum')
+        if cfg.get('enabled') and cfg.get('merchant_id'):
+            return f"https://payment.apelsin.uz/merchant?merchantId={cfg['merchant_id']}&amount={total}&orderId={order_id}"
+    return None
+
+# Checkout locks the cart first, then inventory in variant order, so two
+# checkouts sharing variants cannot deadlock
+_CHECKOUT_CART_SQL = '''
+    SELECT c.product_id, c.variant_id, c.quantity, c.selected_color, c.selected_attributes, 
+           p.name, p.price, p.images[1] AS image_url
+    FROM cart c JOIN products p ON c.product_id = p.id WHERE c.user_id = %s
+    ORDER BY c.id
+    FOR UPDATE OF c
+'''
+
+_CHECKOUT_INVENTORY_SQL = '''
+    SELECT id, variant_id, quantity, backorder_lead_time_days FROM product_inventory
+    WHERE variant_id = ANY(%s)
+    ORDER BY variant_id
+    FOR UPDATE
+'''
+
+def _allocate_stock(cart_items, inventory):
+    """
+    Availability per cart line against the locked inventory rows
+    ({variant_id: row}), in memory. Returns (lines, new quantities by
+    inventory id, has_backorder, max_backorder_days). A line that cannot be
+    filled in full goes to backorder and takes what is left.
+    """
+    remaining = {row['id']: row['quantity'] for row in inventory.values()}
+    lines, has_backorder, max_backorder_days = [], False, 0
+    for item in cart_items:
+        row = inventory.get(item['variant_id'])
+        status, lead_time = 'in_stock', None
+        if row and remaining[row['id']] >= item['quantity']:
+            remaining[row['id']] -= item['quantity']
+        else:
+            status, has_backorder = 'backorder', True
+            if row:
+                lead_time = row['backorder_lead_time_days']
+                max_backorder_days = max(max_backorder_days, lead_time or 0)
+                remaining[row['id']] = 0
+        lines.append({**dict(item), 'availability_status': status, 'backorder_lead_time_days': lead_time})
+    changed = {row['id']: remaining[row['id']] for row in inventory.values()
+               if remaining[row['id']] != row['quantity']}
+    return lines, changed, has_backorder, max_backorder_days
+
 @orders_bp.route('/orders/checkout', methods=['POST'])
 def checkout_order():
+    """
+    Cart -> order in one transaction with a fixed number of statements:
+    lock the cart lines, lock their inventory rows in variant order (so
+    concurrent checkouts always lock in the same order), allocate stock in
+    memory, then one UPDATE for stock, one INSERT each for the order and its
+    items, clear the cart and commit once.
+    """
     try:
         data = request.json
         user_id = session.get('user_id') or data.get('user_id')
@@ -65,153 +146,191 @@ def checkout_order():
         
         conn = get_db_connection()
         cur = conn.cursor()
-        cur.execute('''
-            SELECT c.product_id, c.quantity, c.selected_color, c.selected_attributes, p.name, p.price
-            FROM cart c JOIN products p ON c.product_id = p.id WHERE c.user_id = %s
-        ''', (user_id,))
-        cart_items = cur.fetchall()
-        
-        if not cart_items:
-            cur.close()
-            conn.close()
-            return jsonify({'error': 'Cart is empty'}), 400
-        
-        total = sum(item['price'] * item['quantity'] for item in cart_items)
-        has_backorder = False
-        max_backorder_days = 0
-        order_items_with_status = []
-        
-        for item in cart_items:
-            selected_attrs = item.get('selected_attributes')
-            if isinstance(selected_attrs, str):
-                selected_attrs = json_lib.loads(selected_attrs) if selected_attrs else {}
+        try:
+            # A second checkout of the same cart waits here, then finds it empty
+            cur.execute(_CHECKOUT_CART_SQL, (user_id,))
+            cart_items = cur.fetchall()
             
-            vals = list(selected_attrs.values()) if selected_attrs else []
-            attr1_val = vals[0] if vals else None
-            attr2_val = vals[1] if len(vals) > 1 else None
-            selected_color = item.get('selected_color')
+            if not cart_items:
+                conn.rollback()
+                return jsonify({'error': 'Cart is empty'}), 400
             
-            cur.execute('''
-                SELECT id, quantity, backorder_lead_time_days FROM product_inventory
-                WHERE product_id = %s AND (color = %s OR (color IS NULL AND %s IS NULL))
-                AND (attribute1_value = %s OR (attribute1_value IS NULL AND %s IS NULL))
-                AND (attribute2_value = %s OR (attribute2_value IS NULL AND %s IS NULL))
-                FOR UPDATE
-            ''', (item['product_id'], selected_color, selected_color, attr1_val, attr1_val, attr2_val, attr2_val))
+            variant_ids = sorted({item['variant_id'] for item in cart_items if item['variant_id']})
+            inventory = {}
+            if variant_ids:
+                cur.execute(_CHECKOUT_INVENTORY_SQL, (variant_ids,))
+                inventory = {row['variant_id']: row for row in cur.fetchall()}
+            
+            order_items_with_status, new_quantities, has_backorder, max_backorder_days = _allocate_stock(cart_items, inventory)
+            total = sum(item['price'] * item['quantity'] for item in cart_items)
             
-            inventory = cur.fetchone()
-            status = 'in_stock'
-            lead_time = None
+            if new_quantities:
+                execute_values(cur, '''
+                    UPDATE product_inventory i SET quantity = v.quantity
+                    FROM (VALUES %s) AS v(id, quantity)
+                    WHERE i.id = v.id
+                ''', list(new_quantities.items()), page_size=len(new_quantities))
             
-            if inventory:
-                if inventory['quantity'] >= item['quantity']:
-                    cur.execute('UPDATE product_inventory SET quantity = quantity - %s WHERE id = %s', (item['quantity'], inventory['id']))
-                else:
-                    status = 'backorder'
-                    lead_time = inventory.get('backorder_lead_time_days')
-                    has_backorder = True
-                    max_backorder_days = max(max_backorder_days, lead_time or 0)
-                    cur.execute('UPDATE product_inventory SET quantity = 0 WHERE id = %s', (inventory['id'],))
+            default_days = _safe_int(get_platform_setting('default_delivery_days'), 3)
+            if has_backorder:
+                estimated_days = max_backorder_days if max_backorder_days > 0 else default_days
             else:
-                status = 'backorder'
-                has_backorder = True
+                estimated_days = default_days
+            
+            backorder_date = datetime.now() + timedelta(days=estimated_days) if has_backorder else None
+            
+            initial_status = 'reviewing'
+            initial_pay_status = 'awaiting_verification' if payment_method == 'card_transfer' and payment_receipt_url else 'pending'
+            
+            # The id is chosen here so the payment link and payment_id go into the same INSERT
+            order_id = str(uuid.uuid4())
+            payment_url = _payment_url(payment_method, order_id, total)
+            payment_id = f"{payment_method}_{order_id}" if payment_url else None
             
-            order_items_with_status.append({**dict(item), 'availability_status': status, 'backorder_lead_time_days': lead_time})
-        
-        def safe_int(val, default):
-            try:
-                if val is None or str(val).lower() == 'none':
-                    return default
-                return int(val)
-            except (ValueError, TypeError):
-                return default
-
-        default_days = safe_int(get_platform_setting('default_delivery_days'), 3)
-        if has_backorder:
-            estimated_days = max_backorder_days if max_backorder_days > 0 else default_days
-        else:
-            estimated_days = default_days
-        
-        backorder_date = datetime.now() + timedelta(days=estimated_days) if has_backorder else None
-        
-        initial_status = 'reviewing'
-        initial_pay_status = 'awaiting_verification' if payment_method == 'card_transfer' and payment_receipt_url else 'pending'
-        
-        cur.execute('''
-            INSERT INTO orders (user_id, total, status, payment_method, payment_status, delivery_address, 
-                               customer_phone, customer_name, payment_receipt_url, has_backorder, 
-                               backorder_delivery_date, estimated_delivery_days)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s) RETURNING id
-        ''', (user_id, total, initial_status, payment_method, initial_pay_status, delivery_address, 
-              customer_phone, customer_name, payment_receipt_url, has_backorder, backorder_date, estimated_days))
-        order_id = cur.fetchone()['id']
-        
-        for item in order_items_with_status:
             cur.execute('''
-                INSERT INTO order_items (order_id, product_id, name, price, quantity, selected_color, 
+                INSERT INTO orders (id, user_id, total, status, payment_method, payment_status, payment_id, delivery_address, 
+                                   customer_phone, customer_name, payment_receipt_url, has_backorder, 
+                                   backorder_delivery_date, estimated_delivery_days)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ''', (order_id, user_id, total, initial_status, payment_method, initial_pay_status, payment_id, delivery_address, 
+                  customer_phone, customer_name, payment_receipt_url, has_backorder, backorder_date, estimated_days))
+            
+            execute_values(cur, '''
+                INSERT INTO order_items (order_id, product_id, variant_id, name, price, quantity, image_url, selected_color, 
                                         selected_attributes, availability_status, backorder_lead_time_days)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-            ''', (order_id, item['product_id'], item['name'], item['price'], item['quantity'], 
-                  item.get('selected_color'), json_lib.dumps(item.get('selected_attributes')) if item.get('selected_attributes') else None,
-                  item['availability_status'], item.get('backorder_lead_time_days')))
-        
-        conn.commit()
-        
-        # Payment generation logic
-        payment_url = None
-        if payment_method == 'click':
-            cfg = get_payment_config('click')
-            if cfg.get('enabled') and cfg.get('merchant_id'):
-                payment_url = f"https://my.click.uz/services/pay?service_id={cfg['service_id']}&merchant_id={cfg['merchant_id']}&amount={total}&transaction_param={order_id}"
-        elif payment_method == 'payme':
-            cfg = get_payment_config('payme')
-            if cfg.get('enabled') and cfg.get('merchant_id'):
-                acc = f"m={cfg['merchant_id']};ac.order_id={order_id};a={total * 100}"
-                payment_url = f"https://checkout.paycom.uz/{base64.b64encode(acc.encode()).decode()}"
-        elif payment_method == 'uzum':
-            cfg = get_payment_config('uzum')
-            if cfg.get('enabled') and cfg.get('merchant_id'):
-                payment_url = f"https://payment.apelsin.uz/merchant?merchantId={cfg['merchant_id']}&amount={total}&orderId={order_id}"
-        # Always clear cart after order
-        cur.execute('DELETE FROM cart WHERE user_id = %s', (user_id,))
-        conn.commit()
-
-        if payment_url:
-            cur.execute('UPDATE orders SET payment_id = %s WHERE id = %s', (f"{payment_method}_{order_id}", order_id))
+                VALUES %s
+            ''', [
+                (order_id, item['product_id'], item['variant_id'], item['name'], item['price'], item['quantity'], item['image_url'],
+                 item.get('selected_color'), json_lib.dumps(item.get('selected_attributes')) if item.get('selected_attributes') else None,
+                 item['availability_status'], item.get('backorder_lead_time_days'))
+                for item in order_items_with_status
+            ], page_size=len(order_items_with_status))
+            
+            cur.execute('DELETE FROM cart WHERE user_id = %s', (user_id,))
+            
+            # Delivered by the outbox worker once this transaction commits
+            order_data = {'id': order_id, 'total': total, 'customer_name': customer_name, 'customer_phone': customer_phone, 
+                          'delivery_address': delivery_address, 'payment_method': payment_method, 
+                          'payment_receipt_url': payment_receipt_url, 'created_at': datetime.now()}
+            outbox.enqueue(cur, outbox.ORDER_NOTIFICATION, 
+                           {'order': order_data, 'items': order_items_with_status, 'site_url': request.url_root})
             conn.commit()
-
-        cur.close()
-        conn.close()
-        
-        # Notification
-        order_data = {'id': order_id, 'total': total, 'customer_name': customer_name, 'customer_phone': customer_phone, 
-                      'delivery_address': delivery_address, 'payment_method': payment_method, 'payment_receipt_url': payment_receipt_url}
-        send_telegram_notification(order_data, order_items_with_status, request.url_root)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+            conn.close()
         
         return jsonify({'order_id': order_id, 'payment_url': payment_url, 'message': 'Success'}), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+_ORDERS_WITH_ITEMS_SQL = '''
+    SELECT o.*, coalesce(i.items, '[]'::json) AS items
+    FROM orders o
+    LEFT JOIN LATERAL (
+        SELECT json_agg(oi ORDER BY oi.position) AS items FROM order_items oi WHERE oi.order_id = o.id
+    ) i ON TRUE
+    WHERE {where}
+    ORDER BY {order_by}
+    LIMIT %s
+'''
+
+def _orders_with_items(cur, conditions, params, order_by, limit):
+    """Orders matching `conditions`, each with its items aggregated in the same query."""
+    cur.execute(_ORDERS_WITH_ITEMS_SQL.format(where=' AND '.join(conditions), order_by=order_by),
+                tuple(params) + (limit,))
+    return cur.fetchall()
+
 @orders_bp.route('/orders', methods=['GET'])
 def get_user_orders():
+    """
+    The user's orders, newest first, each with its items, in one query.
+    Query params: limit, cursor (next_cursor of the previous page), include_total=1.
+    Returns {items, next_cursor[, total]}.
+    """
     try:
         user_id = session.get('user_id')
         if not user_id: return jsonify({'error': 'Not authenticated'}), 401
         
+        try:
+            limit = int(request.args.get('limit') or ORDERS_PAGE_SIZE)
+        except ValueError:
+            return jsonify({'error': 'limit must be an integer'}), 400
+        try:
+            cursor = decode_order_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        limit = max(1, min(limit, MAX_ORDERS_PAGE_SIZE))
+        
+        conditions = ['o.user_id = %s']
+        params = [user_id]
+        if cursor:
+            sql, cursor_params = cursor_condition(cursor)
+            conditions.append(sql)
+            params.extend(cursor_params)
+        
         conn = get_db_connection()
         cur = conn.cursor()
-        cur.execute('SELECT * FROM orders WHERE user_id = %s ORDER BY created_at DESC LIMIT 50', (user_id,))
-        orders = cur.fetchall()
+        try:
+            orders = _orders_with_items(cur, conditions, params, 'o.created_at DESC, o.id DESC', limit + 1)
+            
+            total = None
+            if request.args.get('include_total') in ('1', 'true'):
+                cur.execute('SELECT COUNT(*) AS total FROM orders WHERE user_id = %s', (user_id,))
+                total = cur.fetchone()['total']
+        finally:
+            cur.close()
+            conn.close()
         
-        for order in orders:
-            cur.execute('''
-                SELECT oi.*, p.images[1] as image_url FROM order_items oi
-                LEFT JOIN products p ON oi.product_id = p.id WHERE oi.order_id = %s
-            ''', (order['id'],))
-            order['items'] = cur.fetchall()
+        next_cursor = None
+        if len(orders) > limit:
+            orders = orders[:limit]
+            next_cursor = encode_order_cursor(orders[-1]['created_at'], orders[-1]['id'])
         
-        cur.close()
-        conn.close()
-        return jsonify(orders)
+        result = {'items': orders, 'next_cursor': next_cursor}
+        if total is not None:
+            result['total'] = total
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@orders_bp.route('/orders/changes', methods=['GET'])
+def get_user_order_changes():
+    """
+    The user's orders created or changed (status, payment status) after
+    `since`, oldest change first, in the same shape as GET /orders.
+    Query params: since (cursor of the previous answer; omit it to get a
+    starting cursor), wait (long poll, seconds, see order_changes.py).
+    Returns {items, cursor, has_more}, plus retry_after
+    (seconds) when the server is too busy to hold the request.
+    """
+    user_id = session.get('user_id')
+    if not user_id: return jsonify({'error': 'Not authenticated'}), 401
+    try:
+        since = decode_order_cursor(request.args['since']) if request.args.get('since') else None
+        wait = order_changes.parse_wait(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        if since is None:
+            cursor = order_changes.run_detached(order_changes.current_cursor)
+            return jsonify({'items': [], 'cursor': encode_order_cursor(*cursor), 'has_more': False})
+        
+        def fetch():
+            sql, params = order_changes.changes_condition(since)
+            return order_changes.run_detached(lambda cur: _orders_with_items(
+                cur, ['o.user_id = %s', sql], (user_id,) + params, 'o.updated_at, o.id', order_changes.MAX_CHANGES + 1))
+        
+        orders, waited = order_changes.poll_changes(fetch, user_id, wait)
+        has_more = len(orders) > order_changes.MAX_CHANGES
+        orders = orders[:order_changes.MAX_CHANGES]
+        cursor = encode_order_cursor(orders[-1]['updated_at'], orders[-1]['id']) if orders else request.args['since']
+        result = {'items': orders, 'cursor': cursor, 'has_more': has_more}
+        if not waited:
+            result['retry_after'] = order_changes.RETRY_AFTER
+        return jsonify(result)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -9,6 +9,9 @@ from ..database import get_db_connection, get_payment_config
 
 payments_bp = Blueprint('payments', __name__)
 
+# Payme and Uzum identify the order by the transaction id stored at checkout
+_MARK_PAID_SQL = "UPDATE orders SET payment_status = 'paid', status = 'paid' WHERE payment_id = %s"
+
 def verify_click_signature(data, secret_key):
     click_trans_id = str(data.get('click_trans_id', ''))
     service_id = str(data.get('service_id', ''))
@@ -144,7 +147,7 @@ def payme_webhook():
         return jsonify({'result': {'create_time': int(datetime.now().timestamp() * 1000), 'transaction': order_id, 'state': 1}})
         
     elif method == 'PerformTransaction':
-        cur.execute("UPDATE orders SET payment_status = 'paid', status = 'paid' WHERE payment_id = %s", (params.get('id'),))
+        cur.execute(_MARK_PAID_SQL, (params.get('id'),))
         conn.commit()
         cur.close()
         conn.close()
@@ -176,7 +179,7 @@ def uzum_confirm():
     tx_id = request.json.get('transactionId')
     conn = get_db_connection()
     cur = conn.cursor()
-    cur.execute("UPDATE orders SET payment_status = 'paid', status = 'paid' WHERE payment_id = %s", (tx_id,))
+    cur.execute(_MARK_PAID_SQL, (tx_id,))
     conn.commit()
     cur.close()
     conn.close()
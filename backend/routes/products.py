@@ -1,110 +1,363 @@
+import json
+import base64
+from datetime import datetime
 from flask import Blueprint, request, jsonify
 from ..database import get_db_connection
+from ..projections import requested_fields, select_list, CARD_VIEW, FULL_VIEW
+from ..utils.http_cache import catalog_cached
+from ..inventory import get_stock_summary, get_variant_availability, stock_summary_entry
+from ..search import search_condition
+from ..facets import parse_facet_filters, color_condition, attribute_condition, get_facets
+from ..catalog_version import get_catalog_version
+from ..catalog_snapshot import get_snapshot, product_dict, inventory_dicts
 
 products_bp = Blueprint('products', __name__)
 
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+# ?include= on GET /products/<id>
+PRODUCT_INCLUDES = ('category', 'related')
+DEFAULT_RELATED_LIMIT = 8
+MAX_RELATED_LIMIT = 24
+
+# POST /products/batch
+MAX_BATCH_IDS = 500
+
+# sort name -> (column, direction, SQL type of the cursor value)
+# Every sort is tie-broken by id in the same direction, so keyset
+# comparisons can use a single row comparison.
+PRODUCT_SORTS = {
+    'new': ('created_at', 'DESC', 'timestamp'),
+    'old': ('created_at', 'ASC', 'timestamp'),
+    'price-asc': ('price', 'ASC', 'integer'),
+    'price-desc': ('price', 'DESC', 'integer'),
+    'name': ('name', 'ASC', 'text'),
+}
+
+_SEARCH_MATCHES_SQL = 'WITH search_matches AS MATERIALIZED (SELECT p.id FROM products p WHERE {match}) '
+
+# {prefix} is _SEARCH_MATCHES_SQL (or ''), {where} the filters and keyset condition
+_PRODUCT_PAGE_SQL = (
+    '{prefix}SELECT {columns}, {column} AS _cursor_value FROM products{where} '
+    'ORDER BY {column} {direction}, id {direction} LIMIT %s'
+)
+
+_PRODUCTS_BATCH_SQL = '''
+    SELECT {columns},
+           st.total_quantity AS _total_quantity,
+           st.in_stock_variants AS _in_stock_variants,
+           st.min_backorder_lead_time_days AS _min_backorder_lead_time_days
+    FROM products p
+    LEFT JOIN product_stock_summary st ON st.product_id = p.id
+    WHERE p.id = ANY(%s)
+'''
+
+_FAVORITES_SQL = '''
+    SELECT {columns} FROM favorites f
+    JOIN products p ON f.product_id = p.id
+    WHERE f.user_id = %s
+'''
+
+def _keyset_condition(sort):
+    """Rows after a cursor's (value, id) in `sort` order."""
+    column, direction, value_type = PRODUCT_SORTS[sort]
+    op = '<' if direction == 'DESC' else '>'
+    return f'({column}, id) {op} (%s::{value_type}, %s)'
+
+def _encode_cursor(sort, value, product_id):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([sort, value, product_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def _decode_cursor(cursor, sort):
+    """Opaque cursor -> (value, id); a cursor is only valid for the sort that produced it."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_sort, value, product_id = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+    if cursor_sort != sort:
+        raise ValueError('Cursor does not match sort')
+    return value, product_id
+
+def _parse_int_arg(name):
+    value = request.args.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f'{name} must be an integer')
+
+def _legacy_product_list(category):
+    snapshot = get_snapshot()
+    products = snapshot.products_by_category.get(category, ()) if category else snapshot.products
+    return jsonify([product_dict(p) for p in products])
+
 @products_bp.route('/products', methods=['GET'])
+@catalog_cached(cache_body=True)
 def get_products():
+    """
+    Paginated catalog listing.
+
+    Query params: category, price_min, price_max, q (full-text, see search.py),
+    color, attr (see facets.py), sort (new|old|price-asc|price-desc|name),
+    limit, cursor (next_cursor of the previous page), include_total=1,
+    fields / view=card (see projections.py).
+    Returns {items, next_cursor[, total]}.
+    all=1 returns the whole catalog as a plain list (old behaviour).
+    """
+    category = request.args.get('category')
+    if request.args.get('all') in ('1', 'true'):
+        try:
+            return _legacy_product_list(category)
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    sort = (request.args.get('sort') or 'new').replace('_', '-')
+    if sort not in PRODUCT_SORTS:
+        return jsonify({'error': f"Unknown sort '{sort}'"}), 400
+    column, direction, _ = PRODUCT_SORTS[sort]
+
+    try:
+        limit = _parse_int_arg('limit') or DEFAULT_PAGE_SIZE
+        price_min = _parse_int_arg('price_min')
+        price_max = _parse_int_arg('price_max')
+        cursor = _decode_cursor(request.args['cursor'], sort) if request.args.get('cursor') else None
+        fields = requested_fields(request.args)
+        colors, attributes = parse_facet_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    include_total = request.args.get('include_total') in ('1', 'true')
+    search = (request.args.get('q') or '').strip()
+
+    # Matches are collected first so the planner cannot walk the sort index
+    # and test every row against the search predicate
+    prefix = ''
+    prefix_params = []
+    if search:
+        match_sql, match_params = search_condition(search)
+        prefix = _SEARCH_MATCHES_SQL.format(match=match_sql)
+        prefix_params = list(match_params)
+
+    conditions = []
+    params = list(prefix_params)
+    if category and category != 'all':
+        conditions.append('category_id = %s')
+        params.append(category)
+    if price_min is not None:
+        conditions.append('price >= %s')
+        params.append(price_min)
+    if price_max is not None:
+        conditions.append('price <= %s')
+        params.append(price_max)
+    if colors:
+        sql, condition_params = color_condition(colors, 'products')
+        conditions.append(sql)
+        params.extend(condition_params)
+    for name, values in attributes.items():
+        sql, condition_params = attribute_condition(name, values, 'products')
+        conditions.append(sql)
+        params.extend(condition_params)
+    if search:
+        conditions.append('id IN (SELECT id FROM search_matches)')
+
     try:
-        category = request.args.get('category')
         conn = get_db_connection()
         cur = conn.cursor()
-        if category:
-            cur.execute('SELECT * FROM products WHERE category_id = %s', (category,))
-        else:
-            cur.execute('SELECT * FROM products')
-        products = cur.fetchall()
+
+        total = None
+        if include_total:
+            where = ' WHERE ' + ' AND '.join(conditions) if conditions else ''
+            cur.execute(f'{prefix}SELECT COUNT(*) AS total FROM products{where}', tuple(params))
+            total = cur.fetchone()['total']
+
+        page_conditions = list(conditions)
+        page_params = list(params)
+        if cursor:
+            page_conditions.append(_keyset_condition(sort))
+            page_params.extend(cursor)
+        where = ' WHERE ' + ' AND '.join(page_conditions) if page_conditions else ''
+        cur.execute(
+            _PRODUCT_PAGE_SQL.format(prefix=prefix, columns=select_list(fields, 'products'), column=column,
+                                     direction=direction, where=where),
+            tuple(page_params) + (limit + 1,)
+        )
+        rows = cur.fetchall()
         cur.close()
         conn.close()
-        return jsonify(products)
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = _encode_cursor(sort, rows[-1]['_cursor_value'], rows[-1]['id'])
+        for row in rows:
+            del row['_cursor_value']
+
+        result = {'items': rows, 'next_cursor': next_cursor}
+        if include_total:
+            result['total'] = total
+        return jsonify(result)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@products_bp.route('/products/<product_id>', methods=['GET'])
-def get_product(product_id):
+@products_bp.route('/products/facets', methods=['GET'])
+@catalog_cached(cache_body=True)
+def get_product_facets():
+    """
+    Facet counts for the FilterBar in one query (see facets.py).
+    Takes the same filters as /products: category, price_min, price_max, q,
+    color, attr. Returns {total, in_stock, categories, colors, attributes,
+    price: {min, max, buckets}}; every count also has an in_stock count.
+    """
+    try:
+        price_min = _parse_int_arg('price_min')
+        price_max = _parse_int_arg('price_max')
+        colors, attributes = parse_facet_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        version = get_catalog_version()
+    except Exception:
+        version = None
     try:
         conn = get_db_connection()
         cur = conn.cursor()
-        cur.execute('SELECT * FROM products WHERE id = %s', (product_id,))
-        product = cur.fetchone()
-        if not product:
-            cur.close()
-            conn.close()
-            return jsonify({'error': 'Product not found'}), 404
-        
-        cur.execute('SELECT color, attribute1_value, attribute2_value, quantity, backorder_lead_time_days FROM product_inventory WHERE product_id = %s', (product_id,))
-        inventory = cur.fetchall()
+        facets = get_facets(
+            cur, version,
+            category=request.args.get('category'),
+            price_min=price_min,
+            price_max=price_max,
+            search=(request.args.get('q') or '').strip() or None,
+            colors=colors,
+            attributes=attributes,
+        )
         cur.close()
         conn.close()
-        
-        product_data = dict(product)
-        product_data['inventory'] = inventory
+        return jsonify(facets)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@products_bp.route('/products/<product_id>', methods=['GET'])
+@catalog_cached(cache_body=True)
+def get_product(product_id):
+    """
+    One document for the product page, served from the catalog snapshot.
+    Always includes `inventory`. include=category adds {id, name, icon},
+    include=related adds up to related_limit (max 24) newest card-view
+    products of the same category. fields / view as in projections.py.
+    """
+    try:
+        fields = requested_fields(request.args, default=FULL_VIEW, full=True)
+        includes = [i.strip() for i in (request.args.get('include') or '').split(',') if i.strip()]
+        unknown = [i for i in includes if i not in PRODUCT_INCLUDES]
+        if unknown:
+            raise ValueError(f"Unknown include(s): {', '.join(unknown)}")
+        related_limit = _parse_int_arg('related_limit') or DEFAULT_RELATED_LIMIT
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    related_limit = max(1, min(related_limit, MAX_RELATED_LIMIT))
+    try:
+        snapshot = get_snapshot()
+        product = snapshot.get_product(product_id)
+        if not product:
+            return jsonify({'error': 'Product not found'}), 404
+        product_data = product_dict(product, fields)
+        product_data['inventory'] = inventory_dicts(snapshot.get_inventory(product_id))
+        if 'category' in includes:
+            category = snapshot.categories_by_id.get(product.category_id)
+            product_data['category'] = (
+                {'id': category.id, 'name': category.name, 'icon': category.icon} if category else None
+            )
+        if 'related' in includes:
+            product_data['related'] = [
+                product_dict(p, CARD_VIEW, full=False)
+                for p in snapshot.related_products(product, related_limit)
+            ]
         return jsonify(product_data)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @products_bp.route('/products/<product_id>/inventory', methods=['GET'])
 def get_product_inventory(product_id):
+    try:
+        return jsonify(inventory_dicts(get_snapshot().get_inventory(product_id)))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@products_bp.route('/products/availability', methods=['POST'])
+def check_products_availability():
+    """
+    {"product_ids": [...]} -> {product_id: stock summary} (product grids)
+    {"items": [{product_id, quantity, color, attribute1_value, attribute2_value}]}
+        -> {"items": [{product_id, available, quantity_in_stock}]} (cart)
+    """
+    data = request.json or {}
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    if not isinstance(data.get('product_ids') or [], list):
+        return jsonify({'error': 'product_ids must be a list'}), 400
     try:
         conn = get_db_connection()
         cur = conn.cursor()
-        cur.execute('SELECT color, attribute1_value, attribute2_value, quantity, backorder_lead_time_days FROM product_inventory WHERE product_id = %s', (product_id,))
-        inventory = cur.fetchall()
+        if 'product_ids' in data:
+            result = get_stock_summary(cur, data.get('product_ids') or [])
+        else:
+            result = {'items': get_variant_availability(cur, data.get('items') or [])}
         cur.close()
         conn.close()
-        return jsonify(inventory)
+        return jsonify(result)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@products_bp.route('/products/availability', methods=['POST'])
-def check_products_availability():
+@products_bp.route('/products/batch', methods=['POST'])
+def get_products_batch():
+    """
+    {"product_ids": [...]} -> {"items": [...], "missing": [...]} in one query.
+    Items are card-view products (fields= as in projections.py) with a
+    `stock` summary, in request order; ids that no longer exist are listed
+    in `missing`. For favorites, cart revalidation and recently viewed.
+    """
+    try:
+        fields = requested_fields(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    data = request.json or {}
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    product_ids = data.get('product_ids') or []
+    if not isinstance(product_ids, list):
+        return jsonify({'error': 'product_ids must be a list'}), 400
+    product_ids = list(dict.fromkeys(str(pid) for pid in product_ids if pid not in (None, '')))
+    if len(product_ids) > MAX_BATCH_IDS:
+        return jsonify({'error': f'At most {MAX_BATCH_IDS} product ids per request'}), 400
+    if not product_ids:
+        return jsonify({'items': [], 'missing': []})
+
     try:
-        data = request.json
-        items = data.get('items', []) # Expects [{product_id, quantity, color, attribute1_value, ...}]
-        
         conn = get_db_connection()
         cur = conn.cursor()
-        
-        results = []
-        for item in items:
-            pid = item.get('product_id')
-            if not pid: continue
-            
-            # Construct query based on provided attributes
-            query = "SELECT quantity FROM product_inventory WHERE product_id = %s"
-            params = [pid]
-            
-            if item.get('color'):
-                query += " AND color = %s"
-                params.append(item.get('color'))
-            else:
-                query += " AND color IS NULL"
-                
-            if item.get('attribute1_value'):
-                query += " AND attribute1_value = %s"
-                params.append(item.get('attribute1_value'))
-            else:
-                query += " AND attribute1_value IS NULL"
-                
-            if item.get('attribute2_value'):
-                query += " AND attribute2_value = %s"
-                params.append(item.get('attribute2_value'))
-            else:
-                query += " AND attribute2_value IS NULL"
-                
-            cur.execute(query, tuple(params))
-            row = cur.fetchone()
-            
-            available = row['quantity'] >= item.get('quantity', 1) if row else False
-            results.append({
-                'product_id': pid,
-                'available': available,
-                'quantity_in_stock': row['quantity'] if row else 0
-            })
-            
+        cur.execute(_PRODUCTS_BATCH_SQL.format(columns=select_list(fields)), (product_ids,))
+        rows = cur.fetchall()
         cur.close()
         conn.close()
-        return jsonify({'items': results})
+
+        found = {}
+        for row in rows:
+            stock = {key[1:]: row.pop(key) for key in
+                     ('_total_quantity', '_in_stock_variants', '_min_backorder_lead_time_days')}
+            row['stock'] = stock_summary_entry(stock if stock['in_stock_variants'] is not None else None)
+            found[row['id']] = row
+        return jsonify({
+            'items': [found[pid] for pid in product_ids if pid in found],
+            'missing': [pid for pid in product_ids if pid not in found],
+        })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -116,40 +369,30 @@ def check_products_exist():
         if not product_ids:
             return jsonify({'existing': [], 'missing': []})
         
-        conn = get_db_connection()
-        cur = conn.cursor()
-        placeholders = ','.join(['%s'] * len(product_ids))
-        cur.execute(f'SELECT id FROM products WHERE id IN ({placeholders})', tuple(product_ids))
-        existing_ids = [p['id'] for p in cur.fetchall()]
-        missing_ids = [pid for pid in product_ids if pid not in existing_ids]
-        cur.close()
-        conn.close()
+        products_by_id = get_snapshot().products_by_id
+        existing_ids = [pid for pid in product_ids if pid in products_by_id]
+        missing_ids = [pid for pid in product_ids if pid not in products_by_id]
         return jsonify({'existing': existing_ids, 'missing': missing_ids})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @products_bp.route('/categories', methods=['GET'])
+@catalog_cached(cache_body=True)
 def get_categories():
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute('SELECT * FROM categories ORDER BY sort_order, name')
-        categories = cur.fetchall()
-        cur.close()
-        conn.close()
-        return jsonify(categories)
+        return jsonify([category._asdict() for category in get_snapshot().categories])
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 @products_bp.route('/favorites/<user_id>', methods=['GET'])
 def get_favorites(user_id):
+    try:
+        fields = requested_fields(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     try:
         conn = get_db_connection()
         cur = conn.cursor()
-        cur.execute('''
-            SELECT p.* FROM favorites f
-            JOIN products p ON f.product_id = p.id
-            WHERE f.user_id = %s
-        ''', (user_id,))
+        cur.execute(_FAVORITES_SQL.format(columns=select_list(fields)), (user_id,))
         favorites = cur.fetchall()
         cur.close()
         conn.close()
@@ -0,0 +1,105 @@
+from functools import wraps
+from flask import Blueprint, request, jsonify, make_response
+from ..database import get_db_connection
+from ..search import search_products
+from .. import suggest as suggest_index
+from ..utils.http_cache import catalog_cached
+
+search_bp = Blueprint('search', __name__)
+
+
+def _counts_query(view):
+    """
+    Count first-page searches for /search/suggest outside catalog_cached, so
+    revalidated (304) repeats are counted too. A 304 carries no result list:
+    it only counts queries already recorded with results. Counting is in
+    memory (suggest.count_query), so neither answer touches the database.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        response = make_response(view(*args, **kwargs))
+        q = (request.args.get('q') or '').strip()
+        if q and (request.args.get('offset') or '0') == '0':
+            if response.status_code == 304:
+                suggest_index.count_query(q, new=False)
+            elif response.status_code == 200 and (response.get_json(silent=True) or {}).get('items'):
+                suggest_index.count_query(q)
+        return response
+    return wrapper
+
+
+@search_bp.route('/search', methods=['GET'])
+@_counts_query
+@catalog_cached()
+def search():
+    """
+    Ranked product search with highlighting.
+    Query params: q, category, in_stock=1, limit (max 50), offset.
+    Returns {query, items, has_more}; items are card projections plus `rank`
+    and `highlight` ({name, snippet} with matches wrapped in <mark>).
+    """
+    q = (request.args.get('q') or '').strip()
+    if not q:
+        return jsonify({'query': q, 'items': [], 'has_more': False})
+    try:
+        limit = int(request.args.get('limit', 20))
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return jsonify({'error': 'limit and offset must be integers'}), 400
+
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        items, has_more = search_products(
+            cur, q, limit=limit, offset=offset,
+            category=request.args.get('category'),
+            in_stock_only=request.args.get('in_stock') in ('1', 'true'),
+            highlight=True,
+        )
+        cur.close()
+        conn.close()
+        return jsonify({'query': q, 'items': items, 'has_more': has_more})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+SUGGEST_TYPES = (suggest_index.PRODUCT, suggest_index.CATEGORY, suggest_index.QUERY)
+
+
+@search_bp.route('/search/suggest', methods=['GET'])
+def suggest():
+    """
+    Autocomplete from the in-process prefix index.
+    Query params: q (prefix), limit (max 20), types=product,category,query.
+    Returns {query, suggestions}; each suggestion has `type` and `text`,
+    products add id, name, price, image and category_id, categories id,
+    name and icon.
+    """
+    q = (request.args.get('q') or '').strip()
+    if not q:
+        return jsonify({'query': q, 'suggestions': []})
+    try:
+        limit = int(request.args.get('limit', 8))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    kinds = None
+    if request.args.get('types'):
+        kinds = tuple(sorted({t.strip() for t in request.args['types'].split(',') if t.strip()}))
+        unknown = [t for t in kinds if t not in SUGGEST_TYPES]
+        if unknown:
+            return jsonify({'error': f"Unknown type(s): {', '.join(unknown)}"}), 400
+
+    # Usually answered from memory without touching the database
+    if suggest_index.needs_refresh():
+        try:
+            conn = get_db_connection()
+            cur = conn.cursor()
+            suggest_index.refresh(cur)
+            cur.close()
+            conn.close()
+        except Exception as e:
+            # A stale index is better than no suggestions
+            print(f"⚠️ Suggest index refresh failed: {e}")
+            if not suggest_index.is_built():
+                return jsonify({'error': str(e)}), 500
+    return jsonify({'query': q, 'suggestions': suggest_index.suggest(q, limit, kinds)})
@@ -0,0 +1,98 @@
+"""
+Product search.
+
+Matching and ranking are SQL functions from migration 0006:
+product_search_query(q, match_all) builds a tsquery (russian stems plus
+simple prefixes), and product_search_rank() adds the full-text rank to the
+trigram word similarity of the name. A product matches when its
+search_vector (GIN) matches the query, or when the query is a close
+trigram match for a word sequence in the name (GIN trgm, typo tolerance).
+"""
+import html
+
+from .projections import select_list, CARD_VIEW
+
+MAX_SEARCH_RESULTS = 50
+
+HIGHLIGHT_START = '⟦'
+HIGHLIGHT_STOP = '⟧'
+_HEADLINE_OPTIONS = f'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}'
+
+
+def search_condition(q, alias='p', match_all=True):
+    """(sql, params) for a WHERE fragment matching products aliased as `alias`."""
+    sql = (f'({alias}.search_vector @@ product_search_query(%s, %s) '
+           f'OR %s <%% {alias}.name)')
+    return sql, (q, match_all, q)
+
+
+def rank_expression(q, alias='p', match_all=True):
+    """(sql, params) for the relevance of products aliased as `alias`, higher is better."""
+    sql = f'product_search_rank({alias}.search_vector, {alias}.name, product_search_query(%s, %s), %s)'
+    return sql, (q, match_all, q)
+
+
+def render_highlight(text):
+    """Escape a ts_headline() result and turn its markers into <mark> tags."""
+    if not text:
+        return text
+    return (html.escape(text)
+            .replace(HIGHLIGHT_START, '<mark>')
+            .replace(HIGHLIGHT_STOP, '</mark>'))
+
+
+def search_products(cur, q, limit=20, offset=0, category=None, in_stock_only=False,
+                    fields=CARD_VIEW, highlight=False):
+    """
+    Ranked product search. Returns (rows, has_more).
+    highlight=True adds a `highlight` dict with the marked-up name and a
+    description snippet (HTML-escaped, matches wrapped in <mark>).
+    """
+    limit = max(1, min(limit, MAX_SEARCH_RESULTS))
+    conditions = ['(p.search_vector @@ s.query OR s.q <%% p.name)']
+    params = {'q': q, 'limit': limit + 1, 'offset': max(0, offset)}
+    joins = ''
+    if category and category != 'all':
+        conditions.append('p.category_id = %(category)s')
+        params['category'] = category
+    if in_stock_only:
+        joins = 'JOIN product_stock_summary st ON st.product_id = p.id AND st.in_stock_variants > 0'
+
+    # ts_headline is expensive, so it only runs on the page that is returned
+    headline = ''
+    if highlight:
+        headline = f''',
+            ts_headline('russian', r._name, s.query, 'HighlightAll=true, {_HEADLINE_OPTIONS}') AS _name_highlight,
+            ts_headline('russian', coalesce(r._description, ''), s.query,
+                        'MaxFragments=1, MaxWords=20, MinWords=8, {_HEADLINE_OPTIONS}') AS _snippet'''
+
+    sql = f'''
+        WITH s AS (SELECT product_search_query(%(q)s) AS query, %(q)s::text AS q),
+        r AS (
+            SELECT {select_list(fields)}, p.name AS _name, p.description AS _description,
+                   product_search_rank(p.search_vector, p.name, s.query, s.q) AS _rank
+            FROM products p CROSS JOIN s {joins}
+            WHERE {' AND '.join(conditions)}
+            ORDER BY _rank DESC, p.name, p.id
+            LIMIT %(limit)s OFFSET %(offset)s
+        )
+        SELECT r.*{headline}
+        FROM r CROSS JOIN s
+        ORDER BY r._rank DESC, r._name, r.id
+    '''
+    cur.execute(sql, params)
+    rows = cur.fetchall()
+    has_more = len(rows) > limit
+    results = []
+    for row in rows[:limit]:
+        row = dict(row)
+        row['rank'] = round(float(row.pop('_rank')), 4)
+        row.pop('_name')
+        row.pop('_description')
+        if highlight:
+            row['highlight'] = {
+                'name': render_highlight(row.pop('_name_highlight')),
+                'snippet': render_highlight(row.pop('_snippet')),
+            }
+        results.append(row)
+    return results, has_more
@@ -34,8 +34,8 @@ def send_email(to_email, subject, html_content, text_content=None):
         print(f"❌ Email sending failed: {e}")
         return False, str(e)
 
-def send_password_reset_email(email, token, site_url):
-    """Send password reset email"""
+def password_reset_email(token, site_url):
+    """(subject, html, text) of the password reset email"""
     reset_link = f"{site_url}/reset-password?token={token}"
     
     html_content = f"""
@@ -57,5 +57,10 @@ def send_password_reset_email(email, token, site_url):
     
     text_content = f"Сброс пароля\n\nВы запросили сброс пароля. Перейдите по ссылке ниже, чтобы установить новый пароль:\n\n{reset_link}"
     
-    success, error = send_email(email, "Сброс пароля", html_content, text_content)
+    return "Сброс пароля", html_content, text_content
+
+def send_password_reset_email(email, token, site_url):
+    """Send password reset email"""
+    subject, html_content, text_content = password_reset_email(token, site_url)
+    success, error = send_email(email, subject, html_content, text_content)
     return success
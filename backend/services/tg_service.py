@@ -3,73 +3,82 @@ import os
 from datetime import datetime
 from ..database import get_telegram_config
 
+TELEGRAM_NOT_CONFIGURED = 'Telegram not configured'
+
+def send_telegram_message(text, parse_mode=None, chat_id=None):
+    """Send a message to the admin chat (or chat_id). Returns (success, error) like send_email."""
+    tg_config = get_telegram_config()
+    bot_token = tg_config.get('bot_token')
+    chat_id = chat_id or tg_config.get('admin_chat_id')
+    if not bot_token or not chat_id:
+        return False, TELEGRAM_NOT_CONFIGURED
+    
+    payload = {'chat_id': chat_id, 'text': text, 'disable_web_page_preview': True}
+    if parse_mode:
+        payload['parse_mode'] = parse_mode
+    try:
+        response = requests.post(f"https://api.telegram.org/bot{bot_token}/sendMessage", json=payload, timeout=10)
+    except requests.RequestException as e:
+        return False, str(e)
+    if response.status_code != 200:
+        return False, f"{response.status_code}: {response.text}"
+    return True, None
+
+def format_order_notification(order_data, order_items, site_url=None):
+    """HTML text of the new-order message for the admin chat"""
+    order_id = str(order_data.get('id', 'unknown'))
+    order_id_short = order_id[:6]
+    
+    # Count items and format
+    total_items = sum(item['quantity'] for item in order_items)
+    items_text = ""
+    for item in order_items:
+        item_total = item['price'] * item['quantity']
+        items_text += f"• {item['name']}"
+        if item.get('selected_color'):
+            items_text += f" ({item['selected_color']})"
+        items_text += f"\n  {item['quantity']} шт × {item['price']:,} = <b>{item_total:,}</b> сум\n"
+    
+    payment_labels = {
+        'click': '💳 Click',
+        'payme': '💳 Payme',
+        'uzum': '💳 Uzum Bank',
+        'card_transfer': '💵 Перевод на карту'
+    }
+    payment_method = payment_labels.get(order_data.get('payment_method'), order_data.get('payment_method', 'Не указан'))
+    
+    created_at = order_data.get('created_at')
+    if created_at:
+        try:
+            if isinstance(created_at, str):
+                dt = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
+            else:
+                dt = created_at
+            date_str = dt.strftime('%d.%m.%Y %H:%M')
+        except:
+            date_str = 'Только что'
+    else:
+        date_str = 'Только что'
+    
+    message = f"""🔔 <b>НОВЫЙ ЗАКАЗ #{order_id_short}</b>\n\n⏰ {date_str}\n\n━━━━━━━━━━━━━━━━━━\n\n👤 <b>{order_data.get('customer_name', 'Клиент')}</b>\n📞 <code>{order_data.get('customer_phone', 'Не указан')}</code>\n📍 {order_data.get('delivery_address', 'Адрес не указан')}\n\n━━━━━━━━━━━━━━━━━━\n\n🛍 <b>Товары ({total_items} шт):</b>\n\n{items_text}━━━━━━━━━━━━━━━━━━\n\n{payment_method}\n\n💰 <b>ИТОГО: {order_data['total']:,} сум</b>\n"""
+    
+    if order_data.get('payment_receipt_url'):
+        message += f"\n📸 <a href=\"{order_data['payment_receipt_url']}\">Чек оплаты</a>"
+    
+    if site_url:
+        admin_url = f"{site_url.rstrip('/')}/admin/orders"
+        message += f"\n\n🔗 <a href=\"{admin_url}\">Открыть в админ-панели</a>"
+    return message
+
 def send_telegram_notification(order_data, order_items, site_url=None):
     """Send order notification to Telegram admin"""
     try:
-        order_id = str(order_data.get('id', 'unknown'))
-        order_id_short = order_id[:6]
-        
-        tg_config = get_telegram_config()
-        if not tg_config.get('notifications_enabled'):
-            return False
-        
-        bot_token = tg_config.get('bot_token')
-        admin_chat_id = tg_config.get('admin_chat_id')
-        
-        if not bot_token or not admin_chat_id:
+        if not get_telegram_config().get('notifications_enabled'):
             return False
-        
-        # Count items and format
-        total_items = sum(item['quantity'] for item in order_items)
-        items_text = ""
-        for item in order_items:
-            item_total = item['price'] * item['quantity']
-            items_text += f"• {item['name']}"
-            if item.get('selected_color'):
-                items_text += f" ({item['selected_color']})"
-            items_text += f"\n  {item['quantity']} шт × {item['price']:,} = <b>{item_total:,}</b> сум\n"
-        
-        payment_labels = {
-            'click': '💳 Click',
-            'payme': '💳 Payme',
-            'uzum': '💳 Uzum Bank',
-            'card_transfer': '💵 Перевод на карту'
-        }
-        payment_method = payment_labels.get(order_data.get('payment_method'), order_data.get('payment_method', 'Не указан'))
-        
-        created_at = order_data.get('created_at')
-        if created_at:
-            try:
-                if isinstance(created_at, str):
-                    dt = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-                else:
-                    dt = created_at
-                date_str = dt.strftime('%d.%m.%Y %H:%M')
-            except:
-                date_str = 'Только что'
-        else:
-            date_str = 'Только что'
-        
-        message = f"""🔔 <b>НОВЫЙ ЗАКАЗ #{order_id_short}</b>\n\n⏰ {date_str}\n\n━━━━━━━━━━━━━━━━━━\n\n👤 <b>{order_data.get('customer_name', 'Клиент')}</b>\n📞 <code>{order_data.get('customer_phone', 'Не указан')}</code>\n📍 {order_data.get('delivery_address', 'Адрес не указан')}\n\n━━━━━━━━━━━━━━━━━━\n\n🛍 <b>Товары ({total_items} шт):</b>\n\n{items_text}━━━━━━━━━━━━━━━━━━\n\n{payment_method}\n\n💰 <b>ИТОГО: {order_data['total']:,} сум</b>\n"""
-        
-        if order_data.get('payment_receipt_url'):
-            message += f"\n📸 <a href=\"{order_data['payment_receipt_url']}\">Чек оплаты</a>"
-        
-        if site_url:
-            admin_url = f"{site_url.rstrip('/')}/admin/orders"
-            message += f"\n\n🔗 <a href=\"{admin_url}\">Открыть в админ-панели</a>"
-        
-        url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-        payload = {
-            'chat_id': admin_chat_id,
-            'text': message,
-            'parse_mode': 'HTML',
-            'disable_web_page_preview': True
-        }
-        
-        response = requests.post(url, json=payload, timeout=10)
-        return response.status_code == 200
-            
+        success, error = send_telegram_message(format_order_notification(order_data, order_items, site_url), parse_mode='HTML')
+        if not success and error != TELEGRAM_NOT_CONFIGURED:
+            print(f"❌ Error sending Telegram notification: {error}")
+        return success
     except Exception as e:
         print(f"❌ Error sending Telegram notification: {str(e)}")
         return False
@@ -0,0 +1,377 @@
+"""
+Autocomplete for the search box.
+
+Every process keeps a prefix index over product names, category names and
+popular search queries: one sorted array of normalized keys searched with
+bisect. Each word start of a name gets its own key, so "пла" finds
+"Летнее платье". Matches are ranked by popularity (units ordered for
+products, product count for categories, hits for queries).
+
+Catalog and category invalidation messages only mark ids as dirty; the
+next lookup reloads just those rows and patches the index. The index is
+rebuilt from scratch when a message carries no key, when it expires (see
+invalidation.cache_ttl) and every SUGGEST_QUERIES_REFRESH seconds for
+search_queries, which has no invalidation messages.
+
+Searches are counted in memory (count_query) and written to search_queries
+in one batch by refresh() every SUGGEST_QUERIES_FLUSH seconds, so the search
+endpoint itself never writes. Counts not yet flushed are lost on restart.
+"""
+import os
+import re
+import time
+import heapq
+import threading
+from bisect import bisect_left, insort
+
+from . import invalidation
+
+SUGGEST_INDEX_TTL = float(os.getenv('SUGGEST_INDEX_TTL', '60'))
+SUGGEST_INDEX_LONG_TTL = float(os.getenv('SUGGEST_INDEX_LONG_TTL', '3600'))
+SUGGEST_QUERIES_REFRESH = float(os.getenv('SUGGEST_QUERIES_REFRESH', '300'))
+SUGGEST_MIN_QUERY_HITS = int(os.getenv('SUGGEST_MIN_QUERY_HITS', '3'))
+SUGGEST_QUERIES_FLUSH = float(os.getenv('SUGGEST_QUERIES_FLUSH', '60'))
+SUGGEST_MAX_QUERIES = 1000
+MAX_PENDING_QUERIES = 1000
+MAX_SUGGESTIONS = 20
+MAX_PATCH_ROWS = 100
+MAX_QUERY_LENGTH = 100
+
+PRODUCT = 'product'
+CATEGORY = 'category'
+QUERY = 'query'
+
+_WORD_RE = re.compile(r'\w+')
+_SPACE_RE = re.compile(r'\s+')
+_KEY_END = '\U0010ffff'
+
+
+def normalize_query(text):
+    """Lowercase, ё -> е, single spaces; the form stored in search_queries."""
+    text = _SPACE_RE.sub(' ', (text or '').lower().replace('ё', 'е')).strip()
+    return text[:MAX_QUERY_LENGTH]
+
+
+def _keys_for(text):
+    """One (key, word position) per word start: 'летнее платье' -> ('летнее платье', 0), ('платье', 1)."""
+    text = normalize_query(text)
+    return [(text[m.start():], position) for position, m in enumerate(_WORD_RE.finditer(text))]
+
+
+class PrefixIndex:
+    """
+    Sorted (key, kind, ref, word position) tuples plus
+    {(kind, ref): (text, weight, payload)}.
+    Writers build new arrays and swap them in as one snapshot under a lock,
+    so lookups never need one. Answers for broad prefixes (more than
+    MEMO_MIN_MATCHES keys, e.g. one or two letters) are memoized per snapshot.
+    """
+    MEMO_MIN_MATCHES = 200
+    MEMO_MAX_ENTRIES = 4096
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = ((), {}, {})
+
+    def __len__(self):
+        return len(self._snapshot[1])
+
+    def _swap(self, keys, entries):
+        self._snapshot = (tuple(keys), entries, {})
+
+    def replace(self, entries):
+        """entries: iterable of (kind, ref, text, weight, payload)."""
+        keys, by_ref = [], {}
+        for kind, ref, text, weight, payload in entries:
+            by_ref[(kind, ref)] = (text, weight, payload)
+            keys.extend((key, kind, ref, position) for key, position in _keys_for(text))
+        keys.sort()
+        with self._lock:
+            self._swap(keys, by_ref)
+
+    def replace_kind(self, kind, entries):
+        """Swap every entry of one kind, keeping the others."""
+        with self._lock:
+            keep = [(k, r, *v) for (k, r), v in self._snapshot[1].items() if k != kind]
+        self.replace(keep + [(kind, *entry) for entry in entries])
+
+    def upsert(self, kind, ref, text=None, weight=0, payload=None):
+        """Insert or update one entry; text=None removes it."""
+        with self._lock:
+            keys, entries, _ = self._snapshot
+            if (kind, ref) in entries:
+                keys = [k for k in keys if not (k[1] == kind and k[2] == ref)]
+            else:
+                keys = list(keys)
+            entries = dict(entries)
+            entries.pop((kind, ref), None)
+            if text:
+                entries[(kind, ref)] = (text, weight, payload)
+                for key, position in _keys_for(text):
+                    insort(keys, (key, kind, ref, position))
+            self._swap(keys, entries)
+
+    def lookup(self, prefix, limit=10, kinds=None):
+        """[(kind, ref, text, weight, payload)] whose text has a word starting with prefix."""
+        prefix = normalize_query(prefix)
+        if not prefix:
+            return []
+        keys, entries, memo = self._snapshot
+        memo_key = (prefix, limit, kinds)
+        if memo_key in memo:
+            return memo[memo_key]
+        start = bisect_left(keys, (prefix,))
+        end = bisect_left(keys, (prefix + _KEY_END,), start)
+        # One match per entry, at its earliest word
+        matches = {}
+        for key, kind, ref, position in keys[start:end]:
+            if kinds and kind not in kinds:
+                continue
+            if position < matches.get((kind, ref), position + 1):
+                matches[(kind, ref)] = position
+        best = heapq.nsmallest(limit, matches.items(), key=lambda item: (
+            -entries[item[0]][1], item[1], entries[item[0]][0]))
+        result = [(kind, ref, *entries[(kind, ref)]) for (kind, ref), _ in best]
+        if end - start > self.MEMO_MIN_MATCHES and len(memo) < self.MEMO_MAX_ENTRIES:
+            memo[memo_key] = result
+        return result
+
+
+_index = PrefixIndex()
+_state = {
+    'built_at': None,
+    'expires_at': 0.0,
+    'queries_loaded_at': 0.0,
+    'rebuild': True,
+    'builds': 0,
+    'patches': 0,
+    'queries_flushed_at': 0.0,
+    'query_flushes': 0,
+    'dropped_query_hits': 0,
+}
+_dirty = {PRODUCT: set(), CATEGORY: set()}
+_build_lock = threading.Lock()
+# Search hits not written yet: {query: hits}, for any query (True) and for
+# queries that only count when already known (False)
+_pending_queries = {True: {}, False: {}}
+_pending_lock = threading.Lock()
+
+
+def _on_catalog_message(key):
+    if key is None:
+        _state['rebuild'] = True
+    else:
+        _dirty[PRODUCT].add(key)
+
+
+def _on_category_message(key):
+    if key is None:
+        _state['rebuild'] = True
+    else:
+        _dirty[CATEGORY].add(key)
+
+invalidation.subscribe(invalidation.CATALOG, _on_catalog_message)
+invalidation.subscribe(invalidation.CATEGORIES, _on_category_message)
+
+
+_PRODUCTS_SQL = '''
+    SELECT p.id, p.name, p.price, p.images[1] AS image, p.category_id,
+           coalesce(s.units, 0) AS popularity
+    FROM products p
+    LEFT JOIN (
+        SELECT product_id, SUM(quantity) AS units FROM order_items
+        WHERE product_id IS NOT NULL GROUP BY product_id
+    ) s ON s.product_id = p.id
+    {where}
+'''
+
+_CATEGORIES_SQL = '''
+    SELECT c.id, c.name, c.icon, count(p.id) AS popularity
+    FROM categories c LEFT JOIN products p ON p.category_id = c.id
+    {where}
+    GROUP BY c.id
+'''
+
+
+def _product_entry(row):
+    payload = {'id': row['id'], 'name': row['name'], 'price': row['price'],
+               'image': row['image'], 'category_id': row['category_id']}
+    return row['id'], row['name'], int(row['popularity']), payload
+
+
+def _category_entry(row):
+    payload = {'id': row['id'], 'name': row['name'], 'icon': row['icon']}
+    return row['id'], row['name'], int(row['popularity']), payload
+
+
+def _load_queries(cur):
+    cur.execute('''
+        SELECT query, hits FROM search_queries WHERE hits >= %s
+        ORDER BY hits DESC LIMIT %s
+    ''', (SUGGEST_MIN_QUERY_HITS, SUGGEST_MAX_QUERIES))
+    return [(row['query'], row['query'], row['hits'], None) for row in cur.fetchall()]
+
+
+def _rebuild(cur):
+    # Taken before reading so messages arriving meanwhile are not lost
+    _state['rebuild'] = False
+    for ids in _dirty.values():
+        ids.clear()
+    cur.execute(_PRODUCTS_SQL.format(where=''))
+    products = [_product_entry(row) for row in cur.fetchall()]
+    cur.execute(_CATEGORIES_SQL.format(where=''))
+    categories = [_category_entry(row) for row in cur.fetchall()]
+    queries = _load_queries(cur)
+    _index.replace(
+        [(PRODUCT, *entry) for entry in products]
+        + [(CATEGORY, *entry) for entry in categories]
+        + [(QUERY, *entry) for entry in queries]
+    )
+    now = time.monotonic()
+    _state['built_at'] = time.time()
+    _state['expires_at'] = now + invalidation.cache_ttl(SUGGEST_INDEX_TTL, SUGGEST_INDEX_LONG_TTL)
+    _state['queries_loaded_at'] = now
+    _state['builds'] += 1
+
+
+def _patch(cur, kind, sql, alias, to_entry):
+    ids = list(_dirty[kind])
+    _dirty[kind].difference_update(ids)
+    cur.execute(sql.format(where=f'WHERE {alias}.id = ANY(%s)'), (ids,))
+    found = {}
+    for row in cur.fetchall():
+        ref, text, weight, payload = to_entry(row)
+        found[ref] = (text, weight, payload)
+    for ref in ids:
+        # Deleted rows are not found and drop out of the index
+        _index.upsert(kind, ref, *found.get(ref, (None,)))
+    _state['patches'] += len(ids)
+
+
+def _flush_due(now):
+    return bool((_pending_queries[True] or _pending_queries[False])
+                and now - _state['queries_flushed_at'] >= SUGGEST_QUERIES_FLUSH)
+
+
+def needs_refresh():
+    """True when refresh() has work to do (so callers can skip borrowing a connection)."""
+    now = time.monotonic()
+    return bool(_state['rebuild'] or now >= _state['expires_at'] or _dirty[PRODUCT] or _dirty[CATEGORY]
+                or now - _state['queries_loaded_at'] >= SUGGEST_QUERIES_REFRESH or _flush_due(now))
+
+
+def is_built():
+    return _state['built_at'] is not None
+
+
+def refresh(cur):
+    """
+    Bring the index up to date and write the counted searches when due
+    (commits the connection of `cur` then); a no-op when nothing changed.
+    """
+    if not needs_refresh():
+        return
+    with _build_lock:
+        now = time.monotonic()
+        if _flush_due(now):
+            _flush_queries(cur)
+        try:
+            # Each patched row copies the arrays, so big batches rebuild instead
+            if (_state['rebuild'] or now >= _state['expires_at']
+                    or len(_dirty[PRODUCT]) + len(_dirty[CATEGORY]) > MAX_PATCH_ROWS):
+                _rebuild(cur)
+                return
+            if _dirty[PRODUCT]:
+                _patch(cur, PRODUCT, _PRODUCTS_SQL, 'p', _product_entry)
+            if _dirty[CATEGORY]:
+                _patch(cur, CATEGORY, _CATEGORIES_SQL, 'c', _category_entry)
+            if now - _state['queries_loaded_at'] >= SUGGEST_QUERIES_REFRESH:
+                _index.replace_kind(QUERY, _load_queries(cur))
+                _state['queries_loaded_at'] = now
+        except Exception:
+            # Dirty ids were already taken; start over on the next call
+            _state['rebuild'] = True
+            raise
+
+
+def suggest(prefix, limit=10, kinds=None):
+    """
+    Ranked suggestions for a prefix from the in-process index (call refresh()
+    first). kinds is a tuple of PRODUCT/CATEGORY/QUERY or None for all.
+    Returns [{type, text, ...payload}].
+    """
+    limit = max(1, min(limit, MAX_SUGGESTIONS))
+    results, seen = [], set()
+    for kind, ref, text, weight, payload in _index.lookup(prefix, limit, kinds):
+        # A popular query that is just a product or category name adds nothing
+        if normalize_query(text) in seen:
+            continue
+        seen.add(normalize_query(text))
+        item = {'type': kind, 'text': text}
+        if payload:
+            item.update(payload)
+        results.append(item)
+    return results
+
+
+def count_query(q, new=True):
+    """
+    Count a search that returned results, so it can be suggested later.
+    new=False only counts a query that is already known. In memory only;
+    refresh() writes the counts.
+    """
+    q = normalize_query(q)
+    if len(q) < 2:
+        return
+    with _pending_lock:
+        pending = _pending_queries[new]
+        if q not in pending and len(_pending_queries[True]) + len(_pending_queries[False]) >= MAX_PENDING_QUERIES:
+            _state['dropped_query_hits'] += 1
+            return
+        pending[q] = pending.get(q, 0) + 1
+
+
+def _flush_queries(cur):
+    """Write the counted searches in two statements and commit."""
+    with _pending_lock:
+        new, known = _pending_queries[True], _pending_queries[False]
+        _pending_queries[True], _pending_queries[False] = {}, {}
+    _state['queries_flushed_at'] = time.monotonic()
+    try:
+        if new:
+            cur.execute('''
+                INSERT INTO search_queries (query, hits)
+                SELECT * FROM unnest(%s::varchar[], %s::int[])
+                ON CONFLICT (query) DO UPDATE SET
+                    hits = search_queries.hits + EXCLUDED.hits,
+                    last_searched_at = CURRENT_TIMESTAMP
+            ''', (list(new), list(new.values())))
+        if known:
+            cur.execute('''
+                UPDATE search_queries s SET hits = s.hits + v.hits, last_searched_at = CURRENT_TIMESTAMP
+                FROM unnest(%s::varchar[], %s::int[]) AS v(query, hits)
+                WHERE s.query = v.query
+            ''', (list(known), list(known.values())))
+        cur.connection.commit()
+    except Exception as e:
+        cur.connection.rollback()
+        # Keep the counts for the next flush
+        with _pending_lock:
+            for flag, hits in ((True, new), (False, known)):
+                pending = _pending_queries[flag]
+                for q, n in hits.items():
+                    pending[q] = pending.get(q, 0) + n
+        print(f"⚠️ Could not record search queries: {e}")
+        return
+    _state['query_flushes'] += 1
+
+
+def get_suggest_stats():
+    return {
+        **_state,
+        'entries': len(_index),
+        'dirty_products': len(_dirty[PRODUCT]),
+        'dirty_categories': len(_dirty[CATEGORY]),
+        'pending_queries': len(_pending_queries[True]) + len(_pending_queries[False]),
+        'expires_in': round(max(0.0, _state['expires_at'] - time.monotonic()), 1),
+    }
@@ -0,0 +1,166 @@
+"""
+Conditional GET for public catalog endpoints.
+
+@catalog_cached derives a strong ETag from the catalog version (plus any
+extra validators the endpoint passes), answers a matching If-None-Match with
+304 before the view runs and sets Cache-Control on the response. With the
+invalidation listener connected a 304 costs no database round trip.
+
+With cache_body=True the serialized 200 body is also kept per ETag, path and
+query string, together with its gzip and brotli encodings (each built the
+first time a client asks for it), so a repeated request is a dictionary
+lookup. Encoded responses get their own ETag suffix (-gzip / -br) as
+required for strong validators. The whole store is dropped when the catalog
+version moves on or it grows past RESPONSE_CACHE_MAX_BYTES.
+"""
+import os
+import gzip
+import threading
+from functools import wraps
+
+from flask import request, make_response, Response
+
+from ..catalog_version import get_catalog_version
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+CATALOG_CACHE_MAX_AGE = int(os.getenv('CATALOG_CACHE_MAX_AGE', '0'))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+# Smaller bodies are not worth compressing
+MIN_COMPRESS_SIZE = 1024
+
+_ENCODERS = {
+    'gzip': lambda body: gzip.compress(body, compresslevel=6),
+}
+if brotli is not None:
+    _ENCODERS['br'] = lambda body: brotli.compress(body, quality=5)
+_ETAG_SUFFIXES = {'gzip': '-gzip', 'br': '-br'}
+
+_body_cache = {'version': None, 'entries': {}, 'bytes': 0}
+_body_cache_lock = threading.Lock()
+_body_cache_stats = {'hits': 0, 'misses': 0, 'encodes': 0, 'evictions': 0}
+
+
+def _apply_cache_headers(response, etag):
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = CATALOG_CACHE_MAX_AGE
+    response.cache_control.must_revalidate = True
+    return response
+
+
+def _preferred_encoding(body):
+    if len(body) < MIN_COMPRESS_SIZE:
+        return None
+    accepted = request.accept_encodings
+    for encoding in ('br', 'gzip'):
+        if encoding in _ENCODERS and accepted[encoding]:
+            return encoding
+    return None
+
+
+def _cached_entry(version, key):
+    if _body_cache['version'] != version:
+        return None
+    return _body_cache['entries'].get(key)
+
+
+def _store_entry(version, key, entry, size):
+    with _body_cache_lock:
+        # Versions only grow; a slow request must not evict newer bodies
+        if _body_cache['version'] is None or version > _body_cache['version']:
+            _body_cache.update(version=version, entries={}, bytes=0)
+        if version != _body_cache['version']:
+            return
+        if _body_cache['bytes'] + size > RESPONSE_CACHE_MAX_BYTES:
+            _body_cache.update(entries={}, bytes=0)
+            _body_cache_stats['evictions'] += 1
+        _body_cache['entries'][key] = entry
+        _body_cache['bytes'] += size
+
+
+def _serve_body(version, key, entry, etag):
+    """Response for a cached entry: {'mimetype', 'identity', <encoding>: bytes}."""
+    encoding = _preferred_encoding(entry['identity'])
+    if encoding is None:
+        body = entry['identity']
+    else:
+        body = entry.get(encoding)
+        if body is None:
+            body = _ENCODERS[encoding](entry['identity'])
+            _body_cache_stats['encodes'] += 1
+            _store_entry(version, key, {**entry, encoding: body}, len(body))
+        etag += _ETAG_SUFFIXES[encoding]
+    response = Response(body, mimetype=entry['mimetype'])
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return _apply_cache_headers(response, etag)
+
+
+def _matching_etag(etag):
+    """The variant of etag (plain or encoded) the client already has, if any."""
+    for suffix in ('', *_ETAG_SUFFIXES.values()):
+        if request.if_none_match.contains(etag + suffix):
+            return etag + suffix
+    return None
+
+
+def catalog_cached(extra_validator=None, cache_body=False):
+    """
+    extra_validator() -> str lets an endpoint add inputs that are not part of
+    the catalog version (e.g. the mtime of config/settings.json).
+    cache_body=True keeps the serialized 200 responses (see module docstring);
+    only for views whose body depends on nothing but the URL and the catalog.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                version = get_catalog_version()
+            except Exception as e:
+                print(f"⚠️ Catalog version unavailable, serving without ETag: {e}")
+                return view(*args, **kwargs)
+            etag = f'c{version}'
+            if extra_validator is not None:
+                etag += f'-{extra_validator()}'
+
+            matched = _matching_etag(etag)
+            if matched:
+                response = make_response('', 304)
+                response.vary.add('Accept-Encoding')
+                return _apply_cache_headers(response, matched)
+
+            key = None
+            if cache_body:
+                key = (etag, request.path, tuple(sorted(request.args.items(multi=True))))
+                entry = _cached_entry(version, key)
+                if entry is not None:
+                    _body_cache_stats['hits'] += 1
+                    return _serve_body(version, key, entry, etag)
+                _body_cache_stats['misses'] += 1
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            if key is not None and not response.is_streamed and 'Content-Encoding' not in response.headers:
+                entry = {'mimetype': response.mimetype, 'identity': response.get_data()}
+                _store_entry(version, key, entry, len(entry['identity']))
+                return _serve_body(version, key, entry, etag)
+            return _apply_cache_headers(response, etag)
+        return wrapper
+    return decorator
+
+
+def get_response_cache_stats():
+    return {
+        **_body_cache_stats,
+        'version': _body_cache['version'],
+        'entries': len(_body_cache['entries']),
+        'bytes': _body_cache['bytes'],
+        'max_bytes': RESPONSE_CACHE_MAX_BYTES,
+        'encodings': ['identity', *_ENCODERS],
+    }
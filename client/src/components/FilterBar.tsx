@@ -18,6 +18,7 @@ interface Product {
 
 interface FilterBarProps {
   categories?: { id: string; name: string; icon?: string }[];
+  categoryCounts?: Record<string, number>;
   selectedCategory?: string;
   selectedSort?: string;
   priceFrom?: string;
@@ -39,10 +40,12 @@ const sortOptions = [
   { id: "price-asc", label: "Дешевые" },
   { id: "price-desc", label: "Дорогие" },
   { id: "old", label: "Старые" },
+  { id: "name", label: "По названию" },
 ];
 
 export default function FilterBar({
   categories = [],
+  categoryCounts,
   selectedCategory = "all",
   selectedSort = "new",
   priceFrom = "",
@@ -99,6 +102,9 @@ export default function FilterBar({
               >
                 {cat.icon && <span>{cat.icon}</span>}
                 <span>{cat.name}</span>
+                {categoryCounts && (
+                  <span className="opacity-60">{categoryCounts[cat.id] ?? 0}</span>
+                )}
               </Button>
             ))}
 
@@ -47,6 +47,7 @@ export default function ProfileDropdown() {
 	const { config } = useConfig()
 	const { toast } = useToast()
 	const [orders, setOrders] = useState<Order[]>([])
+	const [ordersTotal, setOrdersTotal] = useState(0)
 	const [loadingOrders, setLoadingOrders] = useState(false)
 	const [isEditing, setIsEditing] = useState(false)
 	const [isSaving, setIsSaving] = useState(false)
@@ -83,12 +84,13 @@ export default function ProfileDropdown() {
 
 		setLoadingOrders(true)
 		try {
-			const response = await fetch('/api/orders', {
+			const response = await fetch('/api/orders?limit=3&include_total=1', {
 				credentials: 'include',
 			})
 			if (response.ok) {
 				const data = await response.json()
-				setOrders(data)
+				setOrders(data.items)
+				setOrdersTotal(data.total ?? data.items.length)
 			}
 		} catch (error) {
 			console.error('Error loading orders:', error)
@@ -423,7 +425,7 @@ export default function ProfileDropdown() {
 								onClick={() => navigate('/orders')}
 							>
 								<ExternalLink className='h-3 w-3 mr-2' />
-								Все заказы ({orders.length})
+								Все заказы ({ordersTotal})
 							</Button>
 						)}
 					</TabsContent>
@@ -1,5 +1,6 @@
 import { useConfig } from '@/hooks/useConfig'
 import { optimizeProductThumbnail } from '@/lib/imageOptimizer'
+import { keepPreviousData, useQuery } from '@tanstack/react-query'
 import { Loader2, Search, X } from 'lucide-react'
 import { useEffect, useMemo, useRef, useState } from 'react'
 
@@ -10,6 +11,17 @@ interface Product {
 	images: string[]
 }
 
+interface SuggestResponse {
+	query: string
+	suggestions: {
+		type: 'product'
+		id: string
+		name: string
+		price: number
+		image: string | null
+	}[]
+}
+
 interface SearchWithSuggestionsProps {
 	products: Product[]
 	searchQuery: string
@@ -31,14 +43,35 @@ export default function SearchWithSuggestions({
 	const inputRef = useRef<HTMLInputElement>(null)
 	const containerRef = useRef<HTMLDivElement>(null)
 
-	const suggestions = useMemo(() => {
-		if (!searchQuery.trim() || searchQuery.length < 2) return []
+	const prefix = searchQuery.trim()
+	// Answered from the server's in-memory prefix index on every keystroke
+	const { data: suggestData, isError: suggestFailed } = useQuery<SuggestResponse>({
+		queryKey: [
+			`/api/search/suggest?types=product&limit=5&q=${encodeURIComponent(prefix)}`,
+		],
+		enabled: prefix.length >= 2,
+		staleTime: 1000 * 30,
+		placeholderData: keepPreviousData,
+	})
+
+	const suggestions = useMemo<Product[]>(() => {
+		if (prefix.length < 2) return []
+
+		if (suggestData && !suggestFailed) {
+			return suggestData.suggestions.map(item => ({
+				id: item.id,
+				name: item.name,
+				price: item.price,
+				images: item.image ? [item.image] : [],
+			}))
+		}
 
-		const query = searchQuery.toLowerCase()
+		// Fall back to the products already on the page
+		const query = prefix.toLowerCase()
 		return products
 			.filter(product => (product.name?.toLowerCase() ?? '').includes(query))
 			.slice(0, 5)
-	}, [products, searchQuery])
+	}, [products, prefix, suggestData, suggestFailed])
 
 	const shouldShowDropdown = isOpen && searchQuery.length >= 2
 
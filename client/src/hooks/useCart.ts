@@ -1,6 +1,7 @@
 import { useAuth } from '@/contexts/AuthContext'
 import { apiRequest, queryClient } from '@/lib/queryClient'
 import { useMutation, useQuery } from '@tanstack/react-query'
+import { useRef } from 'react'
 
 interface CartItem {
 	id: string
@@ -14,6 +15,27 @@ interface CartItem {
 	selected_attributes?: Record<string, string>
 }
 
+type CartOperation =
+	| {
+			op: 'add'
+			product_id: string
+			quantity: number
+			selected_color?: string
+			selected_attributes?: Record<string, string>
+	  }
+	| { op: 'set'; cart_id: string; quantity: number }
+	| { op: 'remove'; cart_id: string }
+
+interface CartBatchResult {
+	items: CartItem[]
+	// Adds skipped because the product or selection is no longer offered
+	rejected: { index: number; error: string }[]
+}
+
+// Quantity taps within this window go to the server as one batch
+const CART_BATCH_DELAY_MS = 300
+const CART_BATCH_KEY = ['/api/cart/batch']
+
 // Helper function to compare attributes - exported for use in other components
 export const attributesMatch = (
 	a?: Record<string, string>,
@@ -120,89 +142,113 @@ export function useCart() {
 		},
 	})
 
-	// Update quantity mutation with optimistic update
-	const updateQuantity = useMutation({
-		mutationFn: async ({
-			cartId,
-			productId,
-			quantity,
-		}: {
-			cartId?: string
-			productId?: string
-			quantity: number
-		}) => {
+	const pendingOperations = useRef<CartOperation[]>([])
+	const flushTimer = useRef<ReturnType<typeof setTimeout>>()
+
+	// Applies a list of operations in one request; the response is the new cart
+	const batchMutation = useMutation({
+		mutationKey: CART_BATCH_KEY,
+		// Batches run one after another, in the order they were sent
+		scope: { id: 'cart-batch' },
+		mutationFn: async (
+			operations: CartOperation[]
+		): Promise<CartBatchResult> => {
 			if (!userId) throw new Error('User not authenticated')
-			return apiRequest('/api/cart', {
-				method: 'PUT',
-				body: JSON.stringify({
-					cart_id: cartId,
-					user_id: userId,
-					product_id: productId,
-					quantity,
-				}),
+			const response = await apiRequest(`/api/cart/${userId}/batch`, {
+				method: 'PATCH',
+				body: JSON.stringify({ operations }),
 			})
+			return response.json()
 		},
-		onMutate: async ({ productId, quantity }) => {
-			await queryClient.cancelQueries({ queryKey: ['/api/cart', userId] })
-			const previousCart = queryClient.getQueryData<CartItem[]>([
-				'/api/cart',
-				userId,
-			])
-
-			queryClient.setQueryData<CartItem[]>(
-				['/api/cart', userId],
-				(old = []) => {
-					return old.map(item =>
-						item.id === productId ? { ...item, quantity } : item
-					)
-				}
-			)
-
-			return { previousCart }
-		},
-		onError: (_err, _vars, context) => {
-			if (context?.previousCart) {
-				queryClient.setQueryData(['/api/cart', userId], context.previousCart)
+		onSuccess: ({ items }) => {
+			// Newer edits are still queued or in flight; their optimistic state stays until they land
+			if (
+				pendingOperations.current.length === 0 &&
+				queryClient.isMutating({ mutationKey: CART_BATCH_KEY }) <= 1
+			) {
+				queryClient.setQueryData(['/api/cart', userId], items)
 			}
 		},
-		onSettled: () => {
+		onError: () => {
 			queryClient.invalidateQueries({ queryKey: ['/api/cart', userId] })
 		},
 	})
 
-	// Remove from cart mutation with optimistic update
-	const removeFromCart = useMutation({
-		mutationFn: async (cartId: string) => {
-			if (!userId) throw new Error('User not authenticated')
-			return apiRequest(`/api/cart/${cartId}`, {
-				method: 'DELETE',
-			})
-		},
-		onMutate: async (cartId: string) => {
-			await queryClient.cancelQueries({ queryKey: ['/api/cart', userId] })
-			const previousCart = queryClient.getQueryData<CartItem[]>([
-				'/api/cart',
-				userId,
-			])
+	const flushOperations = () => {
+		clearTimeout(flushTimer.current)
+		const operations = pendingOperations.current
+		pendingOperations.current = []
+		if (operations.length > 0) batchMutation.mutate(operations)
+	}
 
-			queryClient.setQueryData<CartItem[]>(
-				['/api/cart', userId],
-				(old = []) => {
-					return old.filter(item => item.cart_id !== cartId)
-				}
+	// Later edits of the same line replace earlier ones
+	const queueOperation = (operation: CartOperation) => {
+		if (operation.op !== 'add') {
+			pendingOperations.current = pendingOperations.current.filter(
+				queued => queued.op === 'add' || queued.cart_id !== operation.cart_id
 			)
+		}
+		pendingOperations.current.push(operation)
+		clearTimeout(flushTimer.current)
+		flushTimer.current = setTimeout(flushOperations, CART_BATCH_DELAY_MS)
+	}
 
-			return { previousCart }
-		},
-		onError: (_err, _productId, context) => {
-			if (context?.previousCart) {
-				queryClient.setQueryData(['/api/cart', userId], context.previousCart)
-			}
-		},
-		onSettled: () => {
-			queryClient.invalidateQueries({ queryKey: ['/api/cart', userId] })
-		},
-	})
+	// Update quantity: optimistic, sent with the next batch
+	const updateQuantity = ({
+		cartId,
+		productId,
+		quantity,
+	}: {
+		cartId?: string
+		productId?: string
+		quantity: number
+	}) => {
+		if (!userId || !cartId) return
+		queryClient.setQueryData<CartItem[]>(['/api/cart', userId], (old = []) =>
+			quantity > 0
+				? old.map(item =>
+						item.cart_id === cartId || (!item.cart_id && item.id === productId)
+							? { ...item, quantity }
+							: item
+				  )
+				: old.filter(item => item.cart_id !== cartId)
+		)
+		queueOperation({ op: 'set', cart_id: cartId, quantity })
+	}
+
+	// Remove from cart: optimistic, sent with the next batch
+	const removeFromCart = (cartId: string) => {
+		if (!userId) return
+		queryClient.setQueryData<CartItem[]>(['/api/cart', userId], (old = []) =>
+			old.filter(item => item.cart_id !== cartId)
+		)
+		queueOperation({ op: 'remove', cart_id: cartId })
+	}
+
+	// Several lines at once (e.g. repeating an order), in one request.
+	// Resolves to the indexes of the items the server did not add.
+	const addItemsToCart = async (
+		items: {
+			productId: string
+			quantity: number
+			selectedColor?: string
+			selectedAttributes?: Record<string, string>
+		}[]
+	): Promise<number[]> => {
+		if (!userId || items.length === 0) return []
+		// Queued edits go first so the batches keep their order
+		flushOperations()
+		const { rejected } = await batchMutation.mutateAsync(
+			items.map(item => ({
+				op: 'add' as const,
+				product_id: item.productId,
+				quantity: item.quantity,
+				selected_color: item.selectedColor,
+				selected_attributes: item.selectedAttributes,
+			}))
+		)
+		return rejected.map(({ index }) => index)
+	}
 
 	// Clear cart mutation with optimistic update
 	const clearCartMutation = useMutation({
@@ -213,6 +259,9 @@ export function useCart() {
 			})
 		},
 		onMutate: async () => {
+			// Queued edits would only touch lines that are about to go
+			clearTimeout(flushTimer.current)
+			pendingOperations.current = []
 			await queryClient.cancelQueries({ queryKey: ['/api/cart', userId] })
 			const previousCart = queryClient.getQueryData<CartItem[]>([
 				'/api/cart',
@@ -241,12 +290,13 @@ export function useCart() {
 			selectedColor?: string,
 			selectedAttributes?: Record<string, string>
 		) => addToCart.mutate({ productId, selectedColor, selectedAttributes }),
-		updateQuantity: updateQuantity.mutate,
-		removeFromCart: removeFromCart.mutate,
+		addItemsToCart,
+		updateQuantity,
+		removeFromCart,
 		clearCart: clearCartMutation.mutate,
 		clearCartAsync: clearCartMutation.mutateAsync,
 		isAddingToCart: addToCart.isPending,
-		isUpdating: updateQuantity.isPending,
-		isRemoving: removeFromCart.isPending,
+		isUpdating: batchMutation.isPending,
+		isRemoving: batchMutation.isPending,
 	}
 }
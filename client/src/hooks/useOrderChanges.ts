@@ -0,0 +1,63 @@
+import { useEffect, useRef } from 'react'
+
+const WAIT_SECONDS = 25
+const RETRY_DELAY = 5000
+
+interface OrderChanges<T> {
+	items: T[]
+	cursor: string
+	has_more: boolean
+	retry_after?: number
+}
+
+/**
+ * Long-polls an order change feed (/api/orders/changes or
+ * /api/admin/orders/changes) while the component is mounted and hands every
+ * batch of created or changed orders to onChanges, oldest change first.
+ * The starting cursor lags the settle window of the feed, so a list loaded
+ * alongside it misses no change (a few may arrive twice). When the server
+ * has too many requests waiting it answers at once with retry_after, and
+ * the next poll is delayed by that many seconds.
+ */
+export function useOrderChanges<T>(
+	url: string,
+	onChanges: (items: T[]) => void
+) {
+	const handler = useRef(onChanges)
+	handler.current = onChanges
+
+	useEffect(() => {
+		const controller = new AbortController()
+		const { signal } = controller
+
+		const poll = async () => {
+			let cursor: string | null = null
+			while (!signal.aborted) {
+				try {
+					const response = await fetch(
+						cursor
+							? `${url}?since=${encodeURIComponent(cursor)}&wait=${WAIT_SECONDS}`
+							: url,
+						{ signal }
+					)
+					if (!response.ok) throw new Error(`HTTP ${response.status}`)
+					const data: OrderChanges<T> = await response.json()
+					if (data.items.length > 0) handler.current(data.items)
+					cursor = data.cursor
+					if (data.retry_after && !data.has_more) {
+						await new Promise(resolve =>
+							setTimeout(resolve, data.retry_after! * 1000)
+						)
+					}
+				} catch (error) {
+					if (signal.aborted) return
+					console.error('Order change feed failed:', error)
+					await new Promise(resolve => setTimeout(resolve, RETRY_DELAY))
+				}
+			}
+		}
+
+		poll()
+		return () => controller.abort()
+	}, [url])
+}
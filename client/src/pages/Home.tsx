@@ -1,11 +1,10 @@
 import FilterBar from '@/components/FilterBar'
 import Header from '@/components/Header'
-import Pagination from '@/components/Pagination'
 import ProductGrid from '@/components/ProductGrid'
 import SEO, { ShopSchema } from '@/components/SEO'
 import { Button } from '@/components/ui/button'
 import { useConfig } from '@/hooks/useConfig'
-import { useQuery } from '@tanstack/react-query'
+import { useInfiniteQuery, useQuery } from '@tanstack/react-query'
 import { Package } from 'lucide-react'
 import { useCallback, useEffect, useMemo, useState } from 'react'
 import { useLocation, useSearch } from 'wouter'
@@ -18,6 +17,22 @@ interface Product {
 	category_id: string
 }
 
+interface FacetCount {
+	count: number
+	in_stock: number
+}
+
+interface ProductFacets {
+	total: number
+	categories: (FacetCount & { id: string })[]
+}
+
+interface ProductPage {
+	items: Product[]
+	next_cursor: string | null
+	total?: number
+}
+
 interface Category {
 	id: string
 	name: string
@@ -75,13 +90,11 @@ export default function Home({
 			priceFrom: params.get('priceFrom') || '',
 			priceTo: params.get('priceTo') || '',
 			search: params.get('search') || '',
-			page: parseInt(params.get('page') || '1', 10),
 		}
 	}, [searchString])
 
 	const urlParams = getUrlParams()
 
-	const [currentPage, setCurrentPage] = useState(urlParams.page)
 	const [selectedCategory, setSelectedCategory] = useState(urlParams.category)
 	const [selectedSort, setSelectedSort] = useState(urlParams.sort)
 	const [priceFrom, setPriceFrom] = useState(urlParams.priceFrom)
@@ -117,7 +130,6 @@ export default function Home({
 	// Sync state from URL on mount
 	useEffect(() => {
 		const params = getUrlParams()
-		setCurrentPage(params.page)
 		setSelectedCategory(params.category)
 		setSelectedSort(params.sort)
 		setPriceFrom(params.priceFrom)
@@ -128,10 +140,8 @@ export default function Home({
 	// Handlers that update both state and URL
 	const handleCategoryChange = (value: string) => {
 		setSelectedCategory(value)
-		setCurrentPage(1)
 		updateUrl({
 			category: value,
-			page: 1,
 			sort: selectedSort,
 			priceFrom,
 			priceTo,
@@ -141,10 +151,8 @@ export default function Home({
 
 	const handleSortChange = (value: string) => {
 		setSelectedSort(value)
-		setCurrentPage(1)
 		updateUrl({
 			sort: value,
-			page: 1,
 			category: selectedCategory,
 			priceFrom,
 			priceTo,
@@ -154,10 +162,8 @@ export default function Home({
 
 	const handlePriceFromChange = (value: string) => {
 		setPriceFrom(value)
-		setCurrentPage(1)
 		updateUrl({
 			priceFrom: value,
-			page: 1,
 			category: selectedCategory,
 			sort: selectedSort,
 			priceTo,
@@ -167,10 +173,8 @@ export default function Home({
 
 	const handlePriceToChange = (value: string) => {
 		setPriceTo(value)
-		setCurrentPage(1)
 		updateUrl({
 			priceTo: value,
-			page: 1,
 			category: selectedCategory,
 			sort: selectedSort,
 			priceFrom,
@@ -180,10 +184,8 @@ export default function Home({
 
 	const handleSearchChange = (value: string) => {
 		setSearchQuery(value)
-		setCurrentPage(1)
 		updateUrl({
 			search: value,
-			page: 1,
 			category: selectedCategory,
 			sort: selectedSort,
 			priceFrom,
@@ -191,18 +193,6 @@ export default function Home({
 		})
 	}
 
-	const handlePageChange = (page: number) => {
-		setCurrentPage(page)
-		updateUrl({
-			page,
-			category: selectedCategory,
-			sort: selectedSort,
-			priceFrom,
-			priceTo,
-			search: searchQuery,
-		})
-	}
-
 	// Fetch categories from database API with caching
 	const { data: categories = [] } = useQuery<Category[]>({
 		queryKey: ['/api/categories'],
@@ -229,13 +219,73 @@ export default function Home({
 		}
 	}, [categories])
 
-	// Fetch products from API
-	const { data: products = [], isLoading: isLoadingProducts } = useQuery<
-		Product[]
-	>({
-		queryKey: ['/api/products'],
+	const productsPerPage = 12
+
+	// Category counts for the current filters, one request for all of them
+	const facetParams = useMemo(() => {
+		const params = new URLSearchParams()
+		if (selectedCategory !== 'all') params.set('category', selectedCategory)
+		if (priceFrom) params.set('price_min', priceFrom)
+		if (priceTo) params.set('price_max', priceTo)
+		if (searchQuery.trim()) params.set('q', searchQuery.trim())
+		return params.toString()
+	}, [selectedCategory, priceFrom, priceTo, searchQuery])
+
+	const { data: facets } = useQuery<ProductFacets>({
+		queryKey: [`/api/products/facets?${facetParams}`],
+		staleTime: 1000 * 60,
+	})
+
+	const categoryCounts = useMemo(
+		() =>
+			facets
+				? Object.fromEntries(facets.categories.map(c => [c.id, c.count]))
+				: undefined,
+		[facets]
+	)
+
+	// Filtering, sorting and pagination happen on the server (keyset cursors)
+	const productListParams = useMemo(() => {
+		const params = new URLSearchParams({
+			sort: selectedSort,
+			limit: String(productsPerPage),
+		})
+		if (selectedCategory !== 'all') params.set('category', selectedCategory)
+		if (priceFrom) params.set('price_min', priceFrom)
+		if (priceTo) params.set('price_max', priceTo)
+		if (searchQuery.trim()) params.set('q', searchQuery.trim())
+		return params.toString()
+	}, [selectedSort, selectedCategory, priceFrom, priceTo, searchQuery])
+
+	const {
+		data: productPages,
+		isLoading: isLoadingProducts,
+		fetchNextPage,
+		hasNextPage,
+		isFetchingNextPage,
+	} = useInfiniteQuery({
+		queryKey: ['/api/products', productListParams],
+		queryFn: async ({ pageParam }): Promise<ProductPage> => {
+			const params = new URLSearchParams(productListParams)
+			if (pageParam) {
+				params.set('cursor', pageParam)
+			} else {
+				params.set('include_total', '1')
+			}
+			const response = await fetch(`/api/products?${params}`)
+			if (!response.ok) throw new Error('Failed to load products')
+			return response.json()
+		},
+		initialPageParam: null as string | null,
+		getNextPageParam: lastPage => lastPage.next_cursor,
 	})
 
+	const products = useMemo(
+		() => productPages?.pages.flatMap(page => page.items) ?? [],
+		[productPages]
+	)
+	const totalProducts = productPages?.pages[0]?.total ?? products.length
+
 	// Fetch availability data for all products
 	const productIds = products.map(p => p.id)
 	const { data: availabilityData = {} } = useQuery<
@@ -261,7 +311,6 @@ export default function Home({
 		setPriceFrom('')
 		setPriceTo('')
 		setSearchQuery('')
-		setCurrentPage(1)
 		setLocation('/', { replace: true })
 	}
 
@@ -273,72 +322,6 @@ export default function Home({
 		priceTo !== '' ||
 		searchQuery !== ''
 
-	const productsPerPage = 12
-
-	// Apply filtering and sorting with useMemo for performance
-	const { filteredProducts, totalPages, displayedProducts } = useMemo(() => {
-		let filtered = [...products]
-
-		// Filter by search query
-		if (searchQuery.trim()) {
-			const query = searchQuery.toLowerCase()
-			filtered = filtered.filter(product =>
-				(product.name?.toLowerCase() ?? '').includes(query)
-			)
-		}
-
-		// Filter by category
-		if (selectedCategory !== 'all') {
-			filtered = filtered.filter(
-				product => product.category_id === selectedCategory
-			)
-		}
-
-		// Filter by price range
-		const minPrice = priceFrom ? parseFloat(priceFrom) : 0
-		const maxPrice = priceTo ? parseFloat(priceTo) : Infinity
-
-		if (priceFrom || priceTo) {
-			filtered = filtered.filter(
-				product => product.price >= minPrice && product.price <= maxPrice
-			)
-		}
-
-		// Apply sorting
-		switch (selectedSort) {
-			case 'new':
-				// Keep original order (newest first)
-				break
-			case 'old':
-				filtered = [...filtered].reverse()
-				break
-			case 'price-asc':
-				filtered = [...filtered].sort((a, b) => a.price - b.price)
-				break
-			case 'price-desc':
-				filtered = [...filtered].sort((a, b) => b.price - a.price)
-				break
-		}
-
-		const pages = Math.ceil(filtered.length / productsPerPage)
-		const startIndex = (currentPage - 1) * productsPerPage
-		const displayed = filtered.slice(startIndex, startIndex + productsPerPage)
-
-		return {
-			filteredProducts: filtered,
-			totalPages: pages,
-			displayedProducts: displayed,
-		}
-	}, [
-		products,
-		searchQuery,
-		selectedCategory,
-		priceFrom,
-		priceTo,
-		selectedSort,
-		currentPage,
-	])
-
 	return (
 		<div className='min-h-screen bg-background'>
 			<SEO
@@ -359,6 +342,7 @@ export default function Home({
 
 			<FilterBar
 				categories={categories}
+				categoryCounts={categoryCounts}
 				selectedCategory={selectedCategory}
 				selectedSort={selectedSort}
 				priceFrom={priceFrom}
@@ -379,7 +363,7 @@ export default function Home({
 				<div className='flex items-center justify-center min-h-[400px]'>
 					<p className='text-muted-foreground'>Загрузка товаров...</p>
 				</div>
-			) : filteredProducts.length === 0 && hasActiveFilters ? (
+			) : products.length === 0 && hasActiveFilters ? (
 				<div className='flex flex-col items-center justify-center min-h-[400px] px-4'>
 					<Package className='h-16 w-16 text-muted-foreground mb-4' />
 					<h2 className='text-xl font-semibold mb-2 text-center'>
@@ -396,7 +380,7 @@ export default function Home({
 			) : (
 				<>
 					<ProductGrid
-						products={displayedProducts}
+						products={products}
 						onToggleFavorite={onToggleFavorite}
 						onAddToCart={onAddToCart}
 						onProductClick={onProductClick}
@@ -406,11 +390,20 @@ export default function Home({
 						availabilityData={availabilityData}
 					/>
 
-					<Pagination
-						currentPage={currentPage}
-						totalPages={totalPages}
-						onPageChange={handlePageChange}
-					/>
+					{hasNextPage && (
+						<div className='flex justify-center py-6'>
+							<Button
+								variant='outline'
+								onClick={() => fetchNextPage()}
+								disabled={isFetchingNextPage}
+								data-testid='button-load-more'
+							>
+								{isFetchingNextPage
+									? 'Загрузка...'
+									: `Показать ещё (${totalProducts - products.length})`}
+							</Button>
+						</div>
+					)}
 				</>
 			)}
 		</div>
@@ -6,6 +6,7 @@ import { Separator } from '@/components/ui/separator'
 import { useToast } from '@/hooks/use-toast'
 import { useCart } from '@/hooks/useCart'
 import { useConfig } from '@/hooks/useConfig'
+import { useOrderChanges } from '@/hooks/useOrderChanges'
 import { motion } from 'framer-motion'
 import {
 	ArrowLeft,
@@ -246,7 +247,7 @@ const getDeliveryLabel = (
 export default function Orders() {
 	const [, navigate] = useLocation()
 	const { config, formatPrice } = useConfig()
-	const { addToCart } = useCart()
+	const { addItemsToCart } = useCart()
 	const { toast } = useToast()
 	const [orders, setOrders] = useState<Order[]>([])
 	const [loading, setLoading] = useState(true)
@@ -257,6 +258,9 @@ export default function Orders() {
 	const [lastFetchTime, setLastFetchTime] = useState<Date | null>(null)
 	const [newOrderIds, setNewOrderIds] = useState<Set<number>>(new Set())
 	const [isRepeating, setIsRepeating] = useState(false)
+	const [nextCursor, setNextCursor] = useState<string | null>(null)
+	const [loadedMore, setLoadedMore] = useState(false)
+	const [loadingMore, setLoadingMore] = useState(false)
 
 	const orderStatuses = config?.orderStatuses || {}
 	const statusSteps = useMemo(
@@ -303,10 +307,11 @@ export default function Orders() {
 				const response = await fetch('/api/orders')
 				if (response.ok) {
 					const data = await response.json()
+					const page: Order[] = data.items
 
 					if (lastFetchTime && orders.length > 0) {
 						const newIds = new Set<number>()
-						data.forEach((order: Order) => {
+						page.forEach((order: Order) => {
 							const orderDate = new Date(order.created_at)
 							if (orderDate > lastFetchTime) {
 								newIds.add(order.id)
@@ -321,10 +326,21 @@ export default function Orders() {
 						}
 					}
 
-					setOrders(data)
+					// Refreshes only reload the first page; pages loaded with
+					// "show more" are kept behind it
+					if (loadedMore) {
+						const pageIds = new Set(page.map(order => order.id))
+						setOrders(prev => [
+							...page,
+							...prev.filter(order => !pageIds.has(order.id)),
+						])
+					} else {
+						setOrders(page)
+						setNextCursor(data.next_cursor)
+					}
 					setLastFetchTime(new Date())
-					if (data.length > 0 && !expandedOrder) {
-						setExpandedOrder(data[0].id)
+					if (page.length > 0 && !expandedOrder) {
+						setExpandedOrder(page[0].id)
 					}
 				}
 			} catch (error) {
@@ -341,19 +357,64 @@ export default function Orders() {
 				setRefreshing(false)
 			}
 		},
-		[lastFetchTime, orders.length, expandedOrder, toast]
+		[lastFetchTime, orders.length, expandedOrder, loadedMore, toast]
 	)
 
+	const loadMore = async () => {
+		if (!nextCursor || loadingMore) return
+		setLoadingMore(true)
+		try {
+			const response = await fetch(
+				`/api/orders?cursor=${encodeURIComponent(nextCursor)}`
+			)
+			if (!response.ok) throw new Error('Failed to load orders')
+			const data = await response.json()
+			setOrders(prev => {
+				const ids = new Set(prev.map(order => order.id))
+				return [
+					...prev,
+					...data.items.filter((order: Order) => !ids.has(order.id)),
+				]
+			})
+			setNextCursor(data.next_cursor)
+			setLoadedMore(true)
+		} catch (error) {
+			console.error('Failed to load more orders:', error)
+			toast({
+				title: 'Ошибка',
+				description: 'Не удалось загрузить заказы',
+				variant: 'destructive',
+			})
+		} finally {
+			setLoadingMore(false)
+		}
+	}
+
 	useEffect(() => {
 		fetchOrders()
 	}, [])
 
-	useEffect(() => {
-		const interval = setInterval(() => {
-			fetchOrders(false)
-		}, 30000)
-		return () => clearInterval(interval)
-	}, [fetchOrders])
+	// Created and changed orders arrive from the change feed instead of
+	// reloading the list; new ones go on top and are highlighted
+	useOrderChanges<Order>('/api/orders/changes', changed => {
+		const known = new Set(orders.map(order => order.id))
+		const created = changed.filter(order => !known.has(order.id))
+		const byId = new Map(changed.map(order => [order.id, order]))
+		setOrders(prev => {
+			const ids = new Set(prev.map(order => order.id))
+			return [
+				...changed.filter(order => !ids.has(order.id)).reverse(),
+				...prev.map(order => byId.get(order.id) ?? order),
+			]
+		})
+		if (created.length > 0) {
+			setNewOrderIds(prev => {
+				const combined = new Set(Array.from(prev))
+				created.forEach(order => combined.add(order.id))
+				return combined
+			})
+		}
+	})
 
 	const toggleOrder = (orderId: number) => {
 		setExpandedOrder(expandedOrder === orderId ? null : orderId)
@@ -385,7 +446,7 @@ export default function Orders() {
 		try {
 			const productIds = order.items.map(item => String(item.product_id))
 
-			const checkResponse = await fetch('/api/products/check', {
+			const checkResponse = await fetch('/api/products/batch?fields=id', {
 				method: 'POST',
 				headers: { 'Content-Type': 'application/json' },
 				body: JSON.stringify({ product_ids: productIds }),
@@ -396,8 +457,9 @@ export default function Orders() {
 			}
 
 			const data = await checkResponse.json()
-			const existing = data.existing || []
-			const missing = data.missing || []
+			const existing: string[] = (data.items || []).map(
+				(product: { id: string }) => product.id
+			)
 
 			if (existing.length === 0) {
 				toast({
@@ -409,26 +471,36 @@ export default function Orders() {
 				return
 			}
 
-			let addedCount = 0
 			const availableItems = order.items.filter(item =>
 				(existing ?? []).map(String).includes(String(item.product_id))
 			)
 
-			for (const item of availableItems) {
-				for (let i = 0; i < item.quantity; i++) {
-					addToCart(
-						String(item.product_id),
-						item.selected_color,
-						item.selected_attributes
-					)
-					addedCount++
-				}
+			// Lines whose color or attributes are no longer offered are skipped
+			const rejected = await addItemsToCart(
+				availableItems.map(item => ({
+					productId: String(item.product_id),
+					quantity: item.quantity,
+					selectedColor: item.selected_color,
+					selectedAttributes: item.selected_attributes,
+				}))
+			)
+			const addedCount = availableItems.length - rejected.length
+			const unavailableCount = order.items.length - addedCount
+
+			if (addedCount === 0) {
+				toast({
+					title: 'Товары недоступны',
+					description:
+						'К сожалению, все товары из этого заказа больше недоступны',
+					variant: 'destructive',
+				})
+				return
 			}
 
-			if (missing.length > 0) {
+			if (unavailableCount > 0) {
 				toast({
 					title: 'Часть товаров недоступна',
-					description: `Добавлено ${availableItems.length} из ${order.items.length} товаров. ${missing.length} товар(ов) больше недоступны.`,
+					description: `Добавлено ${addedCount} из ${order.items.length} товаров. ${unavailableCount} товар(ов) больше недоступны.`,
 				})
 			} else {
 				toast({
@@ -1011,6 +1083,15 @@ export default function Orders() {
 						})}
 					</div>
 				)}
+
+				{nextCursor && (
+					<div className='flex justify-center mt-4'>
+						<Button variant='outline' onClick={loadMore} disabled={loadingMore}>
+							{loadingMore && <Loader2 className='h-4 w-4 mr-2 animate-spin' />}
+							Показать ещё
+						</Button>
+					</div>
+				)}
 			</div>
 		</div>
 	)
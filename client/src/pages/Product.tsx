@@ -7,16 +7,6 @@ interface Attribute {
   values: string[];
 }
 
-interface InventoryItemAPI {
-  id: number;
-  product_id: string;
-  color: string | null;
-  attribute1_value: string | null;
-  attribute2_value: string | null;
-  quantity: number;
-  backorder_lead_time_days: number | null;
-}
-
 interface InventoryItem {
   color: string | null;
   attribute1_value: string | null;
@@ -34,6 +24,8 @@ interface ProductData {
   category_id: string;
   colors?: string[];
   attributes?: Attribute[];
+  inventory: InventoryItem[];
+  category: { id: string; name: string; icon?: string } | null;
 }
 
 interface ProductProps {
@@ -55,33 +47,16 @@ export default function Product({
   isInCart,
   onCartClick,
 }: ProductProps) {
-  // Load product from API
+  // Product, inventory and category in one request
   const { data: product, isLoading, error } = useQuery<ProductData>({
     queryKey: ["/api/products", productId],
     queryFn: async () => {
-      const response = await fetch(`/api/products/${productId}`);
+      const response = await fetch(`/api/products/${productId}?include=category`);
       if (!response.ok) throw new Error('Product not found');
       return response.json();
     }
   });
-
-  // Load inventory for product
-  const { data: inventory } = useQuery<InventoryItem[]>({
-    queryKey: ["/api/products", productId, "inventory"],
-    queryFn: async () => {
-      const response = await fetch(`/api/products/${productId}/inventory`);
-      if (!response.ok) return [];
-      const data: InventoryItemAPI[] = await response.json();
-      return data.map(item => ({
-        color: item.color,
-        attribute1_value: item.attribute1_value,
-        attribute2_value: item.attribute2_value,
-        quantity: item.quantity,
-        backorder_lead_time_days: item.backorder_lead_time_days
-      }));
-    },
-    enabled: !!productId
-  });
+  const inventory = product?.inventory;
   
   if (isLoading) {
     return (
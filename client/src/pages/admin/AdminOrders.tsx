@@ -16,6 +16,7 @@ import {
 	SelectValue,
 } from '@/components/ui/select'
 import { useToast } from '@/hooks/use-toast'
+import { useOrderChanges } from '@/hooks/useOrderChanges'
 import {
 	Calendar,
 	Clock,
@@ -29,7 +30,7 @@ import {
 	User,
 	X,
 } from 'lucide-react'
-import { useEffect, useMemo, useState } from 'react'
+import { useEffect, useState } from 'react'
 
 interface OrderItem {
 	id: string
@@ -39,7 +40,7 @@ interface OrderItem {
 	quantity: number
 	selected_color: string
 	selected_attributes: any
-	product_images: string[]
+	image_url?: string
 	availability_status?: string
 	backorder_lead_time_days?: number
 }
@@ -100,11 +101,35 @@ const getStatusLabel = (status: string): string => {
 	return STATUS_LABELS[status] || status
 }
 
+const PAYMENT_STATUSES = [
+	{ value: 'pending', label: 'Не оплачен' },
+	{ value: 'awaiting_verification', label: 'Проверка чека' },
+	{ value: 'paid', label: 'Оплачен' },
+]
+
+const PAYMENT_METHODS = [
+	{ value: 'click', label: 'Click' },
+	{ value: 'payme', label: 'Payme' },
+	{ value: 'uzum', label: 'Uzum Bank' },
+	{ value: 'card_transfer', label: 'Перевод на карту' },
+]
+
+const SEARCH_DEBOUNCE_MS = 300
+
 export default function AdminOrders() {
 	const [orders, setOrders] = useState<Order[]>([])
 	const [loading, setLoading] = useState(true)
+	const [loadingMore, setLoadingMore] = useState(false)
+	const [nextCursor, setNextCursor] = useState<string | null>(null)
+	const [total, setTotal] = useState(0)
+	const [statusCounts, setStatusCounts] = useState<Record<string, number>>({})
 	const [statusFilter, setStatusFilter] = useState('all')
+	const [paymentStatusFilter, setPaymentStatusFilter] = useState('all')
+	const [paymentMethodFilter, setPaymentMethodFilter] = useState('all')
+	const [dateFrom, setDateFrom] = useState('')
+	const [dateTo, setDateTo] = useState('')
 	const [searchQuery, setSearchQuery] = useState('')
+	const [debouncedSearch, setDebouncedSearch] = useState('')
 	const [selectedOrder, setSelectedOrder] = useState<Order | null>(null)
 	const [customStatus, setCustomStatus] = useState('')
 	const [orderStatuses, setOrderStatuses] = useState(DEFAULT_STATUSES)
@@ -112,20 +137,13 @@ export default function AdminOrders() {
 	const [receiptImageUrl, setReceiptImageUrl] = useState<string | null>(null)
 	const { toast } = useToast()
 
-	const filteredOrders = useMemo(() => {
-		if (!searchQuery.trim()) return orders
-		const query = searchQuery.toLowerCase()
-		return orders.filter(
-			order =>
-				(order.customer_name?.toLowerCase() ?? '').includes(query) ||
-				(order.customer_phone?.toLowerCase() ?? '').includes(query) ||
-				(order.user_email?.toLowerCase() ?? '').includes(query) ||
-				(order.first_name?.toLowerCase() ?? '').includes(query) ||
-				(order.last_name?.toLowerCase() ?? '').includes(query) ||
-				(order.id?.toLowerCase() ?? '').includes(query) ||
-				(order.delivery_address?.toLowerCase() ?? '').includes(query)
+	useEffect(() => {
+		const timer = setTimeout(
+			() => setDebouncedSearch(searchQuery.trim()),
+			SEARCH_DEBOUNCE_MS
 		)
-	}, [orders, searchQuery])
+		return () => clearTimeout(timer)
+	}, [searchQuery])
 
 	const openReceiptModal = (url: string) => {
 		setReceiptImageUrl(url)
@@ -143,9 +161,19 @@ export default function AdminOrders() {
 	}
 
 	useEffect(() => {
-		fetchOrders()
 		fetchConfig()
-	}, [statusFilter])
+	}, [])
+
+	useEffect(() => {
+		fetchOrders()
+	}, [
+		statusFilter,
+		paymentStatusFilter,
+		paymentMethodFilter,
+		dateFrom,
+		dateTo,
+		debouncedSearch,
+	])
 
 	const fetchConfig = async () => {
 		try {
@@ -169,15 +197,28 @@ export default function AdminOrders() {
 		}
 	}
 
-	const fetchOrders = async () => {
+	// Filters and search run on the server; `cursor` appends the next page
+	const fetchOrders = async (cursor?: string) => {
+		if (cursor) setLoadingMore(true)
 		try {
 			const params = new URLSearchParams()
-			if (statusFilter && statusFilter !== 'all')
-				params.append('status', statusFilter)
+			if (statusFilter !== 'all') params.append('status', statusFilter)
+			if (paymentStatusFilter !== 'all')
+				params.append('payment_status', paymentStatusFilter)
+			if (paymentMethodFilter !== 'all')
+				params.append('payment_method', paymentMethodFilter)
+			if (dateFrom) params.append('date_from', dateFrom)
+			if (dateTo) params.append('date_to', dateTo)
+			if (debouncedSearch) params.append('q', debouncedSearch)
+			if (cursor) params.append('cursor', cursor)
 
 			const response = await fetch(`/api/admin/orders?${params}`)
+			if (!response.ok) throw new Error('Failed to load orders')
 			const data = await response.json()
-			setOrders(data)
+			setOrders(prev => (cursor ? [...prev, ...data.items] : data.items))
+			setNextCursor(data.next_cursor)
+			setTotal(data.total)
+			setStatusCounts(data.status_counts)
 		} catch (error) {
 			toast({
 				title: 'Ошибка',
@@ -186,9 +227,43 @@ export default function AdminOrders() {
 			})
 		} finally {
 			setLoading(false)
+			setLoadingMore(false)
 		}
 	}
 
+	// Orders changed elsewhere are patched in place; a new order, or one that
+	// left the current filters, reloads the list and its counts
+	useOrderChanges<Order>('/api/admin/orders/changes', changed => {
+		const current = new Map(orders.map(order => [order.id, order]))
+		const needsReload = changed.some(
+			order =>
+				!current.has(order.id) ||
+				(statusFilter !== 'all' && order.status !== statusFilter) ||
+				(paymentStatusFilter !== 'all' &&
+					order.payment_status !== paymentStatusFilter)
+		)
+		if (needsReload) {
+			fetchOrders()
+			return
+		}
+
+		const byId = new Map(changed.map(order => [order.id, order]))
+		setOrders(prev => prev.map(order => byId.get(order.id) ?? order))
+		setStatusCounts(prev => {
+			const next = { ...prev }
+			changed.forEach(order => {
+				const previous = current.get(order.id)!
+				if (previous.status === order.status) return
+				next[previous.status] = Math.max((next[previous.status] || 0) - 1, 0)
+				next[order.status] = (next[order.status] || 0) + 1
+			})
+			return next
+		})
+		if (selectedOrder && byId.has(selectedOrder.id)) {
+			setSelectedOrder(byId.get(selectedOrder.id)!)
+		}
+	})
+
 	const updateOrderStatus = async (orderId: string, status: string) => {
 		try {
 			const response = await fetch(`/api/admin/orders/${orderId}/status`, {
@@ -258,6 +333,11 @@ export default function AdminOrders() {
 		)
 	}
 
+	const allStatusesCount = Object.values(statusCounts).reduce(
+		(sum, count) => sum + count,
+		0
+	)
+
 	if (loading) {
 		return (
 			<div className='flex justify-center p-8'>
@@ -272,7 +352,7 @@ export default function AdminOrders() {
 				<div className='relative'>
 					<Search className='absolute left-3 top-1/2 -translate-y-1/2 h-4 w-4 text-muted-foreground' />
 					<Input
-						placeholder='Поиск...'
+						placeholder='Номер заказа, телефон или имя'
 						value={searchQuery}
 						onChange={e => setSearchQuery(e.target.value)}
 						className='pl-10 h-10'
@@ -284,22 +364,70 @@ export default function AdminOrders() {
 							<SelectValue placeholder='Все' />
 						</SelectTrigger>
 						<SelectContent>
-							<SelectItem value='all'>Все статусы</SelectItem>
+							<SelectItem value='all'>Все статусы ({allStatusesCount})</SelectItem>
 							{orderStatuses.map(status => (
 								<SelectItem key={status.value} value={status.value}>
-									{status.label}
+									{status.label} ({statusCounts[status.value] || 0})
 								</SelectItem>
 							))}
 						</SelectContent>
 					</Select>
 					<span className='text-xs text-muted-foreground'>
-						{filteredOrders.length} из {orders.length}
+						{orders.length} из {total}
 					</span>
 				</div>
+				<div className='grid grid-cols-2 gap-2'>
+					<Select
+						value={paymentStatusFilter}
+						onValueChange={setPaymentStatusFilter}
+					>
+						<SelectTrigger className='h-9'>
+							<SelectValue placeholder='Оплата' />
+						</SelectTrigger>
+						<SelectContent>
+							<SelectItem value='all'>Любая оплата</SelectItem>
+							{PAYMENT_STATUSES.map(status => (
+								<SelectItem key={status.value} value={status.value}>
+									{status.label}
+								</SelectItem>
+							))}
+						</SelectContent>
+					</Select>
+					<Select
+						value={paymentMethodFilter}
+						onValueChange={setPaymentMethodFilter}
+					>
+						<SelectTrigger className='h-9'>
+							<SelectValue placeholder='Способ оплаты' />
+						</SelectTrigger>
+						<SelectContent>
+							<SelectItem value='all'>Все способы</SelectItem>
+							{PAYMENT_METHODS.map(method => (
+								<SelectItem key={method.value} value={method.value}>
+									{method.label}
+								</SelectItem>
+							))}
+						</SelectContent>
+					</Select>
+					<Input
+						type='date'
+						value={dateFrom}
+						onChange={e => setDateFrom(e.target.value)}
+						className='h-9'
+						aria-label='С даты'
+					/>
+					<Input
+						type='date'
+						value={dateTo}
+						onChange={e => setDateTo(e.target.value)}
+						className='h-9'
+						aria-label='По дату'
+					/>
+				</div>
 			</div>
 
 			<div className='space-y-2'>
-				{filteredOrders.map(order => (
+				{orders.map(order => (
 					<div
 						key={order.id}
 						onClick={() => setSelectedOrder(order)}
@@ -354,14 +482,25 @@ export default function AdminOrders() {
 				))}
 			</div>
 
-			{filteredOrders.length === 0 && (
+			{orders.length === 0 && (
 				<div className='text-center py-12 text-muted-foreground'>
-					{orders.length === 0
-						? 'Заказы не найдены'
-						: 'Ничего не найдено по запросу'}
+					{debouncedSearch
+						? 'Ничего не найдено по запросу'
+						: 'Заказы не найдены'}
 				</div>
 			)}
 
+			{nextCursor && (
+				<Button
+					variant='outline'
+					className='w-full'
+					disabled={loadingMore}
+					onClick={() => fetchOrders(nextCursor)}
+				>
+					{loadingMore ? 'Загрузка...' : 'Показать ещё'}
+				</Button>
+			)}
+
 			<Dialog
 				open={!!selectedOrder}
 				onOpenChange={() => setSelectedOrder(null)}
@@ -549,9 +688,9 @@ export default function AdminOrders() {
 											key={idx}
 											className='flex gap-2.5 p-2 bg-muted/50 rounded-lg'
 										>
-											{item.product_images && item.product_images[0] ? (
+											{item.image_url ? (
 												<img
-													src={item.product_images[0]}
+													src={item.image_url}
 													alt={item.name}
 													className='w-12 h-12 object-cover rounded-lg shrink-0'
 												/>
@@ -17,7 +17,8 @@ interface Attribute {
 interface Product {
   id: string;
   name: string;
-  description: string;
+  description?: string;
+  summary?: string;
   price: number;
   images: string[];
   category_id: string;
@@ -152,7 +153,18 @@ export default function AdminProducts() {
     setIsDialogOpen(true);
   };
 
-  const openEditDialog = (product: Product) => {
+  const openEditDialog = async (listItem: Product) => {
+    // The list only carries the card projection (first image, no description),
+    // so editing must start from the full row or images would be lost on save
+    let product: Product;
+    try {
+      const response = await fetch(`/api/admin/products/${listItem.id}`);
+      if (!response.ok) throw new Error('Failed to load product');
+      product = await response.json();
+    } catch (error) {
+      toast({ title: 'Ошибка', description: 'Не удалось загрузить товар', variant: 'destructive' });
+      return;
+    }
     setEditingProduct(product);
     setFormData({
       name: product.name,
@@ -565,7 +577,7 @@ export default function AdminProducts() {
             </div>
             <CardContent className="p-4">
               <h3 className="font-semibold truncate">{product.name}</h3>
-              <p className="text-sm text-muted-foreground truncate">{product.description}</p>
+              <p className="text-sm text-muted-foreground truncate">{product.summary}</p>
               <p className="text-lg font-bold mt-2">{formatPrice(product.price)}</p>
               <div className="flex gap-2 mt-4">
                 <Button size="sm" variant="outline" onClick={() => openEditDialog(product)} className="flex-1">
@@ -273,7 +273,9 @@ User=$APP_USER
 WorkingDirectory=$APP_DIR
 Environment="PATH=$APP_DIR/venv/bin"
 EnvironmentFile=$APP_DIR/.env
-ExecStart=$APP_DIR/venv/bin/gunicorn app:app --bind 127.0.0.1:$APP_PORT --workers 4 --timeout 120
+# Notifications are delivered by shop-outbox
+Environment="OUTBOX_WORKER=external"
+ExecStart=$APP_DIR/venv/bin/gunicorn app:app --bind 127.0.0.1:$APP_PORT --workers 4 --worker-class gthread --threads 16 --timeout 120
 Restart=always
 RestartSec=10
 
@@ -303,15 +305,39 @@ StandardError=journal
 WantedBy=multi-user.target
 EOF
 
+print_step "Создание сервиса доставки уведомлений (shop-outbox)..."
+cat > /etc/systemd/system/shop-outbox.service <<EOF
+[Unit]
+Description=Telegram Shop Outbox Worker (notifications, emails)
+After=network.target postgresql.service
+
+[Service]
+Type=simple
+User=$APP_USER
+WorkingDirectory=$APP_DIR
+Environment="PATH=$APP_DIR/venv/bin"
+EnvironmentFile=$APP_DIR/.env
+ExecStart=$APP_DIR/venv/bin/python3 -m backend.outbox
+Restart=always
+RestartSec=10
+StandardOutput=journal
+StandardError=journal
+
+[Install]
+WantedBy=multi-user.target
+EOF
+
 # Запуск сервисов
 print_step "Запуск сервисов..."
 systemctl daemon-reload
 
 systemctl enable shop-app
+systemctl enable shop-outbox
 systemctl enable ai-bot
 systemctl enable telegram-bot
 
 systemctl restart shop-app
+systemctl restart shop-outbox
 systemctl restart ai-bot
 systemctl restart telegram-bot
 
@@ -323,6 +349,12 @@ else
     print_error "❌ Ошибка запуска Магазина! Проверьте логи: journalctl -u shop-app"
 fi
 
+if systemctl is-active --quiet shop-outbox; then
+    print_step "✅ Доставка уведомлений (outbox) запущена!"
+else
+    print_error "❌ Ошибка запуска outbox! Проверьте логи: journalctl -u shop-outbox"
+fi
+
 if systemctl is-active --quiet ai-bot; then
     print_step "✅ AI Бот (Mona) запущен!"
 else
@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 """
-Initialize database tables (run this once before starting the app)
+Apply database schema migrations (run on every deploy, before restarting the app)
 """
 import sys
 import os
@@ -11,10 +11,10 @@ from dotenv import load_dotenv
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 load_dotenv(os.path.join(PROJECT_ROOT, '.env'))
 
-from backend.database import init_db
+from backend.migrate import main
 
 if __name__ == '__main__':
-    print("Creating database tables if they don't exist...")
-    init_db()
-    print("Database tables created successfully!")
+    print("Applying database migrations...")
+    exit_code = main(sys.argv[1:])
     print("\nTo seed sample data, run: python seed_db.py")
+    sys.exit(exit_code)
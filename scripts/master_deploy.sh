@@ -343,7 +343,9 @@ User=$APP_USER
 WorkingDirectory=$APP_DIR
 Environment="PATH=$APP_DIR/venv/bin"
 EnvironmentFile=$APP_DIR/.env
-ExecStart=$APP_DIR/venv/bin/gunicorn app:app --bind 127.0.0.1:$APP_PORT --workers 4 --timeout 120
+# Notifications are delivered by shop-outbox
+Environment="OUTBOX_WORKER=external"
+ExecStart=$APP_DIR/venv/bin/gunicorn app:app --bind 127.0.0.1:$APP_PORT --workers 4 --worker-class gthread --threads 16 --timeout 120
 Restart=always
 RestartSec=10
 
@@ -351,6 +353,28 @@ RestartSec=10
 WantedBy=multi-user.target
 EOF
 
+# Outbox worker (Telegram notifications, emails)
+cat > /etc/systemd/system/shop-outbox.service <<EOF
+[Unit]
+Description=Telegram Shop Outbox Worker (notifications, emails)
+After=network.target postgresql.service
+
+[Service]
+Type=simple
+User=$APP_USER
+WorkingDirectory=$APP_DIR
+Environment="PATH=$APP_DIR/venv/bin"
+EnvironmentFile=$APP_DIR/.env
+ExecStart=$APP_DIR/venv/bin/python3 -m backend.outbox
+Restart=always
+RestartSec=10
+StandardOutput=journal
+StandardError=journal
+
+[Install]
+WantedBy=multi-user.target
+EOF
+
 # WebSocket Chat Service
 cat > /etc/systemd/system/shop-chat.service <<EOF
 [Unit]
@@ -428,6 +452,9 @@ systemctl daemon-reload
 systemctl enable shop-app
 systemctl start shop-app
 
+systemctl enable shop-outbox
+systemctl start shop-outbox
+
 systemctl enable shop-chat
 systemctl start shop-chat
 
@@ -450,6 +477,12 @@ else
     print_error "❌ Shop App не запустился"
 fi
 
+if systemctl is-active --quiet shop-outbox; then
+    print_step "✅ Outbox Worker запущен"
+else
+    print_error "❌ Outbox Worker не запустился"
+fi
+
 if systemctl is-active --quiet shop-chat; then
     print_step "✅ Chat Service запущен"
 else
@@ -643,6 +676,7 @@ echo ""
 
 echo -e "${BLUE}📊 УПРАВЛЕНИЕ СЕРВИСАМИ:${NC}"
 echo -e "   Shop App:      sudo systemctl {start|stop|restart|status} shop-app"
+echo -e "   Outbox:        sudo systemctl {start|stop|restart|status} shop-outbox"
 echo -e "   AI Bot:        sudo systemctl {start|stop|restart|status} ai-bot"
 if [ ! -z "$TELEGRAM_BOT_TOKEN" ]; then
     echo -e "   Telegram Bot:  sudo systemctl {start|stop|restart|status} telegram-bot"
@@ -659,7 +693,7 @@ echo ""
 
 echo -e "${BLUE}🔄 ОБНОВЛЕНИЕ:${NC}"
 echo -e "   cd $APP_DIR && git pull"
-echo -e "   sudo systemctl restart shop-app ai-bot telegram-bot"
+echo -e "   sudo systemctl restart shop-app shop-outbox ai-bot telegram-bot"
 echo ""
 
 echo -e "${YELLOW}📝 СЛЕДУЮЩИЕ ШАГИ:${NC}"
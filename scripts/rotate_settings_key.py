@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Re-encrypt secret platform settings with the current SETTINGS_ENCRYPTION_KEY.
+
+Key rotation without downtime:
+  1. In .env put the old secret into SETTINGS_ENCRYPTION_OLD_KEYS and the new
+     one into SETTINGS_ENCRYPTION_KEY, then restart the app and bots
+     (old ciphertexts still decrypt with the old key).
+  2. Run this script.
+  3. Once it reports no failures, remove SETTINGS_ENCRYPTION_OLD_KEYS.
+
+    python3 scripts/rotate_settings_key.py
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dotenv import load_dotenv
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+load_dotenv(os.path.join(PROJECT_ROOT, '.env'))
+
+from backend.database import rotate_encrypted_settings
+
+if __name__ == '__main__':
+    print("🔑 Re-encrypting secret settings with the primary key...")
+    rotated, failed = rotate_encrypted_settings()
+    print(f"✅ Re-encrypted {rotated} setting(s)")
+    if failed:
+        print(f"❌ Could not decrypt with any configured key: {', '.join(failed)}")
+        print("   Add the key they were encrypted with to SETTINGS_ENCRYPTION_OLD_KEYS and run again")
+        sys.exit(1)
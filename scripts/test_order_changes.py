@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Check that the order change feed caps the long polls waiting per process.
+
+Needs no database: fetch() is a stub that never finds a change, so every
+admitted request waits until its deadline.
+
+    python3 scripts/test_order_changes.py
+"""
+import sys
+import os
+import time
+import threading
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import order_changes
+
+WAIT = 1.0
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_waiter_cap():
+    cap = order_changes.CHANGE_FEED_MAX_WAITERS
+    results = []
+    threads = [threading.Thread(target=lambda i=i: results.append(order_changes.poll_changes(lambda: [], f'user-{i}', WAIT)))
+               for i in range(cap)]
+    for thread in threads:
+        thread.start()
+    assert _wait_for(lambda: order_changes.get_feed_stats()['waiting_requests'] == cap), 'waiters did not register'
+
+    # Past the cap the answer comes at once and says it did not wait
+    started = time.monotonic()
+    rows, waited = order_changes.poll_changes(lambda: [], 'user-extra', WAIT)
+    assert rows == [] and waited is False, (rows, waited)
+    assert time.monotonic() - started < WAIT / 2, 'refused request waited'
+    assert order_changes.get_feed_stats()['refused_waits'] >= 1
+
+    for thread in threads:
+        thread.join()
+    assert all(waited for _, waited in results), results
+    assert order_changes.get_feed_stats()['waiting_requests'] == 0
+
+    # Once the waiters are gone, a new request is held again
+    started = time.monotonic()
+    rows, waited = order_changes.poll_changes(lambda: [], 'user-extra', WAIT)
+    assert waited is True and time.monotonic() - started >= WAIT * 0.9
+
+
+if __name__ == '__main__':
+    test_waiter_cap()
+    print(f"✅ At most {order_changes.CHANGE_FEED_MAX_WAITERS} order feed requests wait per process")
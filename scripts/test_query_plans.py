@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+EXPLAIN regression check for the hot query paths.
+
+Seeds synthetic rows inside a transaction (rolled back at the end, so it is
+safe to point at any database), disables sequential scans and EXPLAINs every
+registered query. If a query still plans a Seq Scan, no index can serve it
+and the script exits with status 1.
+
+It never changes the schema: against a database whose migrations are behind
+it exits with status 2. Apply them first, or pass --migrate to have the
+script run them (a permanent change to that database).
+
+    python3 scripts/test_query_plans.py [--migrate]
+"""
+import sys
+import os
+import json
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from backend.database import _connect
+from backend.migrate import apply_migrations, get_schema_version, latest_version
+
+from backend.projections import select_list, CARD_VIEW
+from backend.search import search_condition
+from backend.facets import color_condition, attribute_condition
+from backend.inventory import _VARIANT_AVAILABILITY_SQL, _STOCK_SUMMARY_SQL
+from backend.order_queries import ORDER_ITEMS_SQL, cursor_condition, order_filter_conditions
+from backend.order_changes import changes_condition
+from backend.routes import products, cart, orders, admin, payments, chat
+
+USER_ID = 'plan-user-1'
+PRODUCT_ID = 'plan-product-1'
+ORDER_ID = 'plan-order-1'
+CATEGORY_ID = 'plan-category-1'
+ORDER_CURSOR = ('2100-01-01T00:00:00', 'plan-order-~')
+
+
+def _product_page(sort, conditions=(), prefix=''):
+    """GET /products page SQL for `sort`, after a cursor."""
+    column, direction, _ = products.PRODUCT_SORTS[sort]
+    where = ' WHERE ' + ' AND '.join(list(conditions) + [products._keyset_condition(sort)])
+    return products._PRODUCT_PAGE_SQL.format(prefix=prefix, columns=select_list(CARD_VIEW, 'products'),
+                                             column=column, direction=direction, where=where)
+
+
+def _search_page(q):
+    match_sql, match_params = search_condition(q)
+    sql = _product_page('new', ['id IN (SELECT id FROM search_matches)'],
+                        products._SEARCH_MATCHES_SQL.format(match=match_sql))
+    return sql, match_params + ('2100-01-01T00:00:00', PRODUCT_ID, 25)
+
+
+def _admin_orders(filters, cursor=None):
+    conditions, params = order_filter_conditions(filters)
+    if cursor:
+        sql, cursor_params = cursor_condition(cursor)
+        conditions.append(sql)
+        params.extend(cursor_params)
+    where = ' WHERE ' + ' AND '.join(conditions) if conditions else ''
+    sql = admin._ADMIN_ORDERS_SQL.format(where=where, order_by='o.created_at DESC, o.id DESC')
+    return sql, tuple(params) + (51,)
+
+
+def _order_changes(user_id=None):
+    sql, params = changes_condition(ORDER_CURSOR)
+    if user_id is None:
+        return admin._ADMIN_ORDERS_SQL.format(where=f' WHERE {sql}', order_by='o.updated_at, o.id'), params + (101,)
+    return (orders._ORDERS_WITH_ITEMS_SQL.format(where=f'o.user_id = %s AND {sql}', order_by='o.updated_at, o.id'),
+            (user_id,) + params + (101,))
+
+
+def _order_history():
+    sql, params = cursor_condition(ORDER_CURSOR)
+    return (orders._ORDERS_WITH_ITEMS_SQL.format(where=f'o.user_id = %s AND {sql}', order_by='o.created_at DESC, o.id DESC'),
+            (USER_ID,) + params + (21,))
+
+
+def _facet_page():
+    color_sql, color_params = color_condition(['#ff0000'], 'products')
+    attr_sql, attr_params = attribute_condition('Size', ['XL'], 'products')
+    return (_product_page('new', [color_sql, attr_sql]),
+            color_params + attr_params + ('2100-01-01T00:00:00', PRODUCT_ID, 25))
+
+
+# (name, sql, params), built from the SQL the routes execute so a changed
+# query is checked as it runs
+HOT_QUERIES = [
+    ('cart by user', cart._CART_ITEMS_SQL.format(columns=select_list(CARD_VIEW)), (USER_ID,)),
+    ('cart stock by user', cart._CART_STOCK_SQL, (USER_ID,)),
+    ('add to cart', cart._ADD_TO_CART_SQL,
+     (USER_ID, PRODUCT_ID, PRODUCT_ID, '#000000', None, 1, '#000000', None)),
+    ('favorites by user', products._FAVORITES_SQL.format(columns=select_list(CARD_VIEW)), (USER_ID,)),
+    ('products batch', products._PRODUCTS_BATCH_SQL.format(columns=select_list(CARD_VIEW)),
+     ([PRODUCT_ID, 'plan-product-2', 'plan-product-3'],)),
+    ('products page (new)', _product_page('new'), ('2100-01-01T00:00:00', PRODUCT_ID, 25)),
+    ('products page by price in category', _product_page('price-asc', ['category_id = %s']),
+     (CATEGORY_ID, 1500, PRODUCT_ID, 25)),
+    ('products page by name', _product_page('name'), ('Product 1', PRODUCT_ID, 25)),
+    ('products page by color and attribute', *_facet_page()),
+    ('product search (full text + trigram)', *_search_page('Product 1234')),
+    ('stock summary (batch)', _STOCK_SUMMARY_SQL, ([PRODUCT_ID, 'plan-product-2', 'plan-product-3'],)),
+    ('variant availability (batch)', _VARIANT_AVAILABILITY_SQL,
+     (['plan-variant-1', None], [None, PRODUCT_ID], [None, '#000000'], [None, 'S'], [None, None], [1, 1])),
+    ('checkout cart', orders._CHECKOUT_CART_SQL, (USER_ID,)),
+    ('checkout inventory', orders._CHECKOUT_INVENTORY_SQL, (['plan-variant-1', 'plan-variant-2'],)),
+    ('order history page', *_order_history()),
+    ('order changes by user', *_order_changes(USER_ID)),
+    ('admin orders by status', *_admin_orders({'status': 'paid'}, ORDER_CURSOR)),
+    ('admin order search', *_admin_orders({'q': '12345'})),
+    ('admin order changes', *_order_changes()),
+    ('order items (batch)', ORDER_ITEMS_SQL, ([ORDER_ID, 'plan-order-2'],)),
+    ('order by payment_id (webhooks)', payments._MARK_PAID_SQL, ('payme-tx-1',)),
+    ('chat messages by user', chat._USER_MESSAGES_SQL, (USER_ID, USER_ID)),
+]
+
+SEED_SQL = '''
+    INSERT INTO users (id, email) SELECT 'plan-user-' || g, 'plan' || g || '@example.com' FROM generate_series(1, 500) g;
+    INSERT INTO categories (id, name) SELECT 'plan-category-' || g, 'Category ' || g FROM generate_series(1, 20) g;
+    INSERT INTO products (id, name, description, price, images, category_id, colors, attributes)
+        SELECT 'plan-product-' || g, 'Product ' || g, 'Description ' || g, 1000 + g, ARRAY['https://example.com/' || g || '.jpg'],
+               'plan-category-' || (g % 20 + 1), ARRAY['#' || lpad(to_hex(g % 50), 6, '0')],
+               jsonb_build_array(jsonb_build_object('name', 'Size', 'values', jsonb_build_array('S', 'M', 'L' || g % 30)))
+        FROM generate_series(1, 2000) g;
+    INSERT INTO product_inventory (product_id, color, attribute1_value, quantity)
+        SELECT 'plan-product-' || g, '#000000', s, g % 7 FROM generate_series(1, 2000) g, unnest(ARRAY['S', 'M', 'L']) s;
+    INSERT INTO cart (user_id, product_id, quantity)
+        SELECT 'plan-user-' || (g % 500 + 1), 'plan-product-' || g, 1 FROM generate_series(1, 2000) g;
+    INSERT INTO favorites (user_id, product_id)
+        SELECT 'plan-user-' || (g % 500 + 1), 'plan-product-' || g FROM generate_series(1, 2000) g;
+    INSERT INTO orders (id, user_id, total, payment_id, created_at, customer_name, customer_phone)
+        SELECT 'plan-order-' || g, 'plan-user-' || (g % 500 + 1), 1000, 'payme-tx-' || g, NOW() - (g || ' minutes')::interval,
+               'Customer ' || g, '+998 90 ' || lpad(g::text, 7, '0')
+        FROM generate_series(1, 5000) g;
+    INSERT INTO order_items (order_id, product_id, name, price, quantity)
+        SELECT 'plan-order-' || (g % 5000 + 1), 'plan-product-' || (g % 2000 + 1), 'Product', 1000, 1 FROM generate_series(1, 10000) g;
+    INSERT INTO chat_messages (user_id, sender_id, content)
+        SELECT 'plan-user-' || (g % 500 + 1), 'plan-user-' || (g % 500 + 1), 'hello' FROM generate_series(1, 5000) g;
+'''
+
+
+def _seq_scans(plan, found=None):
+    found = [] if found is None else found
+    if plan.get('Node Type') == 'Seq Scan':
+        found.append(plan.get('Relation Name'))
+    for child in plan.get('Plans', []):
+        _seq_scans(child, found)
+    return found
+
+
+def check_query_plans(verbose=True):
+    """Returns the list of (query name, [relations seq-scanned]) that regressed."""
+    conn = _connect()
+    cur = conn.cursor()
+    failures = []
+    try:
+        cur.execute(SEED_SQL)
+        cur.execute('ANALYZE')
+        cur.execute('SET LOCAL enable_seqscan = off')
+
+        for name, sql, params in HOT_QUERIES:
+            cur.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            plan = cur.fetchone()['QUERY PLAN']
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            scans = _seq_scans(plan[0]['Plan'])
+            if scans:
+                failures.append((name, scans))
+            if verbose:
+                mark = '❌' if scans else '✅'
+                detail = f" (Seq Scan on {', '.join(scans)})" if scans else ''
+                print(f"{mark} {name}{detail}")
+    finally:
+        conn.rollback()
+        cur.close()
+        conn.close()
+    return failures
+
+
+def schema_is_current():
+    conn = _connect()
+    cur = conn.cursor()
+    try:
+        return get_schema_version(cur) >= latest_version()
+    finally:
+        cur.close()
+        conn.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='EXPLAIN check for the hot queries')
+    parser.add_argument('--migrate', action='store_true',
+                        help='apply pending migrations first (changes the database permanently)')
+    args = parser.parse_args()
+
+    print("🚀 EXPLAIN check for hot queries\n")
+    if args.migrate:
+        apply_migrations(verbose=False)
+    elif not schema_is_current():
+        print(f"❌ The database schema is behind migration {latest_version():04d}. "
+              f"Run python -m backend.migrate, or pass --migrate")
+        sys.exit(2)
+    failures = check_query_plans()
+    if failures:
+        print(f"\n❌ {len(failures)} hot query(ies) fell back to a sequential scan")
+        sys.exit(1)
+    print("\n✅ All hot queries are served by indexes")
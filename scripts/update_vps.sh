@@ -114,6 +114,14 @@ pip install --upgrade pip
 pip install -r requirements.txt
 EOF
 
+# Миграции базы данных
+print_step "Применение миграций БД..."
+sudo -u $APP_USER bash <<EOF
+cd $APP_DIR
+source venv/bin/activate
+python3 scripts/init_tables.py
+EOF
+
 # Настройка прав доступа для Nginx
 print_step "Обновление прав доступа для Nginx..."
 chmod 755 /home/$APP_USER
@@ -134,6 +142,11 @@ if systemctl list-unit-files | grep -q shop-app.service; then
     systemctl restart shop-app
 fi
 
+if systemctl list-unit-files | grep -q shop-outbox.service; then
+    print_step "Перезапуск доставки уведомлений..."
+    systemctl restart shop-outbox
+fi
+
 if systemctl list-unit-files | grep -q shop-chat.service; then
     print_step "Перезапуск чат-сервиса..."
     systemctl restart shop-chat
@@ -2,6 +2,7 @@ import psycopg2
 from psycopg2.extras import RealDictCursor
 from typing import Optional, List, Dict, Any, cast
 import os
+import sys
 import json
 from pathlib import Path
 from dotenv import load_dotenv
@@ -9,6 +10,14 @@ import time
 
 load_dotenv()
 
+# The bot runs from telegram_bot/; catalog reads share the web app's snapshot
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.catalog_snapshot import get_snapshot, invalidate_snapshot, product_dict
+from backend.database import start_invalidation_listener
+
+# Explicit columns: products also carries search_vector, which the bot never needs
+PRODUCT_COLUMNS = 'id, name, description, price, images, category_id, colors, attributes, created_at'
+
 
 def get_db_connection(max_retries=3, retry_delay=2):
     """
@@ -54,6 +63,22 @@ def get_db_connection(max_retries=3, retry_delay=2):
                 raise
 
 
+def _notify_catalog_change(cur, product_id):
+    """
+    Tells the web app and AI bot to drop cached data for this product.
+    Delivered by Postgres only if the transaction commits
+    (same payload format as backend/invalidation.py).
+    """
+    payload = json.dumps({'scope': 'catalog', 'key': product_id})
+    cur.execute("SELECT pg_notify('cache_invalidation', %s)", (payload,))
+
+
+def _catalog_snapshot():
+    # Keeps the snapshot in step with edits made from the web admin panel
+    start_invalidation_listener()
+    return get_snapshot()
+
+
 def get_categories_from_config():
     """
     Gets categories from settingsbot.json file
@@ -112,11 +137,14 @@ def add_product(
             '''INSERT INTO products 
                (name, description, price, images, category_id, colors, attributes) 
                VALUES (%s, %s, %s, %s, %s, %s, %s) 
-               RETURNING *''',
+               RETURNING ''' + PRODUCT_COLUMNS,
             (name, description, price, images, category_id, colors, attributes_json)
         )
         product = cur.fetchone()
+        if product:
+            _notify_catalog_change(cur, product['id'])
         conn.commit()
+        invalidate_snapshot()
         cur.close()
         conn.close()
         return cast(Optional[Dict[str, Any]], product)
@@ -145,7 +173,10 @@ def delete_product(product_id: str) -> bool:
         cur = conn.cursor()
         cur.execute('DELETE FROM products WHERE id = %s', (product_id,))
         deleted_count = cur.rowcount
+        if deleted_count:
+            _notify_catalog_change(cur, product_id)
         conn.commit()
+        invalidate_snapshot()
         cur.close()
         conn.close()
         return deleted_count > 0
@@ -166,26 +197,12 @@ def get_all_products(category_id: Optional[str] = None) -> List[Dict[str, Any]]:
     Returns:
         list: Array of product dictionaries or empty array if error
     """
-    conn = None
     try:
-        conn = get_db_connection()
-        if not conn:
-            return []
-        cur = conn.cursor()
-        
-        if category_id:
-            cur.execute('SELECT * FROM products WHERE category_id = %s', (category_id,))
-        else:
-            cur.execute('SELECT * FROM products')
-        
-        products = cur.fetchall()
-        cur.close()
-        conn.close()
-        return cast(List[Dict[str, Any]], products)
+        snapshot = _catalog_snapshot()
+        products = snapshot.products_by_category.get(category_id, ()) if category_id else snapshot.products
+        return [product_dict(p) for p in products]
     except Exception as e:
         print(f"Error getting products: {e}")
-        if conn:
-            conn.close()
         return []
 
 
@@ -199,27 +216,19 @@ def get_product_by_id(product_id: str) -> Optional[Dict[str, Any]]:
     Returns:
         dict: Dictionary with product data or None if not found
     """
-    conn = None
     try:
-        conn = get_db_connection()
-        if not conn:
-            return None
-        cur = conn.cursor()
-        cur.execute('SELECT * FROM products WHERE id = %s', (product_id,))
-        product = cur.fetchone()
-        cur.close()
-        conn.close()
-        return cast(Optional[Dict[str, Any]], product)
+        product = _catalog_snapshot().get_product(product_id)
+        return product_dict(product) if product else None
     except Exception as e:
         print(f"Error getting product: {e}")
-        if conn:
-            conn.close()
         return None
 
 
 def find_products_by_name(name: str) -> List[Dict[str, Any]]:
     """
-    Searches products by name (partial match)
+    Searches products by name, most relevant first.
+    Uses the full-text + trigram search functions from
+    backend/migrations/0006_product_search.sql, so typos and word forms match.
     
     Parameters:
         name (str): Product name or part of name
@@ -233,7 +242,11 @@ def find_products_by_name(name: str) -> List[Dict[str, Any]]:
         if not conn:
             return []
         cur = conn.cursor()
-        cur.execute('SELECT * FROM products WHERE name ILIKE %s', (f'%{name}%',))
+        cur.execute(f'''
+            SELECT {PRODUCT_COLUMNS} FROM products p
+            WHERE p.search_vector @@ product_search_query(%s) OR %s <%% p.name
+            ORDER BY product_search_rank(p.search_vector, p.name, product_search_query(%s), %s) DESC, p.name
+        ''', (name, name, name, name))
         products = cur.fetchall()
         cur.close()
         conn.close()